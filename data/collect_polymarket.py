@@ -1,22 +1,44 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import asyncio
 import csv
+import io
 import json
 import os
 import random
 import time
-from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
 
+import pandas as pd
 import requests
 
+from http_client import HttpClient
+from metrics import METRICS
+from price_store import (
+    ColumnarPriceWriter,
+    backfill_columnar,
+    history_window_params,
+    last_ts_path,
+    load_or_scan_last_timestamps,
+    max_timestamp,
+    new_candles,
+    reset_columnar,
+    save_last_timestamps,
+)
+from query_sets import CACHE_FILE as QUERY_SETS_CACHE_FILE, QuerySetGenerator, tag_labels, write_query_sets
+from timestamps import TimestampParser, parse_timestamp
+
 GAMMA = "https://gamma-api.polymarket.com"
 CLOB = "https://clob.polymarket.com"
 
 DEFAULT_TIMEOUT = 30
 DEFAULT_RETRIES = 5
 DEFAULT_BACKOFF_SEC = 1.5
+CHECKPOINT_EVERY_TOKENS = 32   # group-commit the price file and its checkpoint every N tokens...
+CHECKPOINT_EVERY_SEC = 5.0     # ...or every this many seconds
 
 PARAMS = {
     "outdir": os.path.join("data", "polymarket"),
@@ -31,6 +53,15 @@ PARAMS = {
     "seed": 1337,
     "shuffle": True, #Shuffle markets before applying max_markets/sample
     "append": False, #Append to existing ouptut files
+    "async_fetch": True, #Fetch price histories concurrently (asyncio) instead of one token at a time
+    "concurrency": 16, #Max in-flight /prices-history requests in async mode
+    "requests_per_sec": 30.0, #Token-bucket rate ceiling for /prices-history in async mode
+    "resume": True, #Resume an interrupted price fetch from its checkpoint manifest
+    "bulk_resolve": True, #Resolve market details via paged Gamma /markets?id=... calls instead of one GET per row
+    "bulk_chunk_size": 50, #Market ids (or condition ids) per bulk Gamma request
+    "incremental": False, #Fetch only candles newer than the last stored one per token and append them as delta rows
+    "columnar": False, #Also write prices to a columnar Parquet store (prices_history.parquet/), needs pyarrow
+    "metrics_dir": None, #Write a JSON run report + Prometheus textfile (collect_polymarket.prom) here, e.g. "data/metrics"
 }
 
 
@@ -38,21 +69,17 @@ def log(msg: str) -> None:
     print(f"[INFO] {msg}", flush=True)
 
 
+CLIENT = HttpClient(
+    timeout=DEFAULT_TIMEOUT,
+    retries=DEFAULT_RETRIES,
+    backoff_sec=DEFAULT_BACKOFF_SEC,
+    pool_maxsize=PARAMS["concurrency"],
+    log=log,
+)
+
+
 def http_get(url: str, params: Optional[Dict[str, Any]] = None, timeout: int = DEFAULT_TIMEOUT) -> Any:
-    last_err = None
-    for attempt in range(1, DEFAULT_RETRIES + 1):
-        try:
-            r = requests.get(url, params=params, timeout=timeout)
-            if r.status_code in (429, 500, 502, 503, 504):
-                log(f"HTTP {r.status_code} on {url}, retry {attempt}/{DEFAULT_RETRIES}")
-                time.sleep(DEFAULT_BACKOFF_SEC * attempt)
-                continue
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            last_err = e
-            time.sleep(DEFAULT_BACKOFF_SEC * attempt)
-    raise RuntimeError(f"GET failed after {DEFAULT_RETRIES} retries: {url} params={params} err={last_err}")
+    return CLIENT.get(url, params=params, timeout=timeout)
 
 
 def write_jsonl(path: str, rows: Iterable[Dict[str, Any]], append: bool = False) -> None:
@@ -62,11 +89,14 @@ def write_jsonl(path: str, rows: Iterable[Dict[str, Any]], append: bool = False)
 
     mode = "a" if append else "w"
     log(f"Writing JSONL -> {path} (append={append})")
-    with open(path, mode, encoding="utf-8") as f:
+    with METRICS.stage("write_jsonl") as st, open(path, mode, encoding="utf-8") as f:
+        start = f.tell()
         for row in rows:
             f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            st.rows += 1
         f.flush()
         os.fsync(f.fileno())
+        st.bytes_written = f.tell() - start
 
 
 def write_csv(path: str, rows: Iterable[Dict[str, Any]], fieldnames: List[str], append: bool = False) -> None:
@@ -77,14 +107,134 @@ def write_csv(path: str, rows: Iterable[Dict[str, Any]], fieldnames: List[str],
     mode = "a" if append else "w"
     write_header = not append or not os.path.exists(path)
     log(f"Writing CSV -> {path} (append={append})")
-    with open(path, mode, newline="", encoding="utf-8") as f:
+    with METRICS.stage("write_csv") as st, open(path, mode, newline="", encoding="utf-8") as f:
+        start = f.tell()
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         if write_header:
             writer.writeheader()
         for row in rows:
             writer.writerow(row)
+            st.rows += 1
         f.flush()
         os.fsync(f.fileno())
+        st.bytes_written = f.tell() - start
+
+
+def load_checkpoint(path: str, data_path: str) -> Tuple[Set[str], Optional[int]]:
+    """
+    Return (token_ids already written, data-file byte offset after the last one).
+
+    Entries are read up to a torn line or one pointing past the end of the
+    data file, and the checkpoint is truncated there so new entries follow
+    the valid ones.
+    """
+    done: Set[str] = set()
+    offset: Optional[int] = None
+    if not os.path.exists(path):
+        return done, offset
+    data_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+    valid_end = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                entry = json.loads(line) if line.endswith(b"\n") else None
+            except ValueError:
+                entry = None
+            if entry is None or int(entry["offset"]) > data_size:
+                break  # torn final line, or data lost with the page cache
+            done.add(str(entry["token_id"]))
+            offset = int(entry["offset"])
+            valid_end += len(line)
+    if valid_end < os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_end)
+            os.fsync(f.fileno())
+    return done, offset
+
+
+class StreamingPriceWriter:
+    """
+    Writes each token's price rows as soon as they arrive.
+
+    Every token gets a checkpoint line {"token_id", "offset"}. Lines are
+    group-committed every `checkpoint_every_tokens` tokens or
+    `checkpoint_every_sec` seconds: the data file is fsynced first, then the
+    lines are appended and fsynced, so a checkpoint never points at bytes
+    that are not on disk. A restarted run truncates any tail after the last
+    checkpointed offset and skips the checkpointed tokens.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        checkpoint_path: str,
+        fmt: str,
+        fieldnames: List[str],
+        append: bool = False,
+        resume_offset: Optional[int] = None,
+        checkpoint_every_tokens: int = CHECKPOINT_EVERY_TOKENS,
+        checkpoint_every_sec: float = CHECKPOINT_EVERY_SEC,
+    ) -> None:
+        outdir = os.path.dirname(path)
+        if outdir:
+            os.makedirs(outdir, exist_ok=True)
+
+        self.fmt = fmt
+        self.fieldnames = fieldnames
+        self.checkpoint_every_tokens = max(1, checkpoint_every_tokens)
+        self.checkpoint_every_sec = checkpoint_every_sec
+        if resume_offset is not None:
+            # Drop anything written after the last checkpoint (torn rows).
+            with open(path, "ab") as f:
+                f.truncate(min(resume_offset, f.tell()))
+                os.fsync(f.fileno())
+            append = True
+        elif not append and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        write_header = fmt != "json" and (not append or not os.path.exists(path) or os.path.getsize(path) == 0)
+        log(f"Streaming prices -> {path} (append={append}, resume_offset={resume_offset})")
+        self._f = open(path, "ab" if append else "wb")
+        self._ckpt = open(checkpoint_path, "ab")
+        self._pending: List[str] = []
+        self._last_commit = time.monotonic()
+        if write_header:
+            buf = io.StringIO()
+            csv.DictWriter(buf, fieldnames=fieldnames).writeheader()
+            self._f.write(buf.getvalue().encode("utf-8"))
+
+    def _encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        if self.fmt == "json":
+            return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=self.fieldnames)
+        for row in rows:
+            writer.writerow(row)
+        return buf.getvalue().encode("utf-8")
+
+    def write_token(self, token_id: str, rows: List[Dict[str, Any]]) -> None:
+        self._f.write(self._encode(rows))
+        self._pending.append(json.dumps({"token_id": token_id, "offset": self._f.tell()}) + "\n")
+        if (
+            len(self._pending) >= self.checkpoint_every_tokens
+            or time.monotonic() - self._last_commit >= self.checkpoint_every_sec
+        ):
+            self.commit()
+
+    def commit(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        if self._pending:
+            self._ckpt.write("".join(self._pending).encode("utf-8"))
+            self._ckpt.flush()
+            os.fsync(self._ckpt.fileno())
+            self._pending = []
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        self.commit()
+        self._f.close()
+        self._ckpt.close()
 
 
 # ----------------------------
@@ -106,6 +256,69 @@ def fetch_market_details(market_id: str) -> Optional[Dict[str, Any]]:
     return None
 
 
+def _fetch_markets_page_set(filter_key: str, values: List[str]) -> List[Dict[str, Any]]:
+    """Page through /markets for one chunk of id or condition-id filter values."""
+    markets: List[Dict[str, Any]] = []
+    offset = 0
+    # Each filter value matches at most one market, so stop once a chunk is covered
+    # (normally after the first page, unless the server caps the page size).
+    while len(markets) < len(values):
+        batch = http_get(
+            f"{GAMMA}/markets",
+            params={filter_key: values, "limit": len(values), "offset": offset},
+        )
+        if not isinstance(batch, list) or not batch:
+            break
+        markets.extend(m for m in batch if isinstance(m, dict))
+        offset += len(batch)
+    return markets
+
+
+def fetch_market_details_bulk(
+    market_ids: List[str],
+    condition_ids: List[str],
+    chunk_size: int,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Fetch Gamma market details via the list endpoint, chunk_size ids per request.
+
+    Returns (details by market id, details by condition id). Condition ids are
+    only queried for markets that the id lookup did not already cover.
+    """
+    by_id: Dict[str, Dict[str, Any]] = {}
+    by_condition: Dict[str, Dict[str, Any]] = {}
+
+    def index(markets: List[Dict[str, Any]]) -> None:
+        for m in markets:
+            mid = extract_market_id(m, None)
+            cid = extract_condition_id(m)
+            if mid is not None:
+                by_id[mid] = m
+            if cid is not None:
+                by_condition[str(cid)] = m
+
+    ids = list(dict.fromkeys(market_ids))
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start : start + chunk_size]
+        log(f"Bulk Gamma lookup by id: {start + len(chunk)}/{len(ids)}")
+        try:
+            index(_fetch_markets_page_set("id", chunk))
+        except Exception as e:
+            log(f"Bulk Gamma lookup failed for ids {chunk[0]}..{chunk[-1]}: {e}")
+
+    cids = [c for c in dict.fromkeys(condition_ids) if c not in by_condition]
+    for start in range(0, len(cids), chunk_size):
+        chunk = cids[start : start + chunk_size]
+        log(f"Bulk Gamma lookup by condition id: {start + len(chunk)}/{len(cids)}")
+        try:
+            index(_fetch_markets_page_set("condition_ids", chunk))
+        except Exception as e:
+            log(f"Bulk Gamma lookup failed for condition ids {chunk[0]}..{chunk[-1]}: {e}")
+
+    log(f"Bulk Gamma lookup resolved {len(by_id)} markets by id, {len(by_condition)} by condition id")
+    return by_id, by_condition
+
+
 def extract_condition_id(m: Dict[str, Any]) -> Optional[str]:
     return m.get("conditionId") or m.get("condition_id")
 
@@ -174,8 +387,13 @@ def extract_clob_token_ids(m: Dict[str, Any], yes_only: bool = False) -> List[st
     return []
 
 
-def fetch_prices_history(token_id: str, interval: str, fidelity_min: int) -> Dict[str, Any]:
-    params = {"market": token_id, "interval": interval, "fidelity": int(fidelity_min)}
+def fetch_prices_history(
+    token_id: str,
+    interval: str,
+    fidelity_min: int,
+    last_ts: Optional[int] = None,
+) -> Dict[str, Any]:
+    params = history_window_params(token_id, interval, fidelity_min, last_ts)
     req = requests.Request("GET", f"{CLOB}/prices-history", params=params).prepare()
     log(f"Request URL: {req.url}")
     data = http_get(f"{CLOB}/prices-history", params=params)
@@ -188,24 +406,151 @@ def fetch_prices_history(token_id: str, interval: str, fidelity_min: int) -> Dic
     return {"history": []}
 
 
+class AsyncTokenBucket:
+    """Token-bucket rate limiter shared by concurrent fetch tasks."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in FIFO order.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+async def _fetch_prices_history_limited(
+    token_id: str,
+    interval: str,
+    fidelity_min: int,
+    semaphore: asyncio.Semaphore,
+    bucket: AsyncTokenBucket,
+    last_ts: Optional[int] = None,
+) -> Dict[str, Any]:
+    async with semaphore:
+        await bucket.acquire()
+        return await asyncio.to_thread(fetch_prices_history, token_id, interval, fidelity_min, last_ts)
+
+
+async def _fetch_all_prices_history(
+    token_ids: List[str],
+    interval: str,
+    fidelity_min: int,
+    concurrency: int,
+    requests_per_sec: float,
+    on_result: Callable[[int, Dict[str, Any]], None],
+    last_ts_by_token: Optional[Dict[str, int]] = None,
+) -> None:
+    last_ts_by_token = last_ts_by_token or {}
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = AsyncTokenBucket(requests_per_sec)
+
+    # Keep a bounded window of scheduled tasks and drain it head-first: results
+    # are delivered in input order (so output matches the serial path exactly)
+    # while at most `window` finished histories are ever held in memory.
+    window = max(1, concurrency * 2)
+    pending: Deque[Tuple[int, asyncio.Task]] = deque()
+    work = iter(enumerate(token_ids))
+
+    def schedule() -> None:
+        while len(pending) < window:
+            try:
+                idx, tid = next(work)
+            except StopIteration:
+                return
+            task = asyncio.create_task(
+                _fetch_prices_history_limited(
+                    tid, interval, fidelity_min, semaphore, bucket, last_ts_by_token.get(tid)
+                )
+            )
+            pending.append((idx, task))
+
+    schedule()
+    try:
+        while pending:
+            idx, task = pending.popleft()
+            on_result(idx, await task)
+            schedule()
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+def fetch_all_prices_history(
+    token_ids: List[str],
+    interval: str,
+    fidelity_min: int,
+    concurrency: int,
+    requests_per_sec: float,
+    on_result: Callable[[int, Dict[str, Any]], None],
+    last_ts_by_token: Optional[Dict[str, int]] = None,
+) -> None:
+    """Fetch price histories concurrently, calling on_result(index, history) in the order of token_ids."""
+    log(f"Async fetch of {len(token_ids)} tokens (concurrency={concurrency}, rate={requests_per_sec}/s)")
+    asyncio.run(
+        _fetch_all_prices_history(
+            token_ids, interval, fidelity_min, concurrency, requests_per_sec, on_result, last_ts_by_token
+        )
+    )
+
+
+def build_price_rows(
+    fmt: str,
+    market_id: Optional[str],
+    condition_id: Optional[str],
+    token_id: str,
+    hist: Dict[str, Any],
+    interval: str,
+    fidelity_min: int,
+) -> List[Dict[str, Any]]:
+    if fmt == "json":
+        return [
+            {
+                "market_id": market_id,
+                "conditionId": condition_id,
+                "token_id": token_id,
+                "interval": interval,
+                "fidelity_min": fidelity_min,
+                "history": hist.get("history", []),
+            }
+        ]
+    return [
+        {
+            "market_id": market_id,
+            "conditionId": condition_id,
+            "token_id": token_id,
+            "interval": interval,
+            "fidelity_min": fidelity_min,
+            "timestamp": point.get("t"),
+            "price": point.get("p"),
+        }
+        for point in hist.get("history", [])
+    ]
+
+
 def read_markets_csv(path: str) -> List[Dict[str, Any]]:
     log(f"Reading markets CSV: {path}")
-    with open(path, "r", encoding="utf-8") as f:
+    with METRICS.stage("read_markets_csv") as st, open(path, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         rows = [row for row in reader]
+        st.rows = len(rows)
+        st.bytes_read = os.path.getsize(path)
     log(f"Loaded {len(rows)} rows from markets CSV")
     return rows
 
 
-def _parse_created_at(value: Optional[str]) -> Optional[datetime]:
-    if value is None:
-        return None
-    try:
-        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
-    except ValueError:
-        return None
-
-
 def parse_market_row(row: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
     market_id = row.get("id") or row.get("market_id") or row.get("marketId")
     condition_id = row.get("condition_id") or row.get("conditionId")
@@ -255,6 +600,144 @@ def resolve_token_ids_from_csv_row(
     return [], detail
 
 
+def resolve_token_ids_bulk(
+    rows: List[Dict[str, Any]],
+    yes_only: bool,
+    chunk_size: int,
+) -> List[Tuple[List[str], Optional[Dict[str, Any]]]]:
+    """
+    Resolve tokens for every CSV row with a few bulk Gamma calls.
+
+    Results are aligned with rows. Rows the bulk lookup could not match fall
+    back to the per-market resolve_token_ids_from_csv_row.
+    """
+    keys = [parse_market_row(row) for row in rows]
+    by_id, by_condition = fetch_market_details_bulk(
+        [mid for mid, _ in keys if mid is not None],
+        [cid for _, cid in keys if cid is not None],
+        chunk_size,
+    )
+
+    resolved: List[Tuple[List[str], Optional[Dict[str, Any]]]] = []
+    fallbacks = 0
+    for row, (market_id, condition_id) in zip(rows, keys):
+        detail = None
+        if market_id is not None:
+            detail = by_id.get(market_id)
+        if detail is None and condition_id is not None:
+            detail = by_condition.get(condition_id)
+        if detail is None:
+            fallbacks += 1
+            resolved.append(resolve_token_ids_from_csv_row(row, yes_only=yes_only))
+            continue
+        token_ids = extract_clob_token_ids(detail, yes_only=yes_only)
+        if not token_ids:
+            log(f"No clobTokenIds found via Gamma for market_id={market_id} condition_id={condition_id}")
+        resolved.append((token_ids, detail))
+    if fallbacks:
+        log(f"Per-market Gamma fallback used for {fallbacks}/{len(rows)} rows")
+    return resolved
+
+
+# ----------------------------
+# Orchestrator step 1
+# ----------------------------
+
+
+class PolymarketCollector:
+    """
+    Step 1 of orchestrate_collection.py: page Gamma /markets and write
+    raw_markets_<stamp>.json, markets_processed.csv and query_sets.json to
+    output_dir. Query sets come from query_sets.QuerySetGenerator, cached in
+    output_dir/query_sets_cache.jsonl so unchanged markets are not redone.
+    """
+
+    PROCESSED_COLUMNS = [
+        "market_id",
+        "conditionId",
+        "title",
+        "description",
+        "tags",
+        "clobTokenIds",
+        "closed",
+        "created_at",
+        "end_date",
+    ]
+
+    def __init__(
+        self,
+        output_dir: str = PARAMS["outdir"],
+        closed: Optional[bool] = None,
+        page_size: int = 100,
+        client: HttpClient = CLIENT,
+    ) -> None:
+        self.output_dir = output_dir
+        self.closed = closed
+        self.page_size = page_size
+        self.client = client
+
+    def fetch_markets(self, max_markets: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Page through Gamma /markets (all, or only open/closed ones) up to max_markets."""
+        markets: List[Dict[str, Any]] = []
+        offset = 0
+        with METRICS.stage("fetch_markets") as st:
+            while max_markets is None or len(markets) < max_markets:
+                limit = self.page_size if max_markets is None else min(self.page_size, max_markets - len(markets))
+                params: Dict[str, Any] = {"limit": limit, "offset": offset, "include_tag": True}
+                if self.closed is not None:
+                    params["closed"] = str(self.closed).lower()
+                batch = self.client.get(f"{GAMMA}/markets", params=params)
+                if not isinstance(batch, list) or not batch:
+                    break
+                markets.extend(m for m in batch if isinstance(m, dict))
+                offset += len(batch)
+                log(f"Fetched {len(markets)} markets from Gamma")
+                if len(batch) < limit:
+                    break
+            st.rows = len(markets)
+        return markets
+
+    def collect_all_markets(
+        self,
+        max_markets: Optional[int] = None,
+        save_raw: bool = True,
+        save_processed: bool = True,
+    ) -> pd.DataFrame:
+        """Fetch markets, write the step-1 outputs and return markets_processed as a DataFrame."""
+        markets = self.fetch_markets(max_markets)
+        os.makedirs(self.output_dir, exist_ok=True)
+        if save_raw:
+            stamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+            raw_path = os.path.join(self.output_dir, f"raw_markets_{stamp}.json")
+            with open(raw_path, "w", encoding="utf-8") as f:
+                json.dump(markets, f, ensure_ascii=False)
+            log(f"Wrote raw markets -> {raw_path}")
+
+        rows = []
+        for m in markets:
+            start_date, end_date = pick_start_end_dates(m)
+            rows.append({
+                "market_id": extract_market_id(m, None),
+                "conditionId": extract_condition_id(m),
+                "title": m.get("question"),
+                "description": m.get("description"),
+                "tags": json.dumps(tag_labels(m.get("tags")), ensure_ascii=False),
+                "clobTokenIds": ";".join(extract_clob_token_ids(m)),
+                "closed": m.get("closed"),
+                "created_at": start_date,
+                "end_date": end_date,
+            })
+        markets_df = pd.DataFrame(rows, columns=self.PROCESSED_COLUMNS)
+
+        if save_processed:
+            write_csv(os.path.join(self.output_dir, "markets_processed.csv"), rows, self.PROCESSED_COLUMNS)
+            generator = QuerySetGenerator(os.path.join(self.output_dir, QUERY_SETS_CACHE_FILE))
+            query_sets = generator.generate(markets)
+            write_query_sets(os.path.join(self.output_dir, "query_sets.json"), query_sets)
+            log(f"Wrote {len(query_sets)} query sets -> {os.path.join(self.output_dir, 'query_sets.json')}")
+        return markets_df
+
+
 def main() -> None:
     params = PARAMS
 
@@ -265,6 +748,13 @@ def main() -> None:
     ext = "jsonl" if fmt == "json" else "csv"
     markets_path = os.path.join(abs_outdir, f"markets.{ext}")
     prices_path = os.path.join(abs_outdir, f"prices_history.{ext}")
+    checkpoint_path = f"{prices_path}.checkpoint"
+
+    done_tokens: Set[str] = set()
+    resume_offset: Optional[int] = None
+    if params["resume"] and params["prices"]:
+        done_tokens, resume_offset = load_checkpoint(checkpoint_path, prices_path)
+    resuming = resume_offset is not None
 
     log(f"Current working dir: {os.path.abspath(os.getcwd())}")
     log(f"Output directory: {abs_outdir}")
@@ -276,16 +766,21 @@ def main() -> None:
         raise RuntimeError(f"No rows in markets CSV: {params['markets_csv']}")
 
     if params["min_date"]:
-        min_dt = datetime.fromisoformat(params["min_date"].replace("Z", "+00:00")).astimezone(timezone.utc)
+        min_ts = parse_timestamp(params["min_date"])
+        if min_ts is None:
+            raise ValueError(f"Invalid min_date: {params['min_date']}")
+        created = TimestampParser(name="createdAt")
         filtered_rows = []
         skipped = 0
         for row in all_rows:
-            created_at = _parse_created_at(row.get("createdAt"))
-            if created_at is None or created_at < min_dt:
+            created_at = created.parse(row.get("createdAt"))
+            if created_at is None or created_at < min_ts:
                 skipped += 1
                 continue
             filtered_rows.append(row)
         log(f"Filtered by min_date={params['min_date']}: kept={len(filtered_rows)} skipped={skipped}")
+        if created.unparseable or created.missing:
+            log(created.report())
         all_rows = filtered_rows
 
     total_rows = len(all_rows)
@@ -304,24 +799,31 @@ def main() -> None:
     token_ids_by_key: Dict[str, List[str]] = {}
     filtered_selected: Dict[str, Dict[str, Any]] = {}
     total = len(all_rows)
-    for i, row in enumerate(all_rows, start=1):
-        market_id, condition_id = parse_market_row(row)
-        log(f"[{i}/{total}] Resolving tokens for market_id={market_id} condition_id={condition_id}")
-        token_ids, detail = resolve_token_ids_from_csv_row(row, yes_only=params["yes_only"])
-        if detail and condition_id is None:
-            condition_id = extract_condition_id(detail)
-        market_id = extract_market_id(detail, market_id)
-        row_key = market_id or condition_id or f"row_{i}"
-        token_ids_by_key[row_key] = token_ids
-        if not token_ids and params["yes_only"]:
-            log(f"Skipping conditionId={condition_id}; no YES token found")
-            continue
-        selected_market: Dict[str, Any] = {}
-        if detail:
-            selected_market.update(detail)
-        selected_market.update(row)
-        filtered_selected[row_key] = selected_market
-        log(f"Resolved tokens {i}/{total} | market_id={market_id} | tokens={len(token_ids)}")
+    with METRICS.stage("resolve_tokens") as st:
+        if params["bulk_resolve"]:
+            resolved = resolve_token_ids_bulk(all_rows, params["yes_only"], params["bulk_chunk_size"])
+        for i, row in enumerate(all_rows, start=1):
+            market_id, condition_id = parse_market_row(row)
+            if params["bulk_resolve"]:
+                token_ids, detail = resolved[i - 1]
+            else:
+                log(f"[{i}/{total}] Resolving tokens for market_id={market_id} condition_id={condition_id}")
+                token_ids, detail = resolve_token_ids_from_csv_row(row, yes_only=params["yes_only"])
+            if detail and condition_id is None:
+                condition_id = extract_condition_id(detail)
+            market_id = extract_market_id(detail, market_id)
+            row_key = market_id or condition_id or f"row_{i}"
+            token_ids_by_key[row_key] = token_ids
+            if not token_ids and params["yes_only"]:
+                log(f"Skipping conditionId={condition_id}; no YES token found")
+                continue
+            selected_market: Dict[str, Any] = {}
+            if detail:
+                selected_market.update(detail)
+            selected_market.update(row)
+            filtered_selected[row_key] = selected_market
+            log(f"Resolved tokens {i}/{total} | market_id={market_id} | tokens={len(token_ids)}")
+        st.rows = len(all_rows)
 
     # Write markets
     market_rows = []
@@ -333,6 +835,7 @@ def main() -> None:
                 "market_id": market_id,
                 "conditionId": m.get("conditionId") or m.get("condition_id"),
                 "question": m.get("question"),
+                "description": m.get("description"),
                 "tags": m.get("tags"),
                 "clobTokenIds": token_ids_by_key.get(key, []),
                 "closed": m.get("closed"),
@@ -341,7 +844,9 @@ def main() -> None:
             }
         )
 
-    if fmt == "json":
+    if resuming:
+        log(f"Resuming from checkpoint ({len(done_tokens)} tokens done); markets file already written")
+    elif fmt == "json":
         write_jsonl(markets_path, market_rows, append=params["append"])
     else:
         rows = []
@@ -377,53 +882,114 @@ def main() -> None:
     # Prices
     if params["prices"]:
         log("Fetching price history")
-        price_rows: List[Dict[str, Any]] = []
-        total_tokens = sum(len(token_ids_by_key.get(key, [])) for key in filtered_selected.keys())
-        token_counter = 0
+        jobs: List[Tuple[Optional[str], Optional[str], str]] = []
         for i, (cid, m) in enumerate(filtered_selected.items(), start=1):
             token_ids = token_ids_by_key.get(cid, [])
             market_id = m.get("id") or m.get("market_id") or m.get("marketId")
             log(f"Market {i}/{total} | market_id={market_id} | tokens={len(token_ids)}")
             for token_id in token_ids:
-                token_counter += 1
-                log(f"  Token {token_counter}/{total_tokens} | token_id={token_id}")
-                hist = fetch_prices_history(token_id, params["interval"], params["fidelity_min"])
-                if fmt == "json":
-                    price_rows.append(
-                        {
-                            "market_id": market_id,
-                            "conditionId": m.get("conditionId") or m.get("condition_id"),
-                            "token_id": token_id,
-                            "interval": params["interval"],
-                            "fidelity_min": params["fidelity_min"],
-                            "history": hist.get("history", []),
-                        }
+                if token_id in done_tokens:
+                    continue
+                jobs.append((market_id, m.get("conditionId") or m.get("condition_id"), token_id))
+        total_tokens = len(jobs)
+        if done_tokens:
+            log(f"Skipping {len(done_tokens)} tokens already written before the restart")
+
+        # Last stored candle per token. Kept up to date on every run so a later
+        # incremental refresh can trust it; a fresh overwrite starts from empty.
+        state_path = last_ts_path(prices_path)
+        keep_existing = params["incremental"] or params["append"] or resuming
+        last_ts_by_token = load_or_scan_last_timestamps(prices_path) if keep_existing else {}
+        if params["incremental"]:
+            log(f"Incremental refresh: {len(last_ts_by_token)} tokens already stored")
+
+        writer = StreamingPriceWriter(
+            prices_path,
+            checkpoint_path,
+            fmt,
+            ["market_id", "conditionId", "token_id", "interval", "fidelity_min", "timestamp", "price"],
+            append=params["append"] or params["incremental"],
+            resume_offset=resume_offset,
+        )
+
+        columnar_writer: Optional[ColumnarPriceWriter] = None
+        if params["columnar"]:
+            columnar_path = os.path.join(abs_outdir, "prices_history.parquet")
+            if not keep_existing:
+                reset_columnar(columnar_path)
+            columnar_writer = ColumnarPriceWriter(columnar_path)
+            if done_tokens:
+                n = backfill_columnar(prices_path, columnar_writer, done_tokens)
+                log(f"Columnar store: backfilled {n} tokens written before the restart")
+
+        def write_token(idx: int, hist: Dict[str, Any]) -> None:
+            market_id, condition_id, token_id = jobs[idx]
+            last_ts = last_ts_by_token.get(token_id)
+            if params["incremental"]:
+                hist = {**hist, "history": new_candles(hist.get("history", []), last_ts)}
+            rows = []
+            if not params["incremental"] or last_ts is None or hist["history"]:
+                rows = build_price_rows(
+                    fmt,
+                    market_id,
+                    condition_id,
+                    token_id,
+                    hist,
+                    params["interval"],
+                    params["fidelity_min"],
+                )
+            writer.write_token(token_id, rows)
+            METRICS.count("price_rows", len(rows))
+            if columnar_writer is not None and rows:
+                columnar_writer.add(token_id, hist.get("history", []), market_id, condition_id)
+            ts = max_timestamp(hist.get("history", []), last_ts)
+            if ts is not None:
+                last_ts_by_token[token_id] = ts
+
+        fetch_last_ts = last_ts_by_token if params["incremental"] else None
+
+        prices_size_before = os.path.getsize(prices_path) if os.path.exists(prices_path) else 0
+        with METRICS.stage("fetch_prices") as st:
+            try:
+                if params["async_fetch"]:
+                    fetch_all_prices_history(
+                        [token_id for _, _, token_id in jobs],
+                        params["interval"],
+                        params["fidelity_min"],
+                        params["concurrency"],
+                        params["requests_per_sec"],
+                        on_result=write_token,
+                        last_ts_by_token=fetch_last_ts,
                     )
                 else:
-                    for point in hist.get("history", []):
-                        price_rows.append(
-                            {
-                                "market_id": market_id,
-                                "conditionId": m.get("conditionId") or m.get("condition_id"),
-                                "token_id": token_id,
-                                "interval": params["interval"],
-                                "fidelity_min": params["fidelity_min"],
-                                "timestamp": point.get("t"),
-                                "price": point.get("p"),
-                            }
+                    for token_counter, (_, _, token_id) in enumerate(jobs, start=1):
+                        log(f"  Token {token_counter}/{total_tokens} | token_id={token_id}")
+                        hist = fetch_prices_history(
+                            token_id,
+                            params["interval"],
+                            params["fidelity_min"],
+                            last_ts=(fetch_last_ts or {}).get(token_id),
                         )
-                time.sleep(0.03)
-
-        if fmt == "json":
-            write_jsonl(prices_path, price_rows, append=params["append"])
-        else:
-            write_csv(
-                prices_path,
-                price_rows,
-                ["market_id", "conditionId", "token_id", "interval", "fidelity_min", "timestamp", "price"],
-                append=params["append"],
-            )
-
+                        write_token(token_counter - 1, hist)
+                        time.sleep(0.03)
+            finally:
+                writer.close()
+                if columnar_writer is not None:
+                    columnar_writer.close()
+                save_last_timestamps(state_path, last_ts_by_token)
+            st.rows = total_tokens
+            st.bytes_written = max(0, os.path.getsize(prices_path) - prices_size_before)
+
+        # Run completed: the next run starts fresh rather than resuming.
+        os.remove(checkpoint_path)
+
+    CLIENT.log_stats()
+    METRICS.attach_http(CLIENT)
+    for line in METRICS.summary_lines():
+        log(line)
+    if params["metrics_dir"]:
+        json_path, prom_path = METRICS.export(params["metrics_dir"], "collect_polymarket")
+        log(f"Metrics -> {json_path}, {prom_path}")
     log("Done.")
 
 
@@ -3,19 +3,24 @@ Reddit Data Collection Pipeline using Pushshift Dataset
 
 Collects Reddit posts from Pushshift dumps or API
 Designed to work with:
-- Pushshift dumps (torrent-based distribution)
+- Pushshift dumps (torrent-based distribution; .zst, .bz2, .gz or plain)
 - Pushshift API (if available)
 - PRAW as fallback (limited rate)
 """
 
-import json
+from bisect import bisect_right
+import math
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Callable, Iterator, List, Dict, Optional
 import os
 from pathlib import Path
-import gzip
-import bz2
+
+from dump_io import iter_records
+from metrics import METRICS
+from social_shards import shards_for_window
+from text_match import KeywordMatcher
+from timestamps import TimestampParser, epoch_seconds, in_window, route_bounds, window_bounds
 
 try:
     import praw
@@ -24,24 +29,78 @@ except ImportError:
     PRAW_AVAILABLE = False
     print("Warning: PRAW not available. Install with: pip install praw")
 
+class PostFilter:
+    """
+    Per-post predicate, checked cheapest first (created_utc, then subreddit,
+    then the title/selftext keyword scan). A class rather than a closure so
+    it can be sent to dump decoding worker processes.
+    """
+
+    def __init__(self,
+                 start_ts: Optional[int],
+                 end_ts: Optional[int],
+                 subreddits: Optional[set],
+                 matcher: Optional[KeywordMatcher]):
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.subreddits = subreddits
+        self.matcher = matcher
+
+    def __call__(self, post: Dict) -> bool:
+        if self.start_ts is not None or self.end_ts is not None:
+            created = epoch_seconds(post.get('created_utc'))
+            if created is None:
+                return False
+            if self.start_ts is not None and created < self.start_ts:
+                return False
+            if self.end_ts is not None and created > self.end_ts:
+                return False
+        if self.subreddits is not None and str(post.get('subreddit') or '').lower() not in self.subreddits:
+            return False
+        if self.matcher is not None:
+            if not (self.matcher.search(post.get('title')) or self.matcher.search(post.get('selftext'))):
+                return False
+        return True
+
+
 class RedditCollector:
     """
     Collects Reddit posts from Pushshift dumps or API
     """
+
+    # Fields kept when projecting dump posts (same shape as collect_from_praw)
+    POST_FIELDS = ['id', 'title', 'selftext', 'subreddit', 'created_utc',
+                   'score', 'num_comments', 'url', 'permalink', 'author']
     
     def __init__(self, 
                  output_dir: str = "data/reddit",
                  pushshift_dump_dir: Optional[str] = None,
-                 praw_config: Optional[Dict] = None):
+                 praw_config: Optional[Dict] = None,
+                 keyword_word_boundary: bool = False,
+                 decode_workers: int = 1,
+                 social_index=None,
+                 shard_dir: Optional[str] = None):
         """
         Args:
             output_dir: Directory to save collected data
             pushshift_dump_dir: Path to Pushshift dump files (if using dumps)
             praw_config: Dict with 'client_id', 'client_secret', 'user_agent' for PRAW
+            keyword_word_boundary: Match keywords as whole words only
+            decode_workers: Processes used to decode multi-frame .zst dumps
+            social_index: Optional SocialIndex (see social_index.py) queried
+                instead of scanning dump files
+            shard_dir: Daily shard directory (see social_shards.py) used when
+                no dump files are given; only shards overlapping a market's
+                window are opened
         """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.pushshift_dump_dir = pushshift_dump_dir
+        self.keyword_word_boundary = keyword_word_boundary
+        self.decode_workers = decode_workers
+        self.social_index = social_index
+        self.shard_dir = shard_dir
+        self.timestamps = TimestampParser(fmt='epoch', name='reddit created_utc')
         
         # Initialize PRAW if config provided
         self.reddit = None
@@ -52,42 +111,129 @@ class RedditCollector:
                 user_agent=praw_config.get('user_agent', 'research_tool')
             )
     
-    def load_pushshift_dump(self, dump_file: str, filter_func=None) -> pd.DataFrame:
+    @staticmethod
+    def post_timestamp(post: Dict) -> Optional[int]:
+        """created_utc as unix seconds, or None if missing/unparseable"""
+        return epoch_seconds(post.get('created_utc'))
+
+    @staticmethod
+    def query_keywords(query_set: Dict) -> List[str]:
+        """Keywords searched for a market: primary queries plus the top 5 key phrases"""
+        keywords = []
+        if 'primary_queries' in query_set:
+            keywords.extend(query_set['primary_queries'])
+        if 'key_phrases' in query_set:
+            keywords.extend(query_set['key_phrases'][:5])  # Limit to top 5
+        return keywords
+
+    def build_post_filter(self,
+                          start_date: Optional[datetime] = None,
+                          end_date: Optional[datetime] = None,
+                          subreddits: Optional[List[str]] = None,
+                          keywords: Optional[List[str]] = None,
+                          word_boundary: Optional[bool] = None) -> Optional[PostFilter]:
+        """
+        Build a per-post predicate equivalent to filter_by_date_range,
+        filter_by_subreddits and filter_by_keywords (see PostFilter).
+        word_boundary overrides self.keyword_word_boundary.
+        Returns None when no predicate is given.
+        """
+        start_ts, end_ts = window_bounds(start_date, end_date)
+        subs = {s.lower() for s in subreddits} if subreddits else None
+        if word_boundary is None:
+            word_boundary = self.keyword_word_boundary
+        matcher = KeywordMatcher(keywords or [], word_boundary) or None
+
+        if start_ts is None and end_ts is None and subs is None and matcher is None:
+            return None
+
+        return PostFilter(start_ts, end_ts, subs, matcher)
+
+    def load_pushshift_dump(self, dump_file: str, filter_func=None,
+                            start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None,
+                            subreddits: Optional[List[str]] = None,
+                            keywords: Optional[List[str]] = None,
+                            fields: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Load and parse Pushshift dump file
         
-        Supports .json, .json.gz, .json.bz2 formats
+        Supports .json, .json.gz, .json.bz2 and .zst formats
+
+        Date, subreddit and keyword predicates are applied to each line as it
+        is decoded (inside the decode workers for multi-frame .zst dumps), so
+        only matching posts are ever kept in memory.
         
         Args:
             dump_file: Path to dump file
-            filter_func: Optional function to filter posts (returns bool)
+            filter_func: Optional function to filter posts (returns bool),
+                applied after the built-in predicates
+            start_date: Keep posts created at or after this time (naive = UTC)
+            end_date: Keep posts created at or before this time (naive = UTC)
+            subreddits: Keep posts from these subreddits (case-insensitive)
+            keywords: Keep posts whose title or selftext matches any keyword
+            fields: Keep only these fields of each matching post
+                (e.g. RedditCollector.POST_FIELDS); None keeps all
         """
-        dump_path = Path(dump_file)
-        
-        # Determine compression
-        if dump_path.suffix == '.bz2':
-            opener = bz2.open
-        elif dump_path.suffix == '.gz':
-            opener = gzip.open
-        else:
-            opener = open
-        
+        predicate = self.build_post_filter(start_date, end_date, subreddits, keywords)
         posts = []
         
-        print(f"Loading dump file: {dump_file}")
-        with opener(dump_path, 'rt', encoding='utf-8') as f:
-            for line_num, line in enumerate(f):
-                if line_num % 100000 == 0:
-                    print(f"  Processed {line_num} lines...")
-                
-                try:
-                    post = json.loads(line)
-                    if filter_func is None or filter_func(post):
-                        posts.append(post)
-                except json.JSONDecodeError:
-                    continue
+        for post in self.iter_pushshift_dump(dump_file, predicate):
+            if filter_func is not None and not filter_func(post):
+                continue
+            if fields is not None:
+                post = {k: post.get(k) for k in fields}
+            posts.append(post)
         
         print(f"Loaded {len(posts)} posts")
+        return pd.DataFrame(posts, columns=fields)
+
+    def iter_pushshift_dump(self, dump_file: str,
+                            predicate: Optional[Callable[[Dict], bool]] = None) -> Iterator[Dict]:
+        """
+        Yield each decodable post of a .json/.json.gz/.json.bz2/.zst dump
+        that passes predicate (decoded with self.decode_workers processes
+        when the dump is a multi-frame .zst)
+        """
+        return iter_records(dump_file, predicate=predicate, workers=self.decode_workers)
+
+    def iter_index_rows(self, dump_file: str, fields: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Rows for SocialIndex.add_posts; records keep POST_FIELDS unless fields is given"""
+        fields = fields or self.POST_FIELDS
+        for post in self.iter_pushshift_dump(dump_file):
+            created = self.post_timestamp(post)
+            texts = [t for t in (post.get('title'), post.get('selftext')) if isinstance(t, str)]
+            yield {
+                'post_id': str(post['id']) if post.get('id') is not None else None,
+                'created_utc': created,
+                'subreddit': post.get('subreddit'),
+                'hashtags': None,
+                'text': '\n'.join(texts),
+                'record': {k: post.get(k) for k in fields},
+            }
+
+    def collect_from_index(self,
+                           keywords: List[str],
+                           start_date: datetime,
+                           end_date: datetime,
+                           subreddits: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Query the social index instead of scanning dumps. The index matches
+        whole words, so hits are re-checked with a word-boundary PostFilter.
+        """
+        start_ts, end_ts = window_bounds(start_date, end_date)
+        with METRICS.stage('reddit.index_query') as st:
+            records = self.social_index.query(
+                'reddit',
+                keywords=keywords,
+                start_ts=start_ts,
+                end_ts=end_ts,
+                subreddits=subreddits
+            )
+            st.rows = len(records)
+        verify = self.build_post_filter(start_date, end_date, subreddits, keywords, word_boundary=True)
+        posts = [r for r in records if verify is None or verify(r)]
+        print(f"Index returned {len(posts)} posts")
         return pd.DataFrame(posts)
     
     def filter_by_subreddits(self, df: pd.DataFrame, subreddits: List[str]) -> pd.DataFrame:
@@ -96,33 +242,46 @@ class RedditCollector:
             return df[df['subreddit'].str.lower().isin([s.lower() for s in subreddits])]
         return df
     
-    def filter_by_keywords(self, df: pd.DataFrame, keywords: List[str]) -> pd.DataFrame:
-        """Filter dataframe by keywords in title/body"""
+    def filter_by_keywords(self, df: pd.DataFrame, keywords: List[str],
+                           record_matches: bool = False) -> pd.DataFrame:
+        """
+        Filter dataframe by keywords in title/body
+        
+        All keywords are matched in one pass per text (see text_match).
+        With record_matches, a 'matched_keywords' column lists the keywords
+        each kept post hit, joined by '|'.
+        """
         if 'title' not in df.columns and 'selftext' not in df.columns:
             return df
         
-        keyword_mask = pd.Series([False] * len(df))
+        matcher = KeywordMatcher(keywords, self.keyword_word_boundary)
+        text_cols = [c for c in ('title', 'selftext') if c in df.columns]
         
-        for keyword in keywords:
-            if 'title' in df.columns:
-                keyword_mask |= df['title'].str.contains(keyword, case=False, na=False)
-            if 'selftext' in df.columns:
-                keyword_mask |= df['selftext'].str.contains(keyword, case=False, na=False)
+        if record_matches:
+            # '\x00' keeps a phrase from spanning the title/body join
+            texts = ['\x00'.join(t for t in row if isinstance(t, str))
+                     for row in zip(*(df[c] for c in text_cols))]
+            matched = pd.Series(['|'.join(matcher.matches(t)) for t in texts],
+                                index=df.index, dtype=object)
+            df = df.assign(matched_keywords=matched)
+            return df[matched != '']
+        
+        keyword_mask = pd.Series(False, index=df.index)
+        for col in text_cols:
+            keyword_mask |= df[col].map(matcher.search)
         
         return df[keyword_mask]
     
     def filter_by_date_range(self, df: pd.DataFrame, 
                             start_date: datetime, 
                             end_date: datetime) -> pd.DataFrame:
-        """Filter dataframe by date range"""
+        """Filter dataframe by date range (posts without a valid created_utc are dropped)"""
         if 'created_utc' not in df.columns:
             return df
         
-        # Convert unix timestamp to datetime
-        df['created_dt'] = pd.to_datetime(df['created_utc'], unit='s')
-        
-        mask = (df['created_dt'] >= start_date) & (df['created_dt'] <= end_date)
-        return df[mask].drop('created_dt', axis=1)
+        created = self.timestamps.parse_many(df['created_utc'])
+        mask = in_window(created, *window_bounds(start_date, end_date), keep_missing=False)
+        return df[mask]
     
     def collect_from_praw(self, 
                          subreddit: str,
@@ -166,7 +325,8 @@ class RedditCollector:
                           start_date: datetime,
                           end_date: datetime,
                           subreddits: Optional[List[str]] = None,
-                          pushshift_files: Optional[List[str]] = None) -> pd.DataFrame:
+                          pushshift_files: Optional[List[str]] = None,
+                          fields: Optional[List[str]] = None) -> pd.DataFrame:
         """
         Collect Reddit posts for a specific Polymarket market
         
@@ -177,35 +337,34 @@ class RedditCollector:
             end_date: End of collection window
             subreddits: List of subreddits to filter (None = all)
             pushshift_files: List of Pushshift dump files to search
+            fields: Post fields to keep from dumps (None = all)
         """
         print(f"Collecting Reddit data for market {market_id}")
         
         # Build keyword list
-        keywords = []
-        if 'primary_queries' in query_set:
-            keywords.extend(query_set['primary_queries'])
-        if 'key_phrases' in query_set:
-            keywords.extend(query_set['key_phrases'][:5])  # Limit to top 5
+        keywords = self.query_keywords(query_set)
+        
+        # Daily shards: open only the days overlapping the window
+        if not pushshift_files and self.shard_dir:
+            pushshift_files = self.shard_files(start_date, end_date, subreddits)
+            print(f"Using {len(pushshift_files)} shards from {self.shard_dir}")
         
         all_posts = []
         
+        # Method 0: Social index (ingested once, see social_index.py)
+        if self.social_index is not None:
+            all_posts.append(self.collect_from_index(keywords, start_date, end_date, subreddits))
+        
         # Method 1: Pushshift dumps (preferred)
-        if pushshift_files:
+        elif pushshift_files:
             for dump_file in pushshift_files:
-                # Load dump
-                df = self.load_pushshift_dump(dump_file)
-                
-                # Filter by date
-                df = self.filter_by_date_range(df, start_date, end_date)
-                
-                # Filter by keywords
-                if keywords:
-                    df = self.filter_by_keywords(df, keywords)
-                
-                # Filter by subreddits
-                if subreddits:
-                    df = self.filter_by_subreddits(df, subreddits)
-                
+                # Load dump, filtering by date, keywords and subreddits while decoding
+                df = self.load_pushshift_dump(dump_file,
+                                              start_date=start_date,
+                                              end_date=end_date,
+                                              subreddits=subreddits,
+                                              keywords=keywords,
+                                              fields=fields)
                 all_posts.append(df)
         
         # Method 2: PRAW (fallback, limited)
@@ -218,14 +377,95 @@ class RedditCollector:
                     except Exception as e:
                         print(f"Error collecting from r/{subreddit}: {e}")
         
+        return self.save_market_posts(market_id, all_posts)
+
+    def collect_for_markets(self,
+                            markets: List[Dict],
+                            pushshift_files: Optional[List[str]] = None,
+                            subreddits: Optional[List[str]] = None,
+                            fields: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Batch version of collect_for_market for dump files: each dump is
+        scanned once and every post is routed to all markets whose time
+        window and keywords it matches, so the cost is one pass per dump
+        rather than one per market.
+        
+        Args:
+            markets: Dicts with 'market_id', 'query_set', 'start_date', 'end_date'
+            pushshift_files: List of Pushshift dump files to search (None =
+                the shards overlapping any market's window)
+            subreddits: List of subreddits to filter (None = all)
+            fields: Post fields to keep (None = all)
+        
+        Returns:
+            Dict of market_id -> DataFrame, each saved as in collect_for_market
+        """
+        print(f"Collecting Reddit data for {len(markets)} markets in a single pass")
+        if not markets:
+            return {}
+        if not pushshift_files and self.shard_dir:
+            pushshift_files = sorted({f for m in markets
+                                      for f in self.shard_files(m['start_date'], m['end_date'], subreddits)})
+            print(f"Using {len(pushshift_files)} shards from {self.shard_dir}")
+        
+        # Markets sorted by window start, so a post only visits markets already open.
+        # Open-ended bounds are -inf/+inf, as collect_for_market accepts None.
+        routes = sorted(
+            [(*route_bounds(m['start_date'], m['end_date']), m['market_id'],
+              self.build_post_filter(keywords=self.query_keywords(m['query_set'])))
+             for m in markets],
+            key=lambda r: r[0]
+        )
+        starts = [r[0] for r in routes]
+        # An undated post only matches markets with no bounds at all, as in collect_for_market
+        unbounded = [i for i, r in enumerate(routes) if r[0] == -math.inf and r[1] == math.inf]
+        subs = {s.lower() for s in subreddits} if subreddits else None
+        matched: Dict[str, List[Dict]] = {m['market_id']: [] for m in markets}
+        
+        # Checks shared by every market (overall window, subreddits) run while decoding
+        first_start, last_end = min(starts), max(r[1] for r in routes)
+        shared = PostFilter(None if first_start == -math.inf else first_start,
+                            None if last_end == math.inf else last_end, subs, None)
+        
+        for dump_file in pushshift_files or []:
+            for post in self.iter_pushshift_dump(dump_file, shared):
+                created = self.post_timestamp(post)
+                
+                kept = None
+                for i in (unbounded if created is None else range(bisect_right(starts, created))):
+                    _, end_ts, market_id, predicate = routes[i]
+                    if (created is not None and created > end_ts) or (predicate is not None and not predicate(post)):
+                        continue
+                    if kept is None:
+                        kept = post if fields is None else {k: post.get(k) for k in fields}
+                    matched[market_id].append(kept)
+        
+        return {
+            market_id: self.save_market_posts(market_id, [pd.DataFrame(posts, columns=fields)])
+            for market_id, posts in matched.items()
+        }
+
+    def shard_files(self,
+                    start_date: Optional[datetime],
+                    end_date: Optional[datetime],
+                    subreddits: Optional[List[str]] = None) -> List[str]:
+        """Shards in self.shard_dir overlapping the window (and holding any of the subreddits)"""
+        return shards_for_window(self.shard_dir, *window_bounds(start_date, end_date), subreddits)
+
+    def save_market_posts(self, market_id: str, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """Combine, de-duplicate and save the posts collected for one market"""
         # Combine all posts
-        if all_posts:
-            combined_df = pd.concat(all_posts, ignore_index=True)
-            combined_df = combined_df.drop_duplicates(subset=['id'])
+        if frames:
+            combined_df = pd.concat(frames, ignore_index=True)
+            if 'id' in combined_df.columns:
+                combined_df = combined_df.drop_duplicates(subset=['id'])
             
             # Save to file
             output_path = self.output_dir / f"market_{market_id}_reddit.csv"
-            combined_df.to_csv(output_path, index=False)
+            with METRICS.stage('reddit.save') as st:
+                combined_df.to_csv(output_path, index=False)
+                st.rows = len(combined_df)
+                st.bytes_written = output_path.stat().st_size
             
             print(f"Collected {len(combined_df)} posts, saved to {output_path}")
             return combined_df
@@ -8,13 +8,19 @@ Supports multiple data sources:
 - Note: Twitter API v2 requires authentication
 """
 
+import gzip
 import json
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple
 import os
 from pathlib import Path
-import gzip
+
+from dump_io import compression_suffix, iter_records
+from metrics import METRICS
+from social_shards import shards_for_window
+from text_match import KeywordMatcher
+from timestamps import TimestampParser, in_window, route_bounds, window_bounds
 
 try:
     import tweepy
@@ -23,6 +29,41 @@ except ImportError:
     TWEEPY_AVAILABLE = False
     print("Warning: tweepy not available. Install with: pip install tweepy")
 
+# Where the original tweet JSON goes: a 'raw_data' column, a gzipped
+# market_<id>_twitter_raw.jsonl.gz sidecar keyed by tweet_id, or nowhere
+RAW_DATA_MODES = ('inline', 'sidecar', 'none')
+
+
+class TweetColumns:
+    """
+    Column-wise accumulator for normalized tweets: one list per field,
+    built while streaming and turned into a DataFrame once at the end.
+    Fields missing from a tweet are stored as None.
+    """
+    
+    def __init__(self):
+        self.columns: Dict[str, List[Any]] = {}
+        self.n_rows = 0
+    
+    def __len__(self) -> int:
+        return self.n_rows
+    
+    def append(self, tweet: Dict):
+        for key, value in tweet.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = [None] * self.n_rows
+            column.append(value)
+        self.n_rows += 1
+        if len(tweet) < len(self.columns):
+            for column in self.columns.values():
+                if len(column) < self.n_rows:
+                    column.append(None)
+    
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+
 class TwitterCollector:
     """
     Collects Twitter/X data from public datasets or APIs
@@ -31,16 +72,40 @@ class TwitterCollector:
     def __init__(self, 
                  output_dir: str = "data/twitter",
                  dataset_dir: Optional[str] = None,
-                 api_config: Optional[Dict] = None):
+                 api_config: Optional[Dict] = None,
+                 keyword_word_boundary: bool = False,
+                 decode_workers: int = 1,
+                 social_index=None,
+                 shard_dir: Optional[str] = None,
+                 raw_data: str = 'inline'):
         """
         Args:
             output_dir: Directory to save collected data
             dataset_dir: Path to Twitter dataset files
             api_config: Dict with API credentials if using Twitter API
+            keyword_word_boundary: Match keywords as whole words only
+            decode_workers: Processes used to decode multi-frame .zst datasets
+            social_index: Optional SocialIndex (see social_index.py) queried
+                instead of scanning dataset files
+            shard_dir: Daily shard directory (see social_shards.py) used when
+                no dataset files are given; only shards overlapping a
+                market's window (plus undated tweets) are opened
+            raw_data: Where the original tweet JSON is kept: 'inline' (a
+                raw_data column), 'sidecar' (market_<id>_twitter_raw.jsonl.gz
+                keyed by tweet_id, dataset scans only) or 'none'
         """
+        if raw_data not in RAW_DATA_MODES:
+            raise ValueError(f"raw_data must be one of {RAW_DATA_MODES}, got {raw_data!r}")
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.dataset_dir = dataset_dir
+        self.keyword_word_boundary = keyword_word_boundary
+        self.decode_workers = decode_workers
+        self.social_index = social_index
+        self.shard_dir = shard_dir
+        self.raw_data = raw_data
+        # created_at format is detected once per collector (see timestamps.py)
+        self.timestamps = TimestampParser(name='twitter created_at')
         
         # Initialize API if config provided
         self.api = None
@@ -61,42 +126,53 @@ class TwitterCollector:
         - JSONL (one JSON per line)
         - JSON array
         - CSV with standard columns
+        each optionally compressed as .gz, .bz2 or .zst
         """
         dataset_path = Path(dataset_file)
         
-        # Determine compression
-        opener = open
-        if dataset_path.suffix == '.gz':
-            opener = gzip.open
-        
-        tweets = []
-        
-        print(f"Loading dataset: {dataset_file}")
-        
-        # Try JSONL first
-        if dataset_path.suffix in ['.jsonl', '.json']:
-            with opener(dataset_path, 'rt', encoding='utf-8') as f:
-                for line_num, line in enumerate(f):
-                    if line_num % 100000 == 0:
-                        print(f"  Processed {line_num} lines...")
-                    
-                    try:
-                        tweet = json.loads(line.strip())
-                        tweets.append(tweet)
-                    except json.JSONDecodeError:
-                        continue
-        elif dataset_path.suffix == '.csv':
+        if self._dataset_format(dataset_path) == '.csv':
             # Load CSV directly
-            df = pd.read_csv(dataset_path)
-            return df
+            print(f"Loading dataset: {dataset_file}")
+            return pd.read_csv(dataset_path)
         
-        return pd.DataFrame(tweets)
+        return pd.DataFrame(list(self.iter_dataset(dataset_file)))
+
+    @staticmethod
+    def _dataset_format(dataset_path: Path) -> str:
+        """File format suffix, looking through a compression suffix (bare compressed files are JSONL)"""
+        if compression_suffix(dataset_path):
+            inner = Path(dataset_path.stem).suffix
+            return inner if inner == '.csv' else '.jsonl'
+        return dataset_path.suffix
+
+    def iter_dataset(self, dataset_file: str, csv_chunksize: int = 100000) -> Iterator[Dict]:
+        """
+        Yield raw tweet dicts from a JSONL/JSON or CSV dataset (optionally
+        .gz/.bz2/.zst; multi-frame .zst JSONL is decoded with
+        self.decode_workers processes)
+        """
+        dataset_path = Path(dataset_file)
+        fmt = self._dataset_format(dataset_path)
+        
+        if fmt in ['.jsonl', '.json']:
+            yield from iter_records(dataset_path, workers=self.decode_workers)
+        elif fmt == '.csv':
+            print(f"Loading dataset: {dataset_file}")
+            # Same stage as JSONL scans in dump_io.iter_records
+            with METRICS.stage('dump_scan') as st:
+                st.bytes_read = dataset_path.stat().st_size
+                # pandas infers .gz/.bz2/.zst compression from the extension
+                for chunk in pd.read_csv(dataset_path, chunksize=csv_chunksize):
+                    st.rows += len(chunk)
+                    yield from chunk.to_dict('records')
     
-    def normalize_tweet_data(self, tweet: Dict) -> Dict:
+    def normalize_tweet_data(self, tweet: Dict, include_raw: Optional[bool] = None) -> Dict:
         """
         Normalize tweet data from different sources
         
-        Handles variations in field names across datasets
+        Handles variations in field names across datasets. include_raw adds
+        the original tweet as a JSON 'raw_data' field (default: only when
+        self.raw_data is 'inline').
         """
         normalized = {}
         
@@ -146,52 +222,127 @@ class TwitterCollector:
             normalized['mentions'] = [m.get('screen_name', '') for m in tweet['entities']['user_mentions']]
         
         # Preserve original fields
-        normalized['raw_data'] = json.dumps(tweet)
+        if include_raw is None:
+            include_raw = self.raw_data == 'inline'
+        if include_raw:
+            normalized['raw_data'] = json.dumps(tweet)
         
         return normalized
     
-    def filter_by_keywords(self, df: pd.DataFrame, keywords: List[str]) -> pd.DataFrame:
-        """Filter dataframe by keywords in text"""
+    def tweet_timestamp(self, tweet: Dict) -> Optional[int]:
+        """Unix seconds of a raw tweet's creation time, or None if unparseable"""
+        return self.timestamps.parse(self.normalize_tweet_data(tweet, include_raw=False).get('created_at'))
+
+    @staticmethod
+    def query_keywords(query_set: Dict) -> List[str]:
+        """Keywords searched for a market: primary queries plus the top 5 key phrases"""
+        keywords = []
+        if 'primary_queries' in query_set:
+            keywords.extend(query_set['primary_queries'])
+        if 'key_phrases' in query_set:
+            keywords.extend(query_set['key_phrases'][:5])
+        return keywords
+
+    def build_tweet_filter(self,
+                           start_date: Optional[datetime] = None,
+                           end_date: Optional[datetime] = None,
+                           keywords: Optional[List[str]] = None,
+                           hashtags: Optional[List[str]] = None,
+                           word_boundary: Optional[bool] = None) -> Optional[Callable[[Dict], bool]]:
+        """
+        Build a per-tweet predicate over normalized tweets, equivalent to
+        filter_by_date_range, filter_by_keywords and filter_by_hashtags.
+        Tweets whose created_at cannot be parsed are not date-filtered, as in
+        filter_by_date_range. word_boundary overrides
+        self.keyword_word_boundary. Returns None when no predicate is given.
+        """
+        start_ts, end_ts = window_bounds(start_date, end_date)
+        if word_boundary is None:
+            word_boundary = self.keyword_word_boundary
+        matcher = KeywordMatcher(keywords or [], word_boundary) or None
+        hashtag_matcher = self.hashtag_matcher(hashtags) if hashtags else None
+        
+        if start_ts is None and end_ts is None and matcher is None and hashtag_matcher is None:
+            return None
+        
+        def predicate(tweet: Dict) -> bool:
+            # Text checks first: they are cheaper than parsing created_at
+            if matcher is not None and not matcher.search(tweet.get('text')):
+                return False
+            if hashtag_matcher is not None:
+                tags = tweet.get('hashtags')
+                if not (isinstance(tags, list) and hashtag_matcher.search_any(tags)):
+                    return False
+            if start_ts is not None or end_ts is not None:
+                created = self.timestamps.parse(tweet.get('created_at'))
+                if created is not None:
+                    if start_ts is not None and created < start_ts:
+                        return False
+                    if end_ts is not None and created > end_ts:
+                        return False
+            return True
+        
+        return predicate
+
+    @staticmethod
+    def hashtag_matcher(hashtags: List[str]) -> KeywordMatcher:
+        """Matcher for hashtag targets: '#' stripped, substring match within each tag"""
+        return KeywordMatcher([h.lower().lstrip('#') for h in hashtags])
+
+    def filter_by_keywords(self, df: pd.DataFrame, keywords: List[str],
+                           record_matches: bool = False) -> pd.DataFrame:
+        """
+        Filter dataframe by keywords in text
+        
+        All keywords are matched in one pass per text (see text_match).
+        With record_matches, a 'matched_keywords' column lists the keywords
+        each kept tweet hit, joined by '|'.
+        """
         if 'text' not in df.columns:
             return df
         
-        keyword_mask = pd.Series([False] * len(df))
+        matcher = KeywordMatcher(keywords, self.keyword_word_boundary)
+        
+        if record_matches:
+            matched = df['text'].map(lambda t: '|'.join(matcher.matches(t)))
+            df = df.assign(matched_keywords=matched)
+            return df[matched != '']
         
-        for keyword in keywords:
-            keyword_mask |= df['text'].str.contains(keyword, case=False, na=False)
+        keyword_mask = df['text'].map(matcher.search).astype(bool)
         
         return df[keyword_mask]
     
     def filter_by_date_range(self, df: pd.DataFrame,
                             start_date: datetime,
                             end_date: datetime) -> pd.DataFrame:
-        """Filter dataframe by date range"""
+        """
+        Filter dataframe by date range
+        
+        Tweets whose created_at cannot be parsed are kept (and counted in
+        self.timestamps), as in build_tweet_filter.
+        """
         if 'created_at' not in df.columns:
             return df
         
-        # Try to parse dates
-        try:
-            df['created_dt'] = pd.to_datetime(df['created_at'])
-        except:
-            return df
+        unparseable = self.timestamps.unparseable
+        created = self.timestamps.parse_many(df['created_at'])
+        if self.timestamps.unparseable > unparseable:
+            print(f"  {self.timestamps.unparseable - unparseable} tweets with unparseable created_at kept")
         
-        mask = (df['created_dt'] >= start_date) & (df['created_dt'] <= end_date)
-        return df[mask].drop('created_dt', axis=1)
+        mask = in_window(created, *window_bounds(start_date, end_date))
+        return df[mask]
     
     def filter_by_hashtags(self, df: pd.DataFrame, hashtags: List[str]) -> pd.DataFrame:
         """Filter dataframe by hashtags"""
         if 'hashtags' not in df.columns:
             return df
         
-        # Handle list of hashtags vs string
-        def contains_hashtag(hashtag_list, target_hashtags):
-            if isinstance(hashtag_list, list):
-                return any(any(t.lower() in str(h).lower() for h in hashtag_list) for t in target_hashtags)
-            return False
+        matcher = self.hashtag_matcher(hashtags)
         
-        hashtag_mask = df['hashtags'].apply(
-            lambda x: contains_hashtag(x, [h.lower().lstrip('#') for h in hashtags])
-        )
+        # Handle list of hashtags vs string
+        hashtag_mask = df['hashtags'].map(
+            lambda x: isinstance(x, list) and matcher.search_any(x)
+        ).astype(bool)
         
         return df[hashtag_mask]
     
@@ -254,42 +405,36 @@ class TwitterCollector:
         print(f"Collecting Twitter data for market {market_id}")
         
         # Build keyword list
-        keywords = []
-        if 'primary_queries' in query_set:
-            keywords.extend(query_set['primary_queries'])
-        if 'key_phrases' in query_set:
-            keywords.extend(query_set['key_phrases'][:5])
+        keywords = self.query_keywords(query_set)
         
         hashtags = query_set.get('hashtags', [])
         
-        all_tweets = []
+        # Daily shards: open only the days overlapping the window
+        if not dataset_files and self.shard_dir:
+            dataset_files = self.shard_files(start_date, end_date)
+            print(f"Using {len(dataset_files)} shards from {self.shard_dir}")
         
-        # Method 1: Load from dataset files (preferred)
-        if dataset_files:
+        all_tweets = []
+        raw_records = None
+        
+        # Method 0: Social index (ingested once, see social_index.py)
+        if self.social_index is not None:
+            all_tweets.append(self.collect_from_index(keywords, hashtags, start_date, end_date))
+        
+        # Method 1: Stream dataset files (preferred), normalizing and
+        # filtering each tweet as it is read
+        elif dataset_files:
+            predicate = self.build_tweet_filter(start_date, end_date, keywords, hashtags)
+            columns = TweetColumns()
+            raw_records = [] if self.raw_data == 'sidecar' else None
             for dataset_file in dataset_files:
-                # Load dataset
-                df = self.load_from_dataset(dataset_file)
-                
-                # Normalize data
-                if not df.empty:
-                    normalized_tweets = df.apply(
-                        lambda row: self.normalize_tweet_data(row.to_dict()),
-                        axis=1
-                    )
-                    df = pd.DataFrame(list(normalized_tweets))
-                    
-                    # Filter by date
-                    df = self.filter_by_date_range(df, start_date, end_date)
-                    
-                    # Filter by keywords
-                    if keywords:
-                        df = self.filter_by_keywords(df, keywords)
-                    
-                    # Filter by hashtags
-                    if hashtags:
-                        df = self.filter_by_hashtags(df, hashtags)
-                    
-                    all_tweets.append(df)
+                for raw in self.iter_dataset(dataset_file):
+                    # raw_data is serialized only for tweets that are kept
+                    tweet = self.normalize_tweet_data(raw, include_raw=False)
+                    if predicate is None or predicate(tweet):
+                        self._keep_raw(tweet, raw, raw_records)
+                        columns.append(tweet)
+            all_tweets.append(columns.to_frame())
         
         # Method 2: Use Twitter API (requires auth, limited)
         elif self.api and keywords:
@@ -305,20 +450,166 @@ class TwitterCollector:
                 except Exception as e:
                     print(f"Error collecting via API for '{keyword}': {e}")
         
+        return self.save_market_tweets(market_id, all_tweets, raw_records)
+
+    def iter_index_rows(self, dataset_file: str) -> Iterator[Dict]:
+        """Rows for SocialIndex.add_posts: normalized tweets keyed by tweet_id"""
+        for raw in self.iter_dataset(dataset_file):
+            tweet = self.normalize_tweet_data(raw)
+            hashtags = tweet.get('hashtags')
+            text = tweet.get('text')
+            yield {
+                'post_id': tweet.get('tweet_id'),
+                'created_utc': self.timestamps.parse(tweet.get('created_at')),
+                'subreddit': None,
+                'hashtags': hashtags if isinstance(hashtags, list) else None,
+                'text': text if isinstance(text, str) else '',
+                'record': tweet,
+            }
+
+    def collect_from_index(self,
+                           keywords: List[str],
+                           hashtags: List[str],
+                           start_date: datetime,
+                           end_date: datetime) -> pd.DataFrame:
+        """
+        Query the social index instead of scanning datasets. The index matches
+        whole words, so hits (and hashtags) are re-checked in Python with
+        word-boundary keyword matching.
+        """
+        start_ts, end_ts = window_bounds(start_date, end_date)
+        with METRICS.stage('twitter.index_query') as st:
+            records = self.social_index.query(
+                'twitter',
+                keywords=keywords,
+                start_ts=start_ts,
+                end_ts=end_ts,
+                keep_undated=True
+            )
+            st.rows = len(records)
+        verify = self.build_tweet_filter(start_date, end_date, keywords, hashtags, word_boundary=True)
+        tweets = [r for r in records if verify is None or verify(r)]
+        print(f"Index returned {len(tweets)} tweets")
+        return pd.DataFrame(tweets)
+
+    def collect_for_markets(self,
+                            markets: List[Dict],
+                            dataset_files: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Batch version of collect_for_market for dataset files: each file is
+        read and normalized once, and every tweet is routed to all markets
+        whose time window, keywords and hashtags it matches.
+        
+        Args:
+            markets: Dicts with 'market_id', 'query_set', 'start_date', 'end_date'
+            dataset_files: List of dataset files to search (None = the shards
+                overlapping any market's window)
+        
+        Returns:
+            Dict of market_id -> DataFrame, each saved as in collect_for_market
+        """
+        print(f"Collecting Twitter data for {len(markets)} markets in a single pass")
+        if not dataset_files and self.shard_dir:
+            dataset_files = sorted({f for m in markets
+                                    for f in self.shard_files(m['start_date'], m['end_date'])})
+            print(f"Using {len(dataset_files)} shards from {self.shard_dir}")
+        
+        # Windows are checked here so each tweet's created_at is parsed once
+        routes = [
+            (*route_bounds(m['start_date'], m['end_date']), m['market_id'],
+             self.build_tweet_filter(keywords=self.query_keywords(m['query_set']),
+                                     hashtags=m['query_set'].get('hashtags', [])))
+            for m in markets
+        ]
+        matched = {m['market_id']: TweetColumns() for m in markets}
+        raw_records = ({m['market_id']: [] for m in markets}
+                       if self.raw_data == 'sidecar' else None)
+        
+        for dataset_file in dataset_files or []:
+            for raw in self.iter_dataset(dataset_file):
+                tweet = self.normalize_tweet_data(raw, include_raw=False)
+                created = self.timestamps.parse(tweet.get('created_at'))
+                kept = False
+                for start_ts, end_ts, market_id, predicate in routes:
+                    if created is not None and not (start_ts <= created <= end_ts):
+                        continue
+                    if predicate is None or predicate(tweet):
+                        if not kept:
+                            self._keep_raw(tweet, raw, None)
+                            kept = True
+                        matched[market_id].append(tweet)
+                        if raw_records is not None:
+                            raw_records[market_id].append((tweet.get('tweet_id'), raw))
+        
+        return {
+            market_id: self.save_market_tweets(market_id, [columns.to_frame()],
+                                               raw_records[market_id] if raw_records is not None else None)
+            for market_id, columns in matched.items()
+        }
+
+    def shard_files(self,
+                    start_date: Optional[datetime],
+                    end_date: Optional[datetime]) -> List[str]:
+        """Shards in self.shard_dir overlapping the window, plus the undated shard"""
+        return shards_for_window(self.shard_dir, *window_bounds(start_date, end_date),
+                                 include_undated=True)
+
+    def save_market_tweets(self, market_id: str, frames: List[pd.DataFrame],
+                           raw_records: Optional[List[Tuple[Optional[str], Dict]]] = None) -> pd.DataFrame:
+        """
+        Combine, de-duplicate and save the tweets collected for one market.
+        raw_records, (tweet_id, original tweet) pairs, go to the raw sidecar.
+        """
         # Combine all tweets
-        if all_tweets:
-            combined_df = pd.concat(all_tweets, ignore_index=True)
-            combined_df = combined_df.drop_duplicates(subset=['tweet_id'])
+        if frames:
+            combined_df = pd.concat(frames, ignore_index=True)
+            if 'tweet_id' in combined_df.columns:
+                combined_df = combined_df.drop_duplicates(subset=['tweet_id'])
             
             # Save to file
             output_path = self.output_dir / f"market_{market_id}_twitter.csv"
-            combined_df.to_csv(output_path, index=False)
-            
-            print(f"Collected {len(combined_df)} tweets, saved to {output_path}")
+            with METRICS.stage('twitter.save') as st:
+                combined_df.to_csv(output_path, index=False)
+                st.rows = len(combined_df)
+                st.bytes_written = output_path.stat().st_size
+                
+                print(f"Collected {len(combined_df)} tweets, saved to {output_path}")
+                
+                if raw_records is not None:
+                    st.bytes_written += self.save_raw_sidecar(market_id, raw_records).stat().st_size
             return combined_df
         
         return pd.DataFrame()
 
+    def _keep_raw(self, tweet: Dict, raw: Dict, raw_records: Optional[List]):
+        """Attach the original tweet to a kept tweet according to self.raw_data"""
+        if self.raw_data == 'inline':
+            tweet['raw_data'] = json.dumps(raw)
+        elif raw_records is not None:
+            raw_records.append((tweet.get('tweet_id'), raw))
+
+    def raw_sidecar_path(self, market_id: str) -> Path:
+        return self.output_dir / f"market_{market_id}_twitter_raw.jsonl.gz"
+
+    def save_raw_sidecar(self, market_id: str, raw_records: List[Tuple[Optional[str], Dict]]) -> Path:
+        """Write {"tweet_id", "raw"} lines for each tweet_id once (first occurrence, as in the CSV)"""
+        output_path = self.raw_sidecar_path(market_id)
+        seen = set()
+        with gzip.open(output_path, 'wt', encoding='utf-8') as f:
+            for tweet_id, raw in raw_records:
+                if tweet_id is not None:
+                    if tweet_id in seen:
+                        continue
+                    seen.add(tweet_id)
+                f.write(json.dumps({'tweet_id': tweet_id, 'raw': raw}, default=str) + '\n')
+        return output_path
+
+    @staticmethod
+    def load_raw_sidecar(path: str) -> Dict[str, Dict]:
+        """tweet_id -> original tweet from a raw sidecar"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return {rec['tweet_id']: rec['raw'] for rec in map(json.loads, f)}
+
 def main():
     """Example usage"""
     collector = TwitterCollector(
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+dump_io.py
+──────────
+Line-oriented readers for compressed social-media dumps (.zst, .bz2, .gz or
+plain JSONL), shared by the Reddit and Twitter collectors.
+
+.zst files are streamed with a 2 GB maximum window, as needed by the
+long-window Reddit archive dumps. A .zst file made of several frames (e.g.
+written with `zstd --block-size` or `pzstd`) can also be decoded in parallel:
+frame boundaries are found by walking the frame/block headers without
+decompressing, runs of frames are handed to worker processes, and records
+come back in file order. Lines that straddle two runs are stitched together
+in the parent. bz2/gzip members cannot be located without decoding, so those
+formats (and single-frame .zst files) are always read on one core.
+
+Requires zstandard for .zst files (pip install zstandard).
+
+Usage:
+  from dump_io import iter_records
+
+  for post in iter_records("RS_2024-01.zst", workers=8):
+      ...
+"""
+from __future__ import annotations
+
+import bz2
+import gzip
+import io
+import json
+import struct
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, IO, Iterator, List, Optional, Tuple, Union
+
+from metrics import METRICS
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+PathLike = Union[str, Path]
+Predicate = Callable[[Dict[str, Any]], bool]
+
+ZSTD_MAX_WINDOW = 2 ** 31                  # Reddit archive dumps use --long=31
+DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024     # compressed bytes handed to one worker task
+PROGRESS_EVERY = 100000
+
+_ZSTD_MAGIC = 0xFD2FB528
+_SKIPPABLE_MASK = 0xFFFFFFF0
+_SKIPPABLE_MAGIC = 0x184D2A50
+
+
+def _require_zstd() -> None:
+    if not ZSTD_AVAILABLE:
+        raise ImportError(".zst dumps need zstandard. Install with: pip install zstandard")
+
+
+def compression_suffix(path: PathLike) -> str:
+    """'.zst', '.bz2', '.gz' or '' for uncompressed files."""
+    suffix = Path(path).suffix
+    return suffix if suffix in (".zst", ".bz2", ".gz") else ""
+
+
+def open_text(path: PathLike) -> IO[str]:
+    """Open a possibly compressed dump as a UTF-8 text stream."""
+    p = Path(path)
+    comp = compression_suffix(p)
+    if comp == ".zst":
+        _require_zstd()
+        dctx = zstandard.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW)
+        raw = dctx.stream_reader(p.open("rb"), read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+    if comp == ".bz2":
+        return bz2.open(p, "rt", encoding="utf-8")
+    if comp == ".gz":
+        return gzip.open(p, "rt", encoding="utf-8")
+    return p.open("r", encoding="utf-8")
+
+
+def open_append(path: PathLike) -> IO[bytes]:
+    """
+    Open a (possibly compressed) file for appending bytes. Each open adds a
+    new gzip member / bz2 stream / zstd frame, which the readers above
+    decode as one continuous stream.
+    """
+    p = Path(path)
+    comp = compression_suffix(p)
+    if comp == ".zst":
+        _require_zstd()
+        return zstandard.ZstdCompressor(level=10).stream_writer(p.open("ab"), closefd=True)
+    if comp == ".bz2":
+        return bz2.open(p, "ab")
+    if comp == ".gz":
+        return gzip.open(p, "ab")
+    return p.open("ab")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# zstd frame scan
+# ─────────────────────────────────────────────────────────────────────────────
+
+def zstd_frames(path: PathLike) -> List[Tuple[int, int]]:
+    """
+    (offset, length) of every frame in a .zst file, found by reading frame and
+    block headers only. Raises ValueError on anything that is not zstd.
+    """
+    frames = []
+    with Path(path).open("rb") as f:
+        size = f.seek(0, io.SEEK_END)
+        pos = 0
+        while pos < size:
+            f.seek(pos)
+            header = f.read(4)
+            if len(header) < 4:
+                raise ValueError(f"Truncated zstd frame at byte {pos}")
+            magic = struct.unpack("<I", header)[0]
+            if magic & _SKIPPABLE_MASK == _SKIPPABLE_MAGIC:
+                n = struct.unpack("<I", f.read(4))[0]
+                end = pos + 8 + n
+            elif magic == _ZSTD_MAGIC:
+                fhd = f.read(1)[0]
+                fcs_flag, single_segment = fhd >> 6, (fhd >> 5) & 1
+                has_checksum, dict_flag = (fhd >> 2) & 1, fhd & 3
+                fcs_size = (1 if single_segment else 0, 2, 4, 8)[fcs_flag]
+                end = pos + 5 + (0 if single_segment else 1) + (0, 1, 2, 4)[dict_flag] + fcs_size
+                while True:
+                    f.seek(end)
+                    raw = f.read(3)
+                    if len(raw) < 3:
+                        raise ValueError(f"Truncated zstd block at byte {end}")
+                    block = int.from_bytes(raw, "little")
+                    last, block_type, block_size = block & 1, (block >> 1) & 3, block >> 3
+                    if block_type == 3:
+                        raise ValueError(f"Reserved zstd block type at byte {end}")
+                    end += 3 + (1 if block_type == 1 else block_size)
+                    if last:
+                        break
+                end += 4 if has_checksum else 0
+            else:
+                raise ValueError(f"Not a zstd frame at byte {pos}")
+            frames.append((pos, end - pos))
+            pos = end
+    return frames
+
+
+def _group_frames(frames: List[Tuple[int, int]], chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Merge consecutive frames into (offset, length) runs of about chunk_bytes."""
+    runs: List[Tuple[int, int]] = []
+    for offset, length in frames:
+        if runs and runs[-1][1] < chunk_bytes:
+            runs[-1] = (runs[-1][0], runs[-1][1] + length)
+        else:
+            runs.append((offset, length))
+    return runs
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Records
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _parse(line: Union[str, bytes], predicate: Optional[Predicate]) -> Optional[Dict[str, Any]]:
+    try:
+        record = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(record, dict):
+        return None
+    if predicate is not None and not predicate(record):
+        return None
+    return record
+
+
+def _decode_run(path: str, offset: int, length: int, predicate: Optional[Predicate]):
+    """
+    Worker: decompress one run of frames and parse its complete lines.
+    Returns (head, records, tail, n_lines); head/tail are the partial lines
+    at either end (head is everything when the run holds no newline).
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        compressed = f.read(length)
+    dctx = zstandard.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW)
+    with dctx.stream_reader(io.BytesIO(compressed), read_across_frames=True) as reader:
+        data = reader.read()
+    # b"\n" never occurs inside a multi-byte UTF-8 sequence, so splitting bytes is safe
+    first = data.find(b"\n")
+    if first < 0:
+        return data, [], None, 0
+    last = data.rfind(b"\n")
+    lines = data[first + 1 : last].split(b"\n") if last > first else []
+    records = [r for r in (_parse(line, predicate) for line in lines if line.strip()) if r is not None]
+    return data[:first], records, data[last + 1 :], len(lines)
+
+
+def _iter_parallel(
+    path: Path,
+    runs: List[Tuple[int, int]],
+    workers: int,
+    predicate: Optional[Predicate],
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """Yield (lines seen, records) per run, in file order, with bounded in-flight runs."""
+    pending = b""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window: Deque[Future] = deque()
+        queued = iter(runs)
+        for offset, length in queued:
+            window.append(pool.submit(_decode_run, str(path), offset, length, predicate))
+            if len(window) >= 2 * workers:
+                break
+        while window:
+            head, records, tail, n_lines = window.popleft().result()
+            nxt = next(queued, None)
+            if nxt is not None:
+                window.append(pool.submit(_decode_run, str(path), nxt[0], nxt[1], predicate))
+            if tail is None:
+                pending += head
+                continue
+            stitched = pending + head
+            pending = tail
+            first = _parse(stitched, predicate) if stitched.strip() else None
+            yield n_lines + 1, ([first] if first is not None else []) + records
+        if pending.strip():
+            last = _parse(pending, predicate)
+            yield 1, [last] if last is not None else []
+
+
+def iter_records(
+    path: PathLike,
+    predicate: Optional[Predicate] = None,
+    workers: int = 1,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield each JSON object of a JSONL dump that passes predicate, in file
+    order, skipping undecodable lines.
+
+    With workers > 1 a multi-frame .zst file is decoded, parsed and filtered
+    in worker processes; predicate must then be picklable (a module-level
+    function or an instance of a module-level class, not a lambda).
+    """
+    p = Path(path)
+    print(f"Loading dump file: {path}")
+
+    runs: List[Tuple[int, int]] = []
+    if workers > 1 and compression_suffix(p) == ".zst":
+        _require_zstd()
+        runs = _group_frames(zstd_frames(p), chunk_bytes)
+        if len(runs) < 2:
+            print("  Fewer than two frame runs – decoding on one core")
+
+    # One 'dump_scan' stage per file: lines read, compressed bytes on disk,
+    # wall time including the consumer's work between records
+    with METRICS.stage("dump_scan") as st:
+        st.bytes_read = p.stat().st_size
+        seen = 0
+        next_report = 0
+        if len(runs) >= 2:
+            print(f"  Decoding {len(runs)} frame runs on {workers} workers")
+            for n_lines, records in _iter_parallel(p, runs, workers, predicate):
+                seen += n_lines
+                st.rows = seen
+                if seen >= next_report:
+                    print(f"  Processed {seen} lines...")
+                    next_report = seen + PROGRESS_EVERY
+                yield from records
+            return
+
+        line_num = -1
+        try:
+            with open_text(p) as f:
+                for line_num, line in enumerate(f):
+                    if line_num % PROGRESS_EVERY == 0:
+                        print(f"  Processed {line_num} lines...")
+                    record = _parse(line, predicate)
+                    if record is not None:
+                        yield record
+        finally:
+            st.rows = line_num + 1
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+http_client.py
+──────────────
+Shared HTTP client for the Polymarket Gamma/CLOB collectors.
+
+One pooled requests.Session per client (keep-alive, bounded connections per
+host), Retry-After aware exponential backoff, an optional token-bucket rate
+limit shared by all threads, and per-endpoint latency histograms and
+retry/429 counters (exported with the run metrics, see metrics.py).
+
+Usage:
+  from http_client import HttpClient
+
+  client = HttpClient(log=log)
+  data = client.get("https://clob.polymarket.com/prices-history", params={...})
+  client.log_stats()
+"""
+from __future__ import annotations
+
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import Histogram
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_SEC = 1.5
+DEFAULT_MAX_BACKOFF_SEC = 60.0
+DEFAULT_POOL_CONNECTIONS = 4       # number of distinct hosts kept pooled
+DEFAULT_POOL_MAXSIZE = 16          # max open connections per host
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_ID_SEGMENT = re.compile(r"^(\d+|0x[0-9a-fA-F]+)$")
+
+
+def _default_log(msg: str) -> None:
+    print(f"[INFO] {msg}", flush=True)
+
+
+def endpoint_key(url: str) -> str:
+    """Collapse a URL to 'host/path' with id-like path segments replaced by '{id}'."""
+    parts = urlsplit(url)
+    segments = ["{id}" if _ID_SEGMENT.match(seg) else seg for seg in parts.path.split("/")]
+    return parts.netloc + "/".join(segments)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the Retry-After delay in seconds (delta-seconds or HTTP-date form)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Thread-safe token bucket; acquire() blocks until a request may be sent."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = float(rate)
+        self.capacity = float(burst) if burst is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        # Reserve a token under the lock (the balance may go negative), then
+        # sleep outside it so other threads can queue their reservations.
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    successes: int = 0
+    failures: int = 0
+    retries: int = 0
+    throttled: int = 0
+    latency_total_sec: float = 0.0
+    latency_max_sec: float = 0.0
+    latency: Histogram = field(default_factory=Histogram)
+
+    def as_dict(self) -> Dict[str, Any]:
+        mean = self.latency_total_sec / self.requests if self.requests else 0.0
+        p95 = self.latency.quantile(0.95)
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "latency_mean_sec": round(mean, 4),
+            "latency_max_sec": round(self.latency_max_sec, 4),
+            "latency_p95_sec": p95,
+            "latency_histogram": self.latency.as_dict(),
+        }
+
+
+class HttpClient:
+    """
+    Thread-safe pooled GET client with adaptive backoff.
+
+    A 429/5xx response puts the whole host into a cooldown (Retry-After when
+    the server sends one, exponential backoff with jitter otherwise), so
+    concurrent callers back off together instead of hammering the API.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff_sec: float = DEFAULT_BACKOFF_SEC,
+        max_backoff_sec: float = DEFAULT_MAX_BACKOFF_SEC,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        rate_per_sec: Optional[float] = None,
+        log: Callable[[str], None] = _default_log,
+    ) -> None:
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_sec = backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.log = log
+        self.limiter = RateLimiter(rate_per_sec) if rate_per_sec else None
+
+        self.session = requests.Session()
+        # pool_block=True makes pool_maxsize a hard per-host connection limit.
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EndpointStats] = {}
+        self._cooldown_until: Dict[str, float] = {}
+
+    # ── backoff ───────────────────────────────────────────────────────────────
+
+    def _backoff(self, attempt: int) -> float:
+        base = min(self.max_backoff_sec, self.backoff_sec * (2 ** (attempt - 1)))
+        return base * (0.5 + random.random() / 2)
+
+    def _wait_for_host(self, host: str) -> None:
+        with self._lock:
+            until = self._cooldown_until.get(host, 0.0)
+        delay = until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _set_cooldown(self, host: str, delay: float) -> None:
+        with self._lock:
+            until = time.monotonic() + delay
+            if until > self._cooldown_until.get(host, 0.0):
+                self._cooldown_until[host] = until
+
+    def _record(self, key: str, latency: Optional[float] = None, **counts: int) -> None:
+        with self._lock:
+            st = self._stats.setdefault(key, EndpointStats())
+            if latency is not None:
+                st.requests += 1
+                st.latency_total_sec += latency
+                st.latency_max_sec = max(st.latency_max_sec, latency)
+                st.latency.observe(latency)
+            for name, n in counts.items():
+                setattr(st, name, getattr(st, name) + n)
+
+    # ── public API ────────────────────────────────────────────────────────────
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        key = endpoint_key(url)
+        host = urlsplit(url).netloc
+        last_err: Exception | None = None
+
+        for attempt in range(1, self.retries + 1):
+            if attempt > 1:
+                self._record(key, retries=1)
+            self._wait_for_host(host)
+            if self.limiter is not None:
+                self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                r = self.session.get(url, params=params, timeout=timeout or self.timeout)
+            except requests.RequestException as exc:
+                self._record(key, time.monotonic() - started)
+                last_err = exc
+                wait = self._backoff(attempt)
+                self.log(f"GET error on {key}: {exc} – retrying in {wait:.1f}s ({attempt}/{self.retries})")
+                time.sleep(wait)
+                continue
+            self._record(key, time.monotonic() - started)
+
+            if r.status_code in RETRY_STATUSES:
+                retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                wait = retry_after if retry_after is not None else self._backoff(attempt)
+                wait = min(wait, self.max_backoff_sec)
+                if r.status_code == 429:
+                    self._record(key, throttled=1)
+                self._set_cooldown(host, wait)
+                last_err = RuntimeError(f"HTTP {r.status_code}")
+                self.log(f"HTTP {r.status_code} on {key} – retrying in {wait:.1f}s ({attempt}/{self.retries})")
+                continue
+
+            try:
+                r.raise_for_status()
+                data = r.json()
+            except ValueError as exc:  # requests' JSONDecodeError subclasses ValueError
+                last_err = exc
+                time.sleep(self._backoff(attempt))
+                continue
+            except requests.HTTPError as exc:
+                # Non-retryable 4xx: fail fast rather than burning retries.
+                self._record(key, failures=1)
+                raise RuntimeError(f"GET failed: {url} params={params} err={exc}") from exc
+            self._record(key, successes=1)
+            return data
+
+        self._record(key, failures=1)
+        raise RuntimeError(f"GET failed after {self.retries} retries: {url} params={params} err={last_err}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {key: st.as_dict() for key, st in sorted(self._stats.items())}
+
+    def log_stats(self) -> None:
+        for key, st in self.stats().items():
+            p95 = f"{st['latency_p95_sec']:g}s" if st['latency_p95_sec'] is not None else "inf"
+            self.log(
+                f"HTTP {key}: requests={st['requests']} ok={st['successes']} failed={st['failures']} "
+                f"retries={st['retries']} 429s={st['throttled']} "
+                f"latency mean={st['latency_mean_sec']:.3f}s p95<={p95} max={st['latency_max_sec']:.3f}s"
+            )
+
+    def close(self) -> None:
+        self.session.close()
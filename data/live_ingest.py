@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+live_ingest.py
+──────────────
+Long-running asyncio service that keeps a markets log and a prices JSONL
+store current, instead of rerunning fetch_markets_by_tag_id and
+fetch_prices_by_tag from scratch.
+
+  market poller   every --market-poll-sec, pages Gamma /markets for the tag
+                  ids (open markets only). New or changed markets (by
+                  updatedAt, else a hash of the record) are appended to the
+                  markets log and their tokens scheduled; a market that
+                  drops out of the open set gets one last refresh and is
+                  unscheduled.
+  scheduler       a heap of (due time, token). A token is due once its next
+                  candle should be complete: last candle + fidelity +
+                  --settle-sec, or --retry-sec after a refresh that found
+                  nothing new.
+  workers         --workers tasks fetch only the window after the last
+                  stored candle (price_store.history_window_params) and
+                  append delta rows through ManifestJsonlWriter, so the
+                  store stays readable by the notebooks and resumable.
+
+Per-market state (fingerprint, token list) and scheduling state (heap
+entry, token -> market) are kept for open markets only: a closed market
+is dropped after its tokens' last refresh, and markets replayed from the
+log at startup are dropped by the first poll if they are no longer open.
+The last-candle timestamp stays for every token ever stored (one int each;
+the state file needs it so a reopened market is not refetched from
+scratch). Histories are held only while in flight, and the work queue
+holds at most 2 x workers tokens. Appends, group commits and state saves
+run in worker threads, so fsyncs never stall the event loop.
+SIGINT/SIGTERM stop the poller and scheduler, let in-flight fetches
+finish, commit the writer and save the last-candle state.
+
+The markets log is append-only: the last line for a market id wins.
+
+Usage:
+  python data/live_ingest.py --tag-id 144 339 --markets-out data/live/markets.jsonl --prices-out data/live/prices.jsonl
+  python data/live_ingest.py --tag-id 144 --once            # one poll + one refresh of every token, then exit
+  python data/live_ingest.py --tag-id 144 --gamma-base http://127.0.0.1:8000 --clob-base http://127.0.0.1:8000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import heapq
+import json
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from collect_polymarket import extract_clob_token_ids
+from http_client import HttpClient
+from metrics import METRICS
+from price_store import (
+    ManifestJsonlWriter,
+    history_window_params,
+    last_ts_path,
+    load_or_scan_last_timestamps,
+    max_timestamp,
+    new_candles,
+    recover_manifest,
+    save_last_timestamps,
+)
+
+PathLike = Union[str, Path]
+
+GAMMA_BASE = "https://gamma-api.polymarket.com"
+CLOB_BASE = "https://clob.polymarket.com"
+PAGE_SIZE = 100
+
+DEFAULT_MARKETS_OUT = Path("data/live/markets.jsonl")
+DEFAULT_PRICES_OUT = Path("data/live/prices.jsonl")
+DEFAULT_FIDELITY_MIN = 720
+DEFAULT_INTERVAL = "max"
+DEFAULT_MARKET_POLL_SEC = 300.0
+DEFAULT_SETTLE_SEC = 60.0           # wait after a candle closes before asking for it
+DEFAULT_RETRY_SEC = 600.0           # re-ask after a refresh that returned nothing new
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 10.0                 # requests/s across Gamma + CLOB
+DEFAULT_STATE_EVERY_SEC = 60.0
+DEFAULT_STATUS_EVERY_SEC = 60.0
+
+
+def log(msg: str) -> None:
+    print(f"[INFO] {msg}", flush=True)
+
+
+def market_fingerprint(market: Dict[str, Any]) -> str:
+    """updatedAt when Gamma sends it, else a hash of the whole record."""
+    updated = market.get("updatedAt")
+    if updated:
+        return str(updated)
+    blob = json.dumps(market, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def market_key(market: Dict[str, Any]) -> str:
+    return str(market.get("id") or market.get("conditionId") or "")
+
+
+class TokenSchedule:
+    """
+    Min-heap of (due, token_id) with one live entry per token. Rescheduling
+    or removing a token leaves its old heap entry behind; stale entries are
+    skipped on pop and the heap is rebuilt when they outnumber live ones.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, Tuple[float, int]] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, token_id: object) -> bool:
+        return token_id in self._due
+
+    def schedule(self, token_id: str, due: float) -> None:
+        self._seq += 1
+        self._due[token_id] = (due, self._seq)
+        heapq.heappush(self._heap, (due, self._seq, token_id))
+        if len(self._heap) > 2 * len(self._due) + 1000:
+            self._heap = [(d, s, t) for t, (d, s) in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def _drop_stale(self) -> None:
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][:2]:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> Optional[str]:
+        """Remove and return the earliest token due at or before now (None if none)."""
+        self._drop_stale()
+        if not self._heap or self._heap[0][0] > now:
+            return None
+        _, _, token_id = heapq.heappop(self._heap)
+        del self._due[token_id]
+        return token_id
+
+
+class LiveIngest:
+    """Market poller + per-token candle scheduler writing to a prices JSONL store."""
+
+    def __init__(
+        self,
+        tag_ids: List[int],
+        markets_out: PathLike = DEFAULT_MARKETS_OUT,
+        prices_out: PathLike = DEFAULT_PRICES_OUT,
+        gamma_base: str = GAMMA_BASE,
+        clob_base: str = CLOB_BASE,
+        fidelity_min: int = DEFAULT_FIDELITY_MIN,
+        interval: str = DEFAULT_INTERVAL,
+        market_poll_sec: float = DEFAULT_MARKET_POLL_SEC,
+        settle_sec: float = DEFAULT_SETTLE_SEC,
+        retry_sec: float = DEFAULT_RETRY_SEC,
+        workers: int = DEFAULT_WORKERS,
+        rate_per_sec: Optional[float] = DEFAULT_RATE,
+        state_every_sec: float = DEFAULT_STATE_EVERY_SEC,
+        status_every_sec: float = DEFAULT_STATUS_EVERY_SEC,
+        client: Optional[HttpClient] = None,
+    ) -> None:
+        self.tag_ids = list(tag_ids)
+        self.markets_out = Path(markets_out)
+        self.prices_out = Path(prices_out)
+        self.gamma_base = gamma_base.rstrip("/")
+        self.clob_base = clob_base.rstrip("/")
+        self.fidelity_min = fidelity_min
+        self.fidelity_sec = fidelity_min * 60
+        self.interval = interval
+        self.market_poll_sec = market_poll_sec
+        self.settle_sec = settle_sec
+        self.retry_sec = min(retry_sec, self.fidelity_sec)
+        self.workers = max(1, workers)
+        self.state_every_sec = state_every_sec
+        self.status_every_sec = status_every_sec
+        self.client = client or HttpClient(pool_maxsize=self.workers + 1, rate_per_sec=rate_per_sec, log=log)
+        METRICS.attach_http(self.client)
+
+        # market_id -> fingerprint / tokens; token_id -> market_id for live tokens
+        self.market_fp: Dict[str, str] = {}
+        self.market_tokens: Dict[str, List[str]] = {}
+        self.token_market: Dict[str, str] = {}
+        self.live_markets: Set[str] = set()
+        self.retiring: Set[str] = set()      # tokens due for one last refresh
+        self.last_ts: Dict[str, int] = {}
+        self.schedule = TokenSchedule()
+        self.wakeup = asyncio.Event()
+        self.writer: Optional[ManifestJsonlWriter] = None
+        self.writer_lock = threading.Lock()     # appends and commits run in worker threads
+        self.candles_written = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    # ── state ─────────────────────────────────────────────────────────────────
+
+    def load_state(self) -> None:
+        """Drop any torn tail of the prices store and reload last candles and known markets."""
+        entries = recover_manifest(self.prices_out)
+        # The state file is saved every state_every_sec; rows committed since then catch it up
+        self.last_ts = load_or_scan_last_timestamps(self.prices_out, entries)
+        if self.markets_out.exists():
+            with self.markets_out.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        market = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    key = market_key(market)
+                    if key:
+                        self.market_fp[key] = market_fingerprint(market)
+                        self.market_tokens[key] = extract_clob_token_ids(market)
+        log(f"Loaded {len(self.market_fp):,} known markets, {len(self.last_ts):,} tokens with stored candles")
+
+    def append_row(self, row: Dict[str, Any]) -> None:
+        with self.writer_lock:
+            self.writer.write(row)
+
+    def save_state(self, last_ts: Optional[Dict[str, int]] = None) -> None:
+        """
+        Commit the writer, then save last_ts (default: a copy of self.last_ts).
+        Thread-safe when given a snapshot taken on the event loop: the
+        snapshot only holds rows already handed to the writer, which the
+        commit makes durable.
+        """
+        last_ts = dict(self.last_ts) if last_ts is None else last_ts
+        with self.writer_lock:
+            if self.writer is not None:
+                self.writer.commit()
+        save_last_timestamps(last_ts_path(self.prices_out), last_ts)
+
+    def next_due(self, token_id: str, now: float, after_refresh: bool) -> float:
+        """
+        When the token's next candle should be complete (last candle +
+        fidelity + settle). If that moment has passed, the token is due now,
+        or retry_sec from now when it was just refreshed without result.
+        """
+        last = self.last_ts.get(token_id)
+        if last is not None:
+            due = last + self.fidelity_sec + self.settle_sec
+            if due > now:
+                return due
+        return now + self.retry_sec if after_refresh else now
+
+    # ── markets ───────────────────────────────────────────────────────────────
+
+    def _get(self, url: str, params: Dict[str, Any]) -> Any:
+        return self.client.get(url, params=params)
+
+    async def fetch_open_markets(self, tag_id: int) -> List[Dict[str, Any]]:
+        markets: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            batch = await asyncio.to_thread(self._get, f"{self.gamma_base}/markets", {
+                "limit": PAGE_SIZE,
+                "offset": offset,
+                "tag_id": tag_id,
+                "closed": "false",
+                "include_tag": True,
+            })
+            if not isinstance(batch, list):
+                raise RuntimeError(f"Unexpected response type: {type(batch)}")
+            markets.extend(m for m in batch if isinstance(m, dict))
+            if len(batch) < PAGE_SIZE:
+                return markets
+            offset += len(batch)
+
+    async def poll_markets(self) -> None:
+        """One pass over all tags: log new/changed markets, (re)schedule and retire tokens."""
+        with METRICS.stage("live.poll_markets") as st:
+            seen: Set[str] = set()
+            changed: List[Dict[str, Any]] = []
+            for tag_id in self.tag_ids:
+                for market in await self.fetch_open_markets(tag_id):
+                    key = market_key(market)
+                    if not key or key in seen:
+                        continue
+                    seen.add(key)
+                    st.rows += 1
+                    fp = market_fingerprint(market)
+                    if self.market_fp.get(key) != fp:
+                        changed.append(market)
+                        self.market_fp[key] = fp
+                        self.market_tokens[key] = extract_clob_token_ids(market)
+
+            if changed:
+                self.markets_out.parent.mkdir(parents=True, exist_ok=True)
+                with self.markets_out.open("a", encoding="utf-8") as f:
+                    start = f.tell()
+                    for market in changed:
+                        f.write(json.dumps(market, ensure_ascii=False) + "\n")
+                    st.bytes_written = f.tell() - start
+
+            now = time.time()
+            added = 0
+            for key in seen:
+                for token_id in self.market_tokens.get(key, []):
+                    self.token_market[token_id] = key
+                    self.retiring.discard(token_id)
+                    if token_id not in self.schedule:
+                        self.schedule.schedule(token_id, self.next_due(token_id, now, after_refresh=False))
+                        added += 1
+            # Markets that closed (or left the tags) get one last refresh, then drop out
+            gone = self.live_markets - seen
+            for key in gone:
+                for token_id in self.market_tokens.get(key, []):
+                    self.retiring.add(token_id)
+                    self.schedule.schedule(token_id, now)
+            self.live_markets = seen
+            # Only open markets are remembered (a reopened market is logged again)
+            for key in [k for k in self.market_fp if k not in seen]:
+                del self.market_fp[key]
+                self.market_tokens.pop(key, None)
+
+        METRICS.count("live_markets_changed", len(changed))
+        log(f"Markets poll: {len(seen):,} open, {len(changed):,} new/changed, "
+            f"{len(gone):,} closed, {added:,} tokens scheduled ({len(self.schedule):,} live)")
+        self.wakeup.set()
+
+    async def market_loop(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            try:
+                await self.poll_markets()
+            except Exception as e:
+                self.errors += 1
+                METRICS.count("live_poll_errors")
+                log(f"Markets poll failed: {e}")
+            await _wait(stop, self.market_poll_sec)
+
+    # ── candles ───────────────────────────────────────────────────────────────
+
+    def fetch_history(self, token_id: str, last_ts: Optional[int]) -> List[Any]:
+        params = history_window_params(token_id, self.interval, self.fidelity_min, last_ts)
+        data = self.client.get(f"{self.clob_base}/prices-history", params=params)
+        if isinstance(data, dict):
+            return data.get("history") or []
+        return data if isinstance(data, list) else []
+
+    async def refresh(self, token_id: str) -> None:
+        """Fetch and append the candles after the last stored one, then reschedule."""
+        last = self.last_ts.get(token_id)
+        with METRICS.stage("live.refresh") as st:
+            try:
+                history = await asyncio.to_thread(self.fetch_history, token_id, last)
+            except Exception as e:
+                self.errors += 1
+                METRICS.count("live_refresh_errors")
+                log(f"Refresh failed for token={token_id}: {e}")
+                history = None
+            candles = new_candles(history or [], last)
+            if candles:
+                await asyncio.to_thread(self.append_row, {
+                    "market_id": self.token_market.get(token_id, ""),
+                    "token_id": token_id,
+                    "interval": self.interval,
+                    "fidelity_min": self.fidelity_min,
+                    "n_candles": len(candles),
+                    "fetched_at": datetime.now(tz=timezone.utc).isoformat(),
+                    "history": candles,
+                })
+                self.last_ts[token_id] = max_timestamp(candles, last)
+                self.candles_written += len(candles)
+                st.rows = len(candles)
+        self.refreshes += 1
+
+        if token_id in self.retiring:
+            self.retiring.discard(token_id)
+            self.token_market.pop(token_id, None)
+        elif token_id in self.token_market and token_id not in self.schedule:
+            self.schedule.schedule(token_id, self.next_due(token_id, time.time(), after_refresh=True))
+            self.wakeup.set()
+
+    async def dispatch_loop(self, stop: asyncio.Event, queue: "asyncio.Queue[str]") -> None:
+        """Move due tokens onto the bounded work queue, sleeping until the next one is due."""
+        while not stop.is_set():
+            token_id = self.schedule.pop_due(time.time())
+            if token_id is not None:
+                await queue.put(token_id)
+                continue
+            self.wakeup.clear()
+            nxt = self.schedule.next_due()
+            await _wait_any(stop, self.wakeup, None if nxt is None else max(0.0, nxt - time.time()))
+
+    async def worker(self, stop: asyncio.Event, queue: "asyncio.Queue[str]") -> None:
+        while not stop.is_set():
+            get = asyncio.ensure_future(queue.get())
+            halt = asyncio.ensure_future(stop.wait())
+            await asyncio.wait({get, halt}, return_when=asyncio.FIRST_COMPLETED)
+            halt.cancel()
+            if not get.done():
+                get.cancel()
+                return
+            token_id = get.result()
+            try:
+                await self.refresh(token_id)
+            finally:
+                queue.task_done()
+
+    async def status_loop(self, stop: asyncio.Event, queue: "asyncio.Queue[str]") -> None:
+        while not await _wait(stop, self.status_every_sec):
+            log(f"Status: {len(self.schedule):,} tokens scheduled, {queue.qsize()} queued, "
+                f"{self.refreshes:,} refreshes, {self.candles_written:,} candles written, {self.errors:,} errors")
+
+    async def state_loop(self, stop: asyncio.Event) -> None:
+        while not await _wait(stop, self.state_every_sec):
+            await asyncio.to_thread(self.save_state, dict(self.last_ts))
+
+    # ── entry points ──────────────────────────────────────────────────────────
+
+    def _open(self) -> None:
+        self.load_state()
+        self.writer = ManifestJsonlWriter(self.prices_out)
+        # One thread per worker, one for market polls and one for state saves
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.workers + 2))
+
+    def _close(self) -> None:
+        self.save_state()
+        self.writer.close()
+        self.writer = None
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Run until stop is set (or SIGINT/SIGTERM); in-flight refreshes finish before returning."""
+        stop = stop or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass      # Windows / not the main thread: Ctrl-C raises instead
+
+        self._open()
+        queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=2 * self.workers)
+        tasks = [
+            asyncio.create_task(self.market_loop(stop)),
+            asyncio.create_task(self.dispatch_loop(stop, queue)),
+            asyncio.create_task(self.state_loop(stop)),
+            asyncio.create_task(self.status_loop(stop, queue)),
+        ]
+        workers = [asyncio.create_task(self.worker(stop, queue)) for _ in range(self.workers)]
+        log(f"Live ingest started: tags={self.tag_ids} fidelity={self.fidelity_min}m workers={self.workers}")
+        try:
+            await stop.wait()
+        finally:
+            stop.set()
+            log("Shutting down: finishing in-flight refreshes")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Workers return once their current refresh is done; tokens still
+            # queued are picked up again by the first poll after a restart
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._close()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.remove_signal_handler(sig)
+                except (NotImplementedError, RuntimeError, ValueError):
+                    pass
+            log(f"Stopped: {self.refreshes:,} refreshes, {self.candles_written:,} candles written")
+
+    async def run_once(self) -> None:
+        """One market poll, then one refresh of every scheduled token."""
+        self._open()
+        try:
+            await self.poll_markets()
+            tokens = []
+            while (token_id := self.schedule.pop_due(float("inf"))) is not None:
+                tokens.append(token_id)
+            queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=2 * self.workers)
+            stop = asyncio.Event()
+            workers = [asyncio.create_task(self.worker(stop, queue)) for _ in range(self.workers)]
+            for token_id in tokens:
+                await queue.put(token_id)
+            await queue.join()
+            stop.set()
+            await asyncio.gather(*workers)
+        finally:
+            self._close()
+        log(f"Refreshed {len(tokens):,} tokens, {self.candles_written:,} candles written → {self.prices_out}")
+
+
+async def _wait(stop: asyncio.Event, timeout: float) -> bool:
+    """Sleep up to timeout seconds; True if stop was set."""
+    try:
+        await asyncio.wait_for(stop.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return stop.is_set()
+
+
+async def _wait_any(stop: asyncio.Event, wakeup: asyncio.Event, timeout: Optional[float]) -> None:
+    waits = {asyncio.ensure_future(stop.wait()), asyncio.ensure_future(wakeup.wait())}
+    _, pending = await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    for fut in pending:
+        fut.cancel()
+
+
+def main(args: argparse.Namespace) -> None:
+    ingest = LiveIngest(
+        tag_ids=args.tag_id,
+        markets_out=args.markets_out,
+        prices_out=args.prices_out,
+        gamma_base=args.gamma_base,
+        clob_base=args.clob_base,
+        fidelity_min=args.fidelity,
+        interval=args.interval,
+        market_poll_sec=args.market_poll_sec,
+        settle_sec=args.settle_sec,
+        retry_sec=args.retry_sec,
+        workers=args.workers,
+        rate_per_sec=args.rate,
+    )
+    asyncio.run(ingest.run_once() if args.once else ingest.run())
+    ingest.client.log_stats()
+    if args.metrics_dir:
+        json_path, prom_path = METRICS.export(args.metrics_dir, "live_ingest")
+        log(f"Metrics -> {json_path}, {prom_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuously ingest new Polymarket markets and price candles")
+    parser.add_argument("--tag-id", type=int, nargs="+", required=True, help="Gamma tag id(s) to follow")
+    parser.add_argument("--markets-out", type=str, default=str(DEFAULT_MARKETS_OUT), help="Append-only markets log (JSONL)")
+    parser.add_argument("--prices-out", type=str, default=str(DEFAULT_PRICES_OUT), help="Prices JSONL store (delta rows)")
+    parser.add_argument("--gamma-base", type=str, default=GAMMA_BASE, help="Gamma API base URL")
+    parser.add_argument("--clob-base", type=str, default=CLOB_BASE, help="CLOB API base URL")
+    parser.add_argument("--fidelity", type=int, default=DEFAULT_FIDELITY_MIN, help="Candle size in minutes")
+    parser.add_argument("--interval", type=str, default=DEFAULT_INTERVAL, help="History interval for new tokens")
+    parser.add_argument("--market-poll-sec", type=float, default=DEFAULT_MARKET_POLL_SEC, help="Seconds between Gamma polls")
+    parser.add_argument("--settle-sec", type=float, default=DEFAULT_SETTLE_SEC, help="Delay after a candle closes before fetching it")
+    parser.add_argument("--retry-sec", type=float, default=DEFAULT_RETRY_SEC, help="Re-ask delay after a refresh with no new candle")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent candle refreshes")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Max requests per second")
+    parser.add_argument("--once", action="store_true", help="Poll markets and refresh every token once, then exit")
+    parser.add_argument("--metrics-dir", type=str, default=None, help="Write a JSON run report + Prometheus textfile on exit")
+    main(parser.parse_args())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+──────────
+Run metrics shared by the Polymarket fetchers, the social collectors and
+the orchestrator: per-stage wall time, rows and bytes read/written, HTTP
+latency histograms and retry/429 counts per endpoint (taken from attached
+HttpClients), and the peak RSS of the process and its reaped children.
+
+Each process has one registry, METRICS. Code records into named stages;
+the entry point attaches its HTTP clients and exports the run once at the
+end, as a JSON report (<name>_<UTC time>.json, one per run, for comparing
+runs) plus a Prometheus textfile (<name>.prom, replaced each run, for
+node_exporter's textfile collector).
+
+Stages are flat and may nest or overlap (a market's collection stage
+contains the dump scans it runs), so stage times are not additive. Worker
+processes return METRICS.drain() and the parent merges it.
+
+Usage:
+  from metrics import METRICS
+
+  with METRICS.stage("reddit.scan") as st:
+      for post in posts:
+          st.rows += 1
+      st.bytes_read += os.path.getsize(dump_file)
+
+  METRICS.attach_http(CLIENT)
+  METRICS.export("data/metrics", "fetch_prices_by_tag")
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:          # Windows
+    RESOURCE_AVAILABLE = False
+
+PathLike = Union[str, Path]
+
+PROM_PREFIX = "polymarket"
+# Upper bounds (seconds) of the HTTP latency buckets; +Inf is implicit
+LATENCY_BUCKETS_SEC = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_LABEL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+_METRIC_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class Histogram:
+    """Fixed-bucket histogram (non-cumulative counts; the last bucket is +Inf)."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_SEC) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """Add a histogram in as_dict() form (same buckets)."""
+        for i, n in enumerate(other["counts"]):
+            self.counts[i] += n
+        self.count += other["count"]
+        self.sum += other["sum"]
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None if empty or in +Inf)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"buckets": list(self.buckets), "counts": list(self.counts),
+                "count": self.count, "sum": round(self.sum, 6)}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Histogram":
+        h = cls(d["buckets"])
+        h.merge(d)
+        return h
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    wall_sec: float = 0.0
+    rows: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+
+    def add(self, other: "StageStats") -> None:
+        self.calls += other.calls
+        self.wall_sec += other.wall_sec
+        self.rows += other.rows
+        self.bytes_read += other.bytes_read
+        self.bytes_written += other.bytes_written
+
+    def as_dict(self) -> Dict[str, Any]:
+        wall = self.wall_sec
+        return {
+            "calls": self.calls,
+            "wall_sec": round(wall, 4),
+            "rows": self.rows,
+            "rows_per_sec": round(self.rows / wall, 1) if wall > 0 else None,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "read_mb_per_sec": round(self.bytes_read / wall / 1e6, 3) if wall > 0 else None,
+            "write_mb_per_sec": round(self.bytes_written / wall / 1e6, 3) if wall > 0 else None,
+        }
+
+
+def peak_rss_bytes(children: bool = False) -> Optional[int]:
+    """Peak resident set size of this process (or of its reaped children), None where unsupported."""
+    if not RESOURCE_AVAILABLE:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    maxrss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def merge_http_stats(all_stats: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Combine HttpClient.stats() dicts from several clients, summing per endpoint."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for stats in all_stats:
+        for key, st in stats.items():
+            if key not in merged:
+                merged[key] = json.loads(json.dumps(st))
+                continue
+            m = merged[key]
+            for name in ("requests", "successes", "failures", "retries", "throttled"):
+                m[name] += st[name]
+            m["latency_max_sec"] = max(m["latency_max_sec"], st["latency_max_sec"])
+            hist = Histogram.from_dict(m["latency_histogram"])
+            hist.merge(st["latency_histogram"])
+            m["latency_histogram"] = hist.as_dict()
+            m["latency_mean_sec"] = round(hist.sum / hist.count, 4) if hist.count else 0.0
+    return dict(sorted(merged.items()))
+
+
+class Metrics:
+    """Thread-safe per-process registry of stage stats, counters and HTTP clients."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageStats] = {}
+        self._counters: Dict[str, int] = {}
+        self._http_clients: List[Any] = []
+        self.started_at = datetime.now(tz=timezone.utc)
+        self._t0 = time.monotonic()
+
+    # ── recording ─────────────────────────────────────────────────────────────
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        """Time a block; rows/bytes set on the yielded StageStats are added to the stage."""
+        st = StageStats(calls=1)
+        started = time.monotonic()
+        try:
+            yield st
+        finally:
+            st.wall_sec = time.monotonic() - started
+            self.add_stage(name, st)
+
+    def add_stage(self, name: str, st: StageStats) -> None:
+        with self._lock:
+            self._stages.setdefault(name, StageStats()).add(st)
+
+    def add(self, name: str, rows: int = 0, bytes_read: int = 0, bytes_written: int = 0) -> None:
+        """Add rows/bytes to a stage without timing anything."""
+        self.add_stage(name, StageStats(rows=rows, bytes_read=bytes_read, bytes_written=bytes_written))
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def attach_http(self, client: Any) -> None:
+        """Include an HttpClient's per-endpoint stats in the report."""
+        with self._lock:
+            if all(c is not client for c in self._http_clients):
+                self._http_clients.append(client)
+
+    # ── worker processes ──────────────────────────────────────────────────────
+
+    def drain(self) -> Dict[str, Any]:
+        """Stage stats and counters recorded so far, reset (a worker returns this to its parent)."""
+        with self._lock:
+            snapshot = {
+                "stages": {name: vars(st).copy() for name, st in self._stages.items()},
+                "counters": dict(self._counters),
+            }
+            self._stages.clear()
+            self._counters.clear()
+        return snapshot
+
+    def merge(self, snapshot: Optional[Dict[str, Any]]) -> None:
+        """Fold in a drain() snapshot from another process."""
+        if not snapshot:
+            return
+        for name, st in snapshot.get("stages", {}).items():
+            self.add_stage(name, StageStats(**st))
+        for name, n in snapshot.get("counters", {}).items():
+            self.count(name, n)
+
+    # ── export ────────────────────────────────────────────────────────────────
+
+    def report(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            stages = {k: st.as_dict() for k, st in sorted(self._stages.items())}
+            counters = dict(sorted(self._counters.items()))
+            clients = list(self._http_clients)
+        return {
+            "run": name,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now(tz=timezone.utc).isoformat(),
+            "wall_sec": round(time.monotonic() - self._t0, 3),
+            "pid": os.getpid(),
+            "argv": sys.argv,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "peak_rss_children_bytes": peak_rss_bytes(children=True),
+            "stages": stages,
+            "counters": counters,
+            "http": merge_http_stats([c.stats() for c in clients]),
+        }
+
+    def write_json(self, path: PathLike, name: str) -> Dict[str, Any]:
+        report = self.report(name)
+        _atomic_write(Path(path), json.dumps(report, indent=2) + "\n")
+        return report
+
+    def write_prometheus(self, path: PathLike, name: str, report: Optional[Dict[str, Any]] = None) -> None:
+        _atomic_write(Path(path), prometheus_text(report or self.report(name)))
+
+    def export(self, out_dir: PathLike, name: str) -> Tuple[Path, Path]:
+        """Write <name>_<UTC time>.json and <name>.prom to out_dir; returns both paths."""
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(tz=timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        json_path, prom_path = out / f"{name}_{stamp}.json", out / f"{name}.prom"
+        report = self.write_json(json_path, name)
+        self.write_prometheus(prom_path, name, report)
+        return json_path, prom_path
+
+    def summary_lines(self) -> List[str]:
+        """One line per stage, for end-of-run logs."""
+        lines = []
+        with self._lock:
+            stages = sorted(self._stages.items())
+        for name, st in stages:
+            d = st.as_dict()
+            line = f"{name}: {d['wall_sec']:.2f}s calls={d['calls']} rows={d['rows']:,}"
+            if d["rows_per_sec"] is not None and d["rows"]:
+                line += f" ({d['rows_per_sec']:,.0f} rows/s)"
+            if d["bytes_read"]:
+                line += f" read={d['bytes_read'] / 1e6:,.1f}MB"
+            if d["bytes_written"]:
+                line += f" written={d['bytes_written'] / 1e6:,.1f}MB"
+            lines.append(line)
+        rss = peak_rss_bytes()
+        if rss is not None:
+            lines.append(f"peak RSS: {rss / 1e6:,.0f}MB")
+        return lines
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{k}="{str(v).translate(_LABEL_ESCAPES)}"' for k, v in labels.items()) + "}"
+
+
+def _num(value: float) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def prometheus_text(report: Dict[str, Any]) -> str:
+    """Prometheus text exposition format for a report() dict."""
+    run = report["run"]
+    p = PROM_PREFIX
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, Any]]) -> None:
+        if not samples:
+            return
+        lines.append(f"# HELP {p}_{name} {help_text}")
+        lines.append(f"# TYPE {p}_{name} {kind}")
+        lines.extend(f"{p}_{name}{labels} {_num(v)}" for labels, v in samples)
+
+    metric("run_duration_seconds", "gauge", "Wall time of the last run.",
+           [(_labels(run=run), report["wall_sec"])])
+    finished = datetime.fromisoformat(report["finished_at"]).timestamp()
+    metric("run_finished_timestamp_seconds", "gauge", "Unix time the last run finished.",
+           [(_labels(run=run), round(finished, 3))])
+    for key, help_text in (("peak_rss_bytes", "Peak resident set size of the run process."),
+                           ("peak_rss_children_bytes", "Peak resident set size of the run's worker processes.")):
+        if report.get(key) is not None:
+            metric(key, "gauge", help_text, [(_labels(run=run), report[key])])
+
+    stages = report["stages"]
+    for field_name, name, help_text in (
+        ("wall_sec", "stage_seconds", "Wall time spent in the stage."),
+        ("calls", "stage_calls", "Times the stage was entered."),
+        ("rows", "stage_rows", "Rows processed by the stage."),
+        ("bytes_read", "stage_bytes_read", "Bytes read by the stage."),
+        ("bytes_written", "stage_bytes_written", "Bytes written by the stage."),
+    ):
+        metric(name, "gauge", help_text, [(_labels(run=run, stage=s), d[field_name]) for s, d in stages.items()])
+
+    for cname, n in report["counters"].items():
+        metric(_METRIC_NAME.sub("_", cname), "gauge", f"Counter {cname}.", [(_labels(run=run), n)])
+
+    http = report["http"]
+    for field_name, name, help_text in (
+        ("requests", "http_requests", "HTTP requests sent (including retries)."),
+        ("failures", "http_failures", "HTTP calls that failed after all retries."),
+        ("retries", "http_retries", "HTTP retries."),
+        ("throttled", "http_throttled", "HTTP 429 responses."),
+    ):
+        metric(name, "gauge", help_text, [(_labels(run=run, endpoint=e), st[field_name]) for e, st in http.items()])
+
+    if http:
+        name = f"{p}_http_request_duration_seconds"
+        lines.append(f"# HELP {name} HTTP request latency.")
+        lines.append(f"# TYPE {name} histogram")
+        for endpoint, st in http.items():
+            hist = st["latency_histogram"]
+            cumulative = 0
+            for bound, n in zip(list(hist["buckets"]) + [math.inf], hist["counts"]):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(run=run, endpoint=endpoint, le=_num(float(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(run=run, endpoint=endpoint)} {_num(float(hist['sum']))}")
+            lines.append(f"{name}_count{_labels(run=run, endpoint=endpoint)} {hist['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+# Registry shared by everything running in this process
+METRICS = Metrics()
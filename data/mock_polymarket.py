@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+mock_polymarket.py
+──────────────────
+Local stand-in for the Gamma /markets and CLOB /prices-history endpoints,
+for running live_ingest.py (or the collectors) without the network, plus a
+self-check that drives live_ingest against it.
+
+  MockPolymarket   http.server on a background thread. Markets and candles
+                   live in memory and can be changed while a client polls:
+                   add_market / close_market / add_candles.
+  self-check       run_once twice (full history, then deltas only), then
+                   run() with short intervals while a market closes and a
+                   new candle arrives, then stop: checks polling,
+                   scheduling, retirement, graceful shutdown and that no
+                   candle is stored twice.
+
+Usage:
+  python data/mock_polymarket.py serve --port 8000 --markets 20
+  python data/live_ingest.py --tag-id 1 --gamma-base http://127.0.0.1:8000 --clob-base http://127.0.0.1:8000 --fidelity 1
+  python data/mock_polymarket.py self-check
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+def log(msg: str) -> None:
+    print(f"[INFO] {msg}", flush=True)
+
+
+class MockPolymarket:
+    """
+    In-memory Gamma/CLOB server. Each market has two tokens ("<id>-yes",
+    "<id>-no") with candles of (t, p); /markets pages the open markets of a
+    tag, /prices-history returns a token's candles for `interval` (all) or
+    [startTs, endTs].
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.lock = threading.Lock()
+        self.markets: Dict[str, Dict[str, Any]] = {}
+        self.candles: Dict[str, List[Dict[str, float]]] = {}
+        self.requests: Counter = Counter()
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                mock.requests[url.path] += 1
+                if url.path == "/markets":
+                    body: Any = mock.page_markets(params)
+                elif url.path == "/prices-history":
+                    body = {"history": mock.history(params)}
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockPolymarket":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockPolymarket":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    # ── state ─────────────────────────────────────────────────────────────────
+
+    def add_market(self, market_id: str, tag_id: int = 1, candles: int = 0, step_sec: int = 60,
+                   end_ts: Optional[int] = None) -> List[str]:
+        """Open a market with `candles` candles per token, the last one `step_sec` before end_ts (default now)."""
+        tokens = [f"{market_id}-yes", f"{market_id}-no"]
+        end_ts = int(end_ts if end_ts is not None else time.time()) // step_sec * step_sec - step_sec
+        with self.lock:
+            self.markets[market_id] = {
+                "id": market_id,
+                "conditionId": f"0x{market_id}",
+                "question": f"Mock market {market_id}?",
+                "clobTokenIds": json.dumps(tokens),
+                "closed": False,
+                "tag_id": tag_id,
+                "updatedAt": f"v1-{market_id}",
+            }
+            for i, token_id in enumerate(tokens):
+                self.candles[token_id] = [
+                    {"t": end_ts - (candles - 1 - k) * step_sec, "p": round(0.5 + (0.01 * k if i == 0 else -0.01 * k), 4)}
+                    for k in range(candles)
+                ]
+        return tokens
+
+    def close_market(self, market_id: str) -> None:
+        with self.lock:
+            self.markets[market_id]["closed"] = True
+            self.markets[market_id]["updatedAt"] = f"closed-{market_id}"
+
+    def add_candles(self, token_id: str, points: List[Dict[str, float]]) -> None:
+        with self.lock:
+            self.candles[token_id].extend(points)
+            self.candles[token_id].sort(key=lambda pt: pt["t"])
+
+    # ── endpoints ─────────────────────────────────────────────────────────────
+
+    def page_markets(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        closed = params.get("closed", "false") == "true"
+        tag = params.get("tag_id")
+        offset, limit = int(params.get("offset", 0)), int(params.get("limit", 100))
+        with self.lock:
+            selected = [dict(m) for m in self.markets.values()
+                        if m["closed"] == closed and (tag is None or str(m["tag_id"]) == tag)]
+        return selected[offset:offset + limit]
+
+    def history(self, params: Dict[str, str]) -> List[Dict[str, float]]:
+        with self.lock:
+            points = list(self.candles.get(params.get("market", ""), []))
+        if "startTs" in params:
+            start, end = int(params["startTs"]), int(params.get("endTs", 2 ** 62))
+            points = [pt for pt in points if start <= pt["t"] <= end]
+        return points
+
+
+# ── self-check ───────────────────────────────────────────────────────────────
+
+def _stored_rows(path: Path) -> List[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _check(cond: bool, what: str) -> None:
+    if not cond:
+        raise AssertionError(what)
+    log(f"ok: {what}")
+
+
+def self_check() -> None:
+    """Drive LiveIngest against a MockPolymarket; raises AssertionError on the first failed check."""
+    from live_ingest import LiveIngest
+    from price_store import last_ts_path, load_last_timestamps
+
+    with MockPolymarket() as mock, tempfile.TemporaryDirectory() as tmp:
+        markets_out, prices_out = Path(tmp) / "markets.jsonl", Path(tmp) / "prices.jsonl"
+
+        def ingest(**kwargs: Any) -> LiveIngest:
+            return LiveIngest([1], markets_out, prices_out, gamma_base=mock.base_url, clob_base=mock.base_url,
+                              fidelity_min=1, rate_per_sec=None, **kwargs)
+
+        a_tokens = mock.add_market("a", candles=5)
+        b_tokens = mock.add_market("b", candles=3)
+        mock.add_market("other-tag", tag_id=2, candles=3)
+
+        # run_once: full history for every token of the tag's open markets
+        asyncio.run(ingest().run_once())
+        rows = _stored_rows(prices_out)
+        _check(sorted(r["token_id"] for r in rows) == sorted(a_tokens + b_tokens), "run_once stores each open market's tokens")
+        _check(sum(r["n_candles"] for r in rows) == 16, "run_once stores the full history")
+        _check(len(_stored_rows(markets_out)) == 2, "markets log holds the two new markets")
+
+        # run_once again: only candles after the stored ones, unchanged markets not re-logged
+        last = mock.candles[a_tokens[0]][-1]["t"]
+        mock.add_candles(a_tokens[0], [{"t": last + 60, "p": 0.9}])
+        asyncio.run(ingest().run_once())
+        rows = _stored_rows(prices_out)
+        _check(len(rows) == 5 and rows[-1]["token_id"] == a_tokens[0] and rows[-1]["n_candles"] == 1,
+               "second run_once appends only the new candle")
+        _check(len(_stored_rows(markets_out)) == 2, "unchanged markets are not logged again")
+
+        # run(): polling, scheduling, retirement, graceful shutdown
+        service = ingest(market_poll_sec=0.2, settle_sec=0.0, retry_sec=0.2, state_every_sec=0.2, workers=2)
+
+        async def scenario() -> None:
+            stop = asyncio.Event()
+            task = asyncio.create_task(service.run(stop))
+            await asyncio.sleep(0.5)
+            mock.close_market("b")
+            mock.add_market("c", candles=2)
+            mock.add_candles(a_tokens[1], [{"t": mock.candles[a_tokens[1]][-1]["t"] + 60, "p": 0.1}])
+            await asyncio.sleep(1.0)
+            stop.set()
+            await asyncio.wait_for(task, 10)
+
+        asyncio.run(scenario())
+        rows = _stored_rows(prices_out)
+        stored = Counter((r["token_id"], pt["t"]) for r in rows for pt in r["history"])
+        _check(max(stored.values()) == 1, "no candle is stored twice")
+        _check(("a-no", mock.candles[a_tokens[1]][-1]["t"]) in stored, "run picks up a new candle of a live token")
+        _check({"c-yes", "c-no"} <= {t for t, _ in stored}, "run picks up a market opened while running")
+        _check(not any(t in service.schedule or t in service.token_market for t in b_tokens),
+               "a closed market's tokens are retired")
+        _check("b" not in service.market_fp and "b" not in service.market_tokens, "a closed market is forgotten")
+        _check(service.writer is None, "shutdown closes the writer")
+        saved = load_last_timestamps(last_ts_path(prices_out))
+        _check(all(saved.get(t) == mock.candles[t][-1]["t"] for t in a_tokens + b_tokens + ["c-yes", "c-no"]),
+               "shutdown saves every token's last candle")
+        _check(mock.requests["/markets"] >= 3, "markets are polled repeatedly")
+    log("Self-check passed")
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.command == "self-check":
+        self_check()
+        return
+    mock = MockPolymarket(args.host, args.port)
+    for i in range(args.markets):
+        mock.add_market(str(i + 1), tag_id=args.tag_id, candles=args.candles)
+    log(f"Mock Gamma/CLOB with {args.markets} markets (tag {args.tag_id}) on {mock.base_url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the Polymarket Gamma/CLOB endpoints")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Serve mock markets and candles until interrupted")
+    serve.add_argument("--host", type=str, default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--markets", type=int, default=20, help="Open markets to create")
+    serve.add_argument("--candles", type=int, default=50, help="Candles per token (1-minute steps)")
+    serve.add_argument("--tag-id", type=int, default=1)
+    sub.add_parser("self-check", help="Drive live_ingest.py against the mock and check its behaviour")
+    main(parser.parse_args())
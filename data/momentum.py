@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+momentum.py
+───────────
+Per-token momentum metrics of the momentum_analysis notebook, computed for
+every token at once.
+
+All tokens' candles live in flat arrays (PriceSegments: timestamps, prices
+and per-token offsets, sorted by token then time). Each metric is a handful
+of whole-array operations (np.add.reduceat / np.bincount over segment ids,
+shifted views for returns and lags) instead of a groupby loop, so the
+tables for 100k tokens take seconds:
+
+  momentum_table     points, mean_entropy, flip_count, velocity,
+                     early/late_pnl_proxy, autocorr, pred_power, final_price
+                     (the notebook's entropy / flip_frequency /
+                     belief_velocity / early_late_pnl / momentum_metrics)
+  persistence_table  autocorr_lag<k>, p_up_given_pos_mom, p_up_given_neg_mom
+                     (the notebook's momentum_persistence)
+
+Values match the notebook's per-token functions up to float summation
+order (~1e-15), including its NaN and constant-series cases. The CLI
+writes momentum_metrics.csv and momentum_persistence.csv with the same
+columns as the notebook.
+
+Usage:
+  python data/momentum.py --markets data/polymarket/markets.jsonl --prices data/polymarket/prices_history.jsonl --out-dir notebooks/momentum_analysis
+  python data/momentum.py --markets data/polymarket/markets.jsonl --prices data/polymarket/prices_history.parquet --out-dir data/polymarket/analysis
+
+  from momentum import PriceSegments, momentum_table
+  metrics = momentum_table(PriceSegments.from_frame(prices_df))
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from metrics import METRICS
+from price_store import iter_token_histories, read_columnar_prices
+
+PathLike = Union[str, Path]
+
+MIN_POINTS = 9
+EARLY_FRAC = 0.1
+LATE_FRAC = 0.1
+VELOCITY_DAYS = 7
+HORIZON = 5
+PERSISTENCE_LAG = 1
+ENTROPY_EPS = 1e-6
+DAY_SEC = 86400.0
+
+RESOLUTION_COLUMNS = ["closedTime", "endDate", "endDateIso"]
+
+METRICS_COLUMNS = [
+    "token_id", "conditionId", "market_id", "points", "mean_entropy", "flip_count", "velocity",
+    "early_pnl_proxy", "late_pnl_proxy", "autocorr", "pred_power", "final_price",
+]
+
+
+def log(msg: str) -> None:
+    print(f"[INFO] {msg}", flush=True)
+
+
+# ── segments ─────────────────────────────────────────────────────────────────
+
+def history_points(history: List[Any]) -> Iterator[Tuple[Any, Any]]:
+    """(t, p) of each {"t", "p"} dict or [t, p] pair in a stored history, skipping incomplete points."""
+    for point in history:
+        if isinstance(point, dict):
+            t, p = point.get("t"), point.get("p")
+        elif isinstance(point, (list, tuple)) and len(point) >= 2:
+            t, p = point[0], point[1]
+        else:
+            continue
+        if t is not None and p is not None:
+            yield t, p
+
+
+class PriceSegments:
+    """
+    Every token's candles in flat arrays: token k is
+    ts[starts[k]:starts[k] + lengths[k]] (epoch seconds, ascending) and the
+    same slice of px. condition_ids / market_ids are the token's first row's.
+    """
+
+    def __init__(
+        self,
+        token_ids: np.ndarray,
+        condition_ids: np.ndarray,
+        market_ids: np.ndarray,
+        lengths: np.ndarray,
+        ts: np.ndarray,
+        px: np.ndarray,
+    ) -> None:
+        self.token_ids = np.asarray(token_ids, dtype=object)
+        self.condition_ids = np.asarray(condition_ids, dtype=object)
+        self.market_ids = np.asarray(market_ids, dtype=object)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.starts = np.concatenate(([0], np.cumsum(self.lengths)[:-1])).astype(np.int64)
+        self.ts = np.asarray(ts, dtype=np.float64)
+        self.px = np.asarray(px, dtype=np.float64)
+        self.seg = np.repeat(np.arange(len(self.lengths)), self.lengths)
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        token_ids: np.ndarray,
+        ts: np.ndarray,
+        px: np.ndarray,
+        condition_ids: Optional[np.ndarray] = None,
+        market_ids: Optional[np.ndarray] = None,
+    ) -> "PriceSegments":
+        """Group unsorted per-candle arrays by token (sorted as strings), then by time (stable)."""
+        token_ids = np.asarray(token_ids, dtype=object).astype(str)
+        n = len(token_ids)
+        codes, uniques = pd.factorize(token_ids, sort=True)
+        order = np.lexsort((np.asarray(ts, dtype=np.float64), codes))
+        codes = codes[order]
+        first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if n else np.empty(0, dtype=np.int64)
+        lengths = np.diff(np.r_[first, n])
+        cids = np.asarray(condition_ids, dtype=object)[order][first] if condition_ids is not None else np.full(len(first), None)
+        mids = np.asarray(market_ids, dtype=object)[order][first] if market_ids is not None else np.full(len(first), None)
+        return cls(np.asarray(uniques, dtype=object), cids, mids, lengths,
+                   np.asarray(ts, dtype=np.float64)[order], np.asarray(px, dtype=np.float64)[order])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "PriceSegments":
+        """
+        From a long prices frame (token_id, timestamp, price, and optionally
+        conditionId/condition_id and market_id), as built by the notebook or
+        price_store.read_columnar_prices. Timestamps may be datetimes or
+        epoch seconds; rows with a missing timestamp or price are dropped.
+        """
+        ts = df["timestamp"]
+        if pd.api.types.is_datetime64_any_dtype(ts):
+            ts = (pd.to_datetime(ts, utc=True) - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)
+        ts = pd.to_numeric(ts, errors="coerce").to_numpy(dtype=np.float64)
+        px = pd.to_numeric(df["price"], errors="coerce").to_numpy(dtype=np.float64)
+        ok = ~(np.isnan(ts) | np.isnan(px))
+        cid_col = "conditionId" if "conditionId" in df.columns else ("condition_id" if "condition_id" in df.columns else None)
+        return cls.from_arrays(
+            df["token_id"].to_numpy()[ok], ts[ok], px[ok],
+            condition_ids=df[cid_col].to_numpy()[ok] if cid_col else None,
+            market_ids=df["market_id"].to_numpy()[ok] if "market_id" in df.columns else None,
+        )
+
+    @classmethod
+    def from_prices_file(
+        cls,
+        path: PathLike,
+        keep: Optional[Callable[[Optional[str], str], bool]] = None,
+    ) -> "PriceSegments":
+        """
+        From a prices JSONL/CSV file (delta rows of the same token are
+        merged) or a columnar store directory. keep(market_id, token_id)
+        filters rows, e.g. to each market's YES token.
+        """
+        if Path(path).is_dir():
+            df = read_columnar_prices(path)
+            if keep is not None:
+                mask = [keep(None if m is None else str(m), str(t)) for m, t in zip(df["market_id"], df["token_id"])]
+                df = df[np.asarray(mask, dtype=bool)]
+            return cls.from_frame(df)
+
+        tokens: List[str] = []
+        cids: List[Any] = []
+        mids: List[Any] = []
+        ts: List[Any] = []
+        px: List[Any] = []
+        for market_id, condition_id, token_id, history in iter_token_histories(path):
+            if keep is not None and not keep(None if market_id is None else str(market_id), token_id):
+                continue
+            for t, p in history_points(history):
+                tokens.append(token_id)
+                cids.append(condition_id)
+                mids.append(market_id)
+                ts.append(t)
+                px.append(p)
+        ts_arr = pd.to_numeric(pd.Series(ts, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+        px_arr = np.asarray(px, dtype=np.float64)
+        ok = ~np.isnan(ts_arr)
+        return cls.from_arrays(np.asarray(tokens, dtype=object)[ok], ts_arr[ok], px_arr[ok],
+                               np.asarray(cids, dtype=object)[ok], np.asarray(mids, dtype=object)[ok])
+
+    def select(self, mask: np.ndarray) -> "PriceSegments":
+        """The tokens where mask is True (a per-token boolean array)."""
+        mask = np.asarray(mask, dtype=bool)
+        keep = np.repeat(mask, self.lengths)
+        return PriceSegments(self.token_ids[mask], self.condition_ids[mask], self.market_ids[mask],
+                             self.lengths[mask], self.ts[keep], self.px[keep])
+
+    def last(self) -> np.ndarray:
+        """Index of each token's last candle (tokens must be non-empty)."""
+        return self.starts + self.lengths - 1
+
+
+# ── segment reductions ───────────────────────────────────────────────────────
+
+def segment_sum(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Sums of consecutive runs of `values` with the given lengths (0 for empty runs)."""
+    out = np.zeros(len(counts), dtype=np.float64)
+    nz = counts > 0
+    if values.size:
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        out[nz] = np.add.reduceat(values, starts[nz])
+    return out
+
+
+def segment_constant(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """True for runs whose values are all equal (and for empty runs)."""
+    out = np.ones(len(counts), dtype=bool)
+    nz = counts > 0
+    if values.size:
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nz]
+        out[nz] = np.minimum.reduceat(values, starts) == np.maximum.reduceat(values, starts)
+    return out
+
+
+def segment_corr(x: np.ndarray, y: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation of x and y over each run, as np.corrcoef(x, y)[0, 1]:
+    NaN for runs shorter than 2 or where x or y is constant, clipped to [-1, 1].
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        n = counts.astype(np.float64)
+        dx = x - np.repeat(segment_sum(x, counts) / n, counts)
+        dy = y - np.repeat(segment_sum(y, counts) / n, counts)
+        r = segment_sum(dx * dy, counts) / np.sqrt(segment_sum(dx * dx, counts) * segment_sum(dy * dy, counts))
+    r[(counts < 2) | segment_constant(x, counts) | segment_constant(y, counts)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def positions(segments: PriceSegments) -> np.ndarray:
+    """Position of every candle within its token."""
+    return np.arange(len(segments.px)) - np.repeat(segments.starts, segments.lengths)
+
+
+def segment_returns(segments: PriceSegments) -> Tuple[np.ndarray, np.ndarray]:
+    """(returns, token of each return): np.diff of each token's prices, concatenated."""
+    px, seg = segments.px, segments.seg
+    same = seg[:-1] == seg[1:]
+    return (px[1:] - px[:-1])[same], seg[:-1][same]
+
+
+def lag_pairs(r: np.ndarray, r_seg: np.ndarray, lag: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(r[t], r[t + lag], token) for every pair of returns `lag` apart within a token."""
+    if lag >= len(r):
+        empty = np.empty(0)
+        return empty, empty, np.empty(0, dtype=np.int64)
+    same = r_seg[:-lag] == r_seg[lag:]
+    return r[:-lag][same], r[lag:][same], r_seg[:-lag][same]
+
+
+def horizon_pairs(segments: PriceSegments, r: np.ndarray, r_seg: np.ndarray,
+                  horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (r[t], p[t + horizon] - p[t]) for every t with a full horizon ahead;
+    token k has max(lengths[k] - horizon, 0) pairs.
+    """
+    n, px, seg = segments.lengths, segments.px, segments.seg
+    same = seg[:-horizon] == seg[horizon:]
+    future = (px[horizon:] - px[:-horizon])[same]
+    r_pos = np.arange(len(r)) - np.repeat(np.concatenate(([0], np.cumsum(np.maximum(n - 1, 0))[:-1])), np.maximum(n - 1, 0))
+    return r[r_pos < (n - horizon)[r_seg]], future
+
+
+# ── metrics ──────────────────────────────────────────────────────────────────
+
+def entropy(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, ENTROPY_EPS, 1 - ENTROPY_EPS)
+    return -(p * np.log(p) + (1 - p) * np.log(1 - p))
+
+
+def flip_counts(segments: PriceSegments) -> np.ndarray:
+    """Sign changes of price - 0.5 per token, skipping points exactly at 0.5."""
+    sign = np.sign(segments.px - 0.5)
+    nz = sign != 0
+    s, seg = sign[nz], segments.seg[nz]
+    flip = (s[1:] != s[:-1]) & (seg[1:] == seg[:-1])
+    return np.bincount(seg[1:][flip], minlength=len(segments)).astype(np.int64)
+
+
+def velocities(segments: PriceSegments, window_end: Optional[np.ndarray] = None,
+               days: float = VELOCITY_DAYS) -> np.ndarray:
+    """
+    Mean |price change| over the candles in [end - days, end] per token.
+    window_end (epoch seconds per token) defaults to the last candle; NaN
+    ends (unparseable resolution times) give NaN, as do windows with < 2
+    candles.
+    """
+    end = segments.ts[segments.last()] if window_end is None else np.asarray(window_end, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        in_window = ((segments.ts >= np.repeat(end - days * DAY_SEC, segments.lengths))
+                     & (segments.ts <= np.repeat(end, segments.lengths)))
+    seg = segments.seg
+    pair = in_window[:-1] & in_window[1:] & (seg[:-1] == seg[1:])
+    moved = np.bincount(seg[:-1][pair], weights=np.abs(np.diff(segments.px))[pair], minlength=len(segments))
+    count = np.bincount(seg[in_window], minlength=len(segments))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count >= 2, moved / (count - 1), np.nan)
+
+
+def early_late_pnl(segments: PriceSegments, early_frac: float = EARLY_FRAC,
+                   late_frac: float = LATE_FRAC) -> Tuple[np.ndarray, np.ndarray]:
+    """|final - mean of the first early_frac| and |final - mean of the last late_frac| of each token's prices."""
+    n = segments.lengths
+    early_n = np.maximum(1, (n * early_frac).astype(np.int64))
+    late_n = np.maximum(1, (n * late_frac).astype(np.int64))
+    pos, seg, px = positions(segments), segments.seg, segments.px
+    early = pos < early_n[seg]
+    late = pos >= (n - late_n)[seg]
+    early_mean = np.bincount(seg[early], weights=px[early], minlength=len(n)) / early_n
+    late_mean = np.bincount(seg[late], weights=px[late], minlength=len(n)) / late_n
+    final = px[segments.last()]
+    out_early, out_late = np.abs(final - early_mean), np.abs(final - late_mean)
+    out_early[n < 2] = np.nan
+    out_late[n < 2] = np.nan
+    return out_early, out_late
+
+
+def momentum_stats(segments: PriceSegments, horizon: int = HORIZON) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (autocorr, pred_power) per token: lag-1 autocorrelation of returns, and
+    the correlation of each return with the price change over the next
+    `horizon` candles. NaN below max(3, horizon + 2) candles; (0, 0) when
+    every return is equal.
+    """
+    n = segments.lengths
+    r, r_seg = segment_returns(segments)
+    x, y, pair_seg = lag_pairs(r, r_seg, 1)
+    autocorr = segment_corr(x, y, np.bincount(pair_seg, minlength=len(n)))
+
+    aligned, future = horizon_pairs(segments, r, r_seg, horizon)
+    pred = segment_corr(aligned, future, np.maximum(n - horizon, 0))
+
+    flat = segment_constant(r, np.maximum(n - 1, 0))
+    autocorr[flat], pred[flat] = 0.0, 0.0
+    short = n < max(3, horizon + 2)
+    autocorr[short], pred[short] = np.nan, np.nan
+    return autocorr, pred
+
+
+def persistence_stats(segments: PriceSegments, lag: int = PERSISTENCE_LAG) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (lag-k return autocorrelation, P(next return > 0 | last return >= 0),
+    P(next return > 0 | last return < 0)) per token. NaN at <= lag + 1
+    candles; (0, 0.5, 0.5) when every return is equal.
+    """
+    n = segments.lengths
+    r, r_seg = segment_returns(segments)
+    x, y, pair_seg = lag_pairs(r, r_seg, lag)
+    autocorr = segment_corr(x, y, np.bincount(pair_seg, minlength=len(n)))
+
+    prev, nxt, step_seg = lag_pairs(r, r_seg, 1)
+    pos = prev >= 0
+    up = nxt > 0
+    n_pos = np.bincount(step_seg[pos], minlength=len(n))
+    n_neg = np.bincount(step_seg[~pos], minlength=len(n))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_up_pos = np.where(n_pos > 0, np.bincount(step_seg[pos & up], minlength=len(n)) / n_pos, np.nan)
+        p_up_neg = np.where(n_neg > 0, np.bincount(step_seg[~pos & up], minlength=len(n)) / n_neg, np.nan)
+
+    flat = segment_constant(r, np.maximum(n - 1, 0))
+    autocorr[flat], p_up_pos[flat], p_up_neg[flat] = 0.0, 0.5, 0.5
+    short = n <= lag + 1
+    autocorr[short], p_up_pos[short], p_up_neg[short] = np.nan, np.nan, np.nan
+    return autocorr, p_up_pos, p_up_neg
+
+
+def momentum_table(
+    segments: PriceSegments,
+    window_end: Optional[np.ndarray] = None,
+    min_points: int = MIN_POINTS,
+    early_frac: float = EARLY_FRAC,
+    late_frac: float = LATE_FRAC,
+    velocity_days: float = VELOCITY_DAYS,
+    horizon: int = HORIZON,
+) -> pd.DataFrame:
+    """One row per token with at least min_points candles: the notebook's metrics table (before question/info_class)."""
+    keep = segments.lengths >= min_points
+    segs = segments.select(keep)
+    if window_end is not None:
+        window_end = np.asarray(window_end, dtype=np.float64)[keep]
+    with METRICS.stage("momentum_table") as st:
+        mean_entropy = segment_sum(entropy(segs.px), segs.lengths) / segs.lengths
+        early, late = early_late_pnl(segs, early_frac, late_frac)
+        autocorr, pred = momentum_stats(segs, horizon)
+        table = pd.DataFrame({
+            "token_id": segs.token_ids,
+            "conditionId": segs.condition_ids,
+            "market_id": segs.market_ids,
+            "points": segs.lengths,
+            "mean_entropy": mean_entropy,
+            "flip_count": flip_counts(segs),
+            "velocity": velocities(segs, window_end, velocity_days),
+            "early_pnl_proxy": early,
+            "late_pnl_proxy": late,
+            "autocorr": autocorr,
+            "pred_power": pred,
+            "final_price": segs.px[segs.last()] if len(segs) else np.empty(0),
+        }, columns=METRICS_COLUMNS)
+        st.rows = len(segs.px)
+    return table
+
+
+def persistence_table(segments: PriceSegments, lag: int = PERSISTENCE_LAG, min_points: int = MIN_POINTS) -> pd.DataFrame:
+    """One row per token with at least min_points candles: the notebook's persistence table."""
+    segs = segments.select(segments.lengths >= min_points)
+    with METRICS.stage("persistence_table") as st:
+        autocorr, p_up_pos, p_up_neg = persistence_stats(segs, lag)
+        table = pd.DataFrame({
+            "token_id": segs.token_ids,
+            "conditionId": segs.condition_ids,
+            "market_id": segs.market_ids,
+            f"autocorr_lag{lag}": autocorr,
+            "p_up_given_pos_mom": p_up_pos,
+            "p_up_given_neg_mom": p_up_neg,
+        })
+        st.rows = len(segs.px)
+    return table
+
+
+# ── market metadata ──────────────────────────────────────────────────────────
+
+def load_markets(path: PathLike) -> pd.DataFrame:
+    """Markets from a JSONL file (collect_polymarket.py markets.jsonl) or a CSV."""
+    path = Path(path)
+    if path.suffix == ".csv":
+        return pd.read_csv(path)
+    with path.open("r", encoding="utf-8") as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def yes_token_map(markets_df: pd.DataFrame) -> Dict[str, str]:
+    """market id -> first clobTokenIds entry (assumed YES), as the notebook filters prices."""
+    key_col = "market_id" if "market_id" in markets_df.columns else ("id" if "id" in markets_df.columns else None)
+    if key_col is None or "clobTokenIds" not in markets_df.columns:
+        return {}
+    token_map = {}
+    for key, tokens in zip(markets_df[key_col], markets_df["clobTokenIds"]):
+        if isinstance(tokens, str):
+            try:
+                tokens = json.loads(tokens)
+            except json.JSONDecodeError:
+                tokens = None
+        if isinstance(tokens, list) and tokens:
+            token_map[str(key)] = str(tokens[0])
+    return token_map
+
+
+def resolution_times(markets_df: pd.DataFrame) -> Dict[Any, float]:
+    """
+    condition id -> epoch seconds of the first of closedTime / endDate /
+    endDateIso set on its first row (NaN if that value is unparseable).
+    Markets with none of them are left out.
+    """
+    cid_col = "conditionId" if "conditionId" in markets_df.columns else (
+        "condition_id" if "condition_id" in markets_df.columns else None)
+    cols = [c for c in RESOLUTION_COLUMNS if c in markets_df.columns]
+    if cid_col is None or not cols:
+        return {}
+    first = markets_df.drop_duplicates(cid_col, keep="first").set_index(cid_col)[cols]
+    resolved: Dict[Any, float] = {}
+    for cid, values in zip(first.index, first.itertuples(index=False)):
+        for val in values:
+            if pd.notna(val):
+                stamp = pd.to_datetime(val, utc=True, errors="coerce")
+                resolved[cid] = np.nan if pd.isna(stamp) else (stamp - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)
+                break
+    return resolved
+
+
+def resolution_window_end(segments: PriceSegments, markets_df: pd.DataFrame) -> np.ndarray:
+    """
+    Velocity window end per token: its market's resolution time (see
+    resolution_times), or the last candle when the market has none.
+    """
+    end = segments.ts[segments.last()].copy() if len(segments) else np.empty(0)
+    resolved = resolution_times(markets_df)
+    if resolved:
+        for k, cid in enumerate(segments.condition_ids):
+            if cid in resolved:
+                end[k] = resolved[cid]
+    return end
+
+
+def question_map(markets_df: pd.DataFrame) -> Dict[str, Any]:
+    """condition id / market id / id (as strings) -> question."""
+    if "question" not in markets_df.columns:
+        return {}
+    mapping: Dict[str, Any] = {}
+    for col in ("conditionId" if "conditionId" in markets_df.columns else "condition_id", "market_id", "id"):
+        if col in markets_df.columns:
+            mapping.update(dict(zip(markets_df[col].astype(str), markets_df["question"])))
+    return mapping
+
+
+def add_market_columns(metrics: pd.DataFrame, markets_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Add the notebook's question, info_class (entropy/flip quartiles) and early_vs_late (when the PnL proxies are there) columns."""
+    qmap = question_map(markets_df) if markets_df is not None else {}
+    metrics["question"] = metrics["conditionId"].astype(str).map(qmap)
+    missing = metrics["question"].isna()
+    metrics.loc[missing, "question"] = metrics.loc[missing, "market_id"].astype(str).map(qmap)
+
+    ent_q = metrics["mean_entropy"].quantile([0.25, 0.75])
+    flip_q = metrics["flip_count"].quantile([0.25, 0.75])
+    ent, flips = metrics["mean_entropy"], metrics["flip_count"]
+    metrics["info_class"] = np.select(
+        [(ent <= ent_q[0.25]) & (flips <= flip_q[0.25]), (ent >= ent_q[0.75]) & (flips >= flip_q[0.75])],
+        ["trivial", "informational"],
+        default="mixed",
+    )
+    if "early_pnl_proxy" in metrics.columns:
+        metrics["early_vs_late"] = metrics["early_pnl_proxy"] - metrics["late_pnl_proxy"]
+    return metrics
+
+
+def main(args: argparse.Namespace) -> None:
+    t0 = time.time()
+    markets_df = load_markets(args.markets)
+    token_map = yes_token_map(markets_df)
+    keep = None if args.all_tokens else (lambda market_id, token_id: token_map.get(str(market_id)) == token_id)
+    with METRICS.stage("load_prices") as st:
+        segments = PriceSegments.from_prices_file(args.prices, keep=keep)
+        st.rows = len(segments.px)
+    log(f"Loaded {len(segments.px):,} candles for {len(segments):,} tokens in {time.time() - t0:.1f}s")
+
+    metrics = momentum_table(segments, resolution_window_end(segments, markets_df), min_points=args.min_points,
+                             horizon=args.horizon, velocity_days=args.velocity_days)
+    metrics = add_market_columns(metrics, markets_df)
+    persistence = persistence_table(segments, lag=args.lag, min_points=args.min_points)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    metrics.to_csv(out_dir / "momentum_metrics.csv", index=False)
+    persistence.to_csv(out_dir / "momentum_persistence.csv", index=False)
+    log(f"Wrote {len(metrics):,} token rows -> {out_dir} in {time.time() - t0:.1f}s")
+    if args.metrics_dir:
+        METRICS.export(args.metrics_dir, "momentum")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-token momentum metrics for Polymarket price histories")
+    parser.add_argument("--markets", type=str, required=True, help="markets.jsonl (or markets.csv)")
+    parser.add_argument("--prices", type=str, required=True, help="Prices JSONL/CSV, or a columnar store directory")
+    parser.add_argument("--out-dir", type=str, default="data/polymarket/analysis")
+    parser.add_argument("--all-tokens", action="store_true", help="Keep every token, not just each market's first (YES) token")
+    parser.add_argument("--min-points", type=int, default=MIN_POINTS)
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="Candles ahead for pred_power")
+    parser.add_argument("--velocity-days", type=float, default=VELOCITY_DAYS)
+    parser.add_argument("--lag", type=int, default=PERSISTENCE_LAG, help="Return lag for momentum_persistence")
+    parser.add_argument("--metrics-dir", type=str, default=None, help="Write a JSON run report + Prometheus textfile here")
+    main(parser.parse_args())
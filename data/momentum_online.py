@@ -0,0 +1,779 @@
+#!/usr/bin/env python3
+"""
+momentum_online.py
+──────────────────
+Running per-token momentum and persistence statistics that are updated one
+candle at a time, so a refresh costs in proportion to the new candles rather
+than to each token's whole history.
+
+Each token keeps a small accumulator (TokenMomentum):
+
+  entropy sum, flip count            running sums
+  autocorr, autocorr_lag<k>,         co-moments of (x, y) pairs (count, means,
+  pred_power                         squared deviations, co-deviation), updated
+                                     with Welford's method and merged with
+                                     Chan et al.'s pairwise formula
+  p_up_given_pos/neg_mom             conditional up/down counts
+  velocity                           the candles of the last `velocity_days`
+
+plus the last max(horizon + 1, lag + 2) prices, which is all the lagged
+pairs need. Every update is O(1) (amortised for the velocity window), the
+state is saved as JSON, and two states merge: context() forks a state that
+carries only the boundary (recent prices, window, last flip sign), and
+merge() folds a fork that has seen the next candles back in. The tables
+match momentum.py over the same candles up to float summation order,
+except that the early/late PnL proxies, which depend on fractions of the
+whole history, are only in the batch tables.
+
+The CLI keeps the state next to the output and, on each run, reads only
+the rows appended to the prices JSONL file since the last one; a prices
+file that was rewritten (or a CSV / columnar store) rebuilds the state
+with one batch pass. Rows of markets missing from --markets are replayed
+on the first run that lists them. It writes momentum_metrics_online.csv and
+momentum_persistence_online.csv, leaving momentum.py's tables (which the
+notebook reads for the PnL proxies) alone.
+
+Usage:
+  python data/momentum_online.py --markets data/polymarket/markets.jsonl --prices data/polymarket/prices_history.jsonl --out-dir data/polymarket/analysis
+
+  from momentum_online import OnlineMomentum
+  online = OnlineMomentum.from_segments(segments)
+  online.update(token_id, ts, price)
+  metrics = online.momentum_table()
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from metrics import METRICS
+from momentum import (
+    DAY_SEC,
+    ENTROPY_EPS,
+    HORIZON,
+    METRICS_COLUMNS,
+    MIN_POINTS,
+    PERSISTENCE_LAG,
+    VELOCITY_DAYS,
+    PriceSegments,
+    add_market_columns,
+    entropy,
+    flip_counts,
+    history_points,
+    horizon_pairs,
+    lag_pairs,
+    load_markets,
+    resolution_times,
+    segment_constant,
+    segment_returns,
+    segment_sum,
+    yes_token_map,
+)
+
+PathLike = Union[str, Path]
+
+STATE_VERSION = 1
+STATE_FILE = "momentum_state.json"
+METRICS_FILE = "momentum_metrics_online.csv"
+PERSISTENCE_FILE = "momentum_persistence_online.csv"
+HEAD_HASH_BYTES = 1 << 16
+
+ONLINE_METRICS_COLUMNS = [c for c in METRICS_COLUMNS if c not in ("early_pnl_proxy", "late_pnl_proxy")]
+
+
+def log(msg: str) -> None:
+    print(f"[INFO] {msg}", flush=True)
+
+
+# ── running co-moments ───────────────────────────────────────────────────────
+
+class CoMoments:
+    """Count, means, squared deviations and co-deviation of a stream of (x, y) pairs."""
+
+    __slots__ = ("n", "mean_x", "mean_y", "m2_x", "m2_y", "c_xy")
+
+    def __init__(self, n: int = 0, mean_x: float = 0.0, mean_y: float = 0.0,
+                 m2_x: float = 0.0, m2_y: float = 0.0, c_xy: float = 0.0) -> None:
+        self.n = n
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.m2_x = m2_x
+        self.m2_y = m2_y
+        self.c_xy = c_xy
+
+    def add(self, x: float, y: float) -> None:
+        self.n += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self.m2_x += dx * (x - self.mean_x)
+        self.m2_y += dy * (y - self.mean_y)
+        self.c_xy += dx * (y - self.mean_y)
+
+    def merge(self, other: "CoMoments") -> None:
+        """Fold in the moments of pairs that came after this one's."""
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean_x, self.mean_y = other.n, other.mean_x, other.mean_y
+            self.m2_x, self.m2_y, self.c_xy = other.m2_x, other.m2_y, other.c_xy
+            return
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        w = self.n * other.n / n
+        self.m2_x += other.m2_x + dx * dx * w
+        self.m2_y += other.m2_y + dy * dy * w
+        self.c_xy += other.c_xy + dx * dy * w
+        self.mean_x += dx * other.n / n
+        self.mean_y += dy * other.n / n
+        self.n = n
+
+    def corr(self) -> float:
+        """Pearson correlation as np.corrcoef: NaN below 2 pairs or when x or y is constant."""
+        if self.n < 2 or self.m2_x == 0 or self.m2_y == 0:
+            return math.nan
+        return min(1.0, max(-1.0, self.c_xy / math.sqrt(self.m2_x * self.m2_y)))
+
+    def to_list(self) -> List[float]:
+        return [self.n, self.mean_x, self.mean_y, self.m2_x, self.m2_y, self.c_xy]
+
+    @classmethod
+    def from_list(cls, values: Sequence[float]) -> "CoMoments":
+        n, mean_x, mean_y, m2_x, m2_y, c_xy = values
+        return cls(int(n), float(mean_x), float(mean_y), float(m2_x), float(m2_y), float(c_xy))
+
+
+def segment_co_moments(x: np.ndarray, y: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    (n, mean_x, mean_y, m2_x, m2_y, c_xy) arrays over consecutive runs of
+    pairs. A constant run gets its first value as the mean, so its m2 is
+    exactly 0 and stays 0 as equal values are streamed in.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+    nz = counts > 0
+    moments: List[np.ndarray] = [counts]
+    dev: List[np.ndarray] = []
+    for v in (x, y):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(nz, segment_sum(v, counts) / counts, 0.0)
+        const = nz & segment_constant(v, counts)
+        mean[const] = v[starts[const]]
+        moments.append(mean)
+        dev.append(v - np.repeat(mean, counts))
+    dx, dy = dev
+    return (counts, moments[1], moments[2], segment_sum(dx * dx, counts),
+            segment_sum(dy * dy, counts), segment_sum(dx * dy, counts))
+
+
+# ── per-token accumulator ────────────────────────────────────────────────────
+
+def _entropy(p: float) -> float:
+    p = min(max(p, ENTROPY_EPS), 1 - ENTROPY_EPS)
+    return -(p * math.log(p) + (1 - p) * math.log(1 - p))
+
+
+class TokenMomentum:
+    """
+    One token's running statistics. window_end is its velocity window's end
+    (epoch seconds): None follows the last candle, NaN (an unparseable
+    resolution time) gives NaN velocity. base_ts is the last candle of the
+    state this one was forked from by context(), None for a fresh state.
+    """
+
+    __slots__ = (
+        "condition_id", "market_id", "horizon", "lag", "window_sec", "window_end", "base_ts",
+        "n", "last_ts", "final_price", "entropy_sum", "last_sign", "flips", "r_min", "r_max",
+        "recent", "ac1", "ack", "pred", "n_pos", "up_pos", "n_neg", "up_neg", "window",
+    )
+
+    def __init__(self, condition_id: Any = None, market_id: Any = None, horizon: int = HORIZON,
+                 lag: int = PERSISTENCE_LAG, window_sec: float = VELOCITY_DAYS * DAY_SEC,
+                 window_end: Optional[float] = None) -> None:
+        self.condition_id = condition_id
+        self.market_id = market_id
+        self.horizon = horizon
+        self.lag = lag
+        self.window_sec = window_sec
+        self.window_end = window_end
+        self.base_ts: Optional[float] = None
+        self.n = 0
+        self.last_ts: Optional[float] = None
+        self.final_price = math.nan
+        self.entropy_sum = 0.0
+        self.last_sign = 0
+        self.flips = 0
+        self.r_min = math.inf
+        self.r_max = -math.inf
+        self.recent: Deque[float] = deque(maxlen=max(horizon + 1, lag + 2))
+        self.ac1 = CoMoments()
+        self.ack = self.ac1 if lag == 1 else CoMoments()
+        self.pred = CoMoments()
+        self.n_pos = self.up_pos = self.n_neg = self.up_neg = 0
+        self.window: Deque[Tuple[float, float]] = deque()
+
+    def update(self, ts: float, price: float) -> bool:
+        """Add one candle; candles at or before the last one are skipped (returns False)."""
+        if self.last_ts is not None and ts <= self.last_ts:
+            return False
+        recent = self.recent
+        self.n += 1
+        self.entropy_sum += _entropy(price)
+        sign = (price > 0.5) - (price < 0.5)
+        if sign:
+            if self.last_sign and sign != self.last_sign:
+                self.flips += 1
+            self.last_sign = sign
+
+        recent.append(price)
+        k = len(recent)
+        if k >= 2:
+            r = price - recent[-2]
+            self.r_min = min(self.r_min, r)
+            self.r_max = max(self.r_max, r)
+            if k >= 3:
+                prev = recent[-2] - recent[-3]
+                self.ac1.add(prev, r)
+                if prev >= 0:
+                    self.n_pos += 1
+                    self.up_pos += r > 0
+                else:
+                    self.n_neg += 1
+                    self.up_neg += r > 0
+            if self.lag > 1 and k >= self.lag + 2:
+                self.ack.add(recent[-1 - self.lag] - recent[-2 - self.lag], r)
+        h = self.horizon
+        if k >= h + 1:
+            base = recent[-1 - h]
+            self.pred.add(recent[-h] - base, price - base)
+
+        end = self.window_end
+        if end is None or ts <= end:
+            window = self.window
+            window.append((ts, price))
+            cutoff = ts - self.window_sec
+            while window[0][0] < cutoff:
+                window.popleft()
+        self.last_ts = ts
+        self.final_price = price
+        return True
+
+    # metrics
+
+    def velocity(self) -> float:
+        end = self.last_ts if self.window_end is None else self.window_end
+        if end is None or math.isnan(end):
+            return math.nan
+        start = end - self.window_sec
+        px = [p for t, p in self.window if start <= t <= end]
+        if len(px) < 2:
+            return math.nan
+        return sum(abs(b - a) for a, b in zip(px, px[1:])) / (len(px) - 1)
+
+    def flat(self) -> bool:
+        """Every return so far is equal (or there are none)."""
+        return self.r_min >= self.r_max
+
+    def momentum_row(self) -> Dict[str, Any]:
+        short, flat = self.n < max(3, self.horizon + 2), self.flat()
+        return {
+            "points": self.n,
+            "mean_entropy": self.entropy_sum / self.n if self.n else math.nan,
+            "flip_count": self.flips,
+            "velocity": self.velocity(),
+            "autocorr": math.nan if short else (0.0 if flat else self.ac1.corr()),
+            "pred_power": math.nan if short else (0.0 if flat else self.pred.corr()),
+            "final_price": self.final_price,
+        }
+
+    def persistence_row(self) -> Tuple[float, float, float]:
+        if self.n <= self.lag + 1:
+            return math.nan, math.nan, math.nan
+        if self.flat():
+            return 0.0, 0.5, 0.5
+        return (
+            self.ack.corr(),
+            self.up_pos / self.n_pos if self.n_pos else math.nan,
+            self.up_neg / self.n_neg if self.n_neg else math.nan,
+        )
+
+    # fork / merge
+
+    def context(self) -> "TokenMomentum":
+        """A fresh state that continues after this one: its boundary, zeroed statistics."""
+        fork = TokenMomentum(self.condition_id, self.market_id, self.horizon, self.lag, self.window_sec, self.window_end)
+        fork.base_ts = self.last_ts
+        fork.last_ts = self.last_ts
+        fork.final_price = self.final_price
+        fork.last_sign = self.last_sign
+        fork.recent.extend(self.recent)
+        fork.window.extend(self.window)
+        return fork
+
+    def merge(self, later: "TokenMomentum") -> None:
+        """Fold in a context() fork of this state that has seen the following candles."""
+        if later.base_ts != self.last_ts:
+            raise ValueError(f"cannot merge: fork starts after {later.base_ts}, state ends at {self.last_ts}")
+        self.n += later.n
+        self.entropy_sum += later.entropy_sum
+        self.flips += later.flips
+        self.r_min = min(self.r_min, later.r_min)
+        self.r_max = max(self.r_max, later.r_max)
+        self.ac1.merge(later.ac1)
+        if self.ack is not self.ac1:
+            self.ack.merge(later.ack)
+        self.pred.merge(later.pred)
+        self.n_pos += later.n_pos
+        self.up_pos += later.up_pos
+        self.n_neg += later.n_neg
+        self.up_neg += later.up_neg
+        self.last_ts, self.final_price, self.last_sign = later.last_ts, later.final_price, later.last_sign
+        self.window_end = later.window_end
+        self.recent = deque(later.recent, maxlen=self.recent.maxlen)
+        self.window = deque(later.window)
+
+    # persistence
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {
+            "cid": self.condition_id, "mid": self.market_id, "wend": self.window_end, "base": self.base_ts,
+            "n": self.n, "last_ts": self.last_ts, "final": self.final_price, "ent": self.entropy_sum,
+            "sign": self.last_sign, "flips": self.flips,
+            "r": [self.r_min, self.r_max] if self.r_min <= self.r_max else None,
+            "recent": list(self.recent), "ac1": self.ac1.to_list(), "pred": self.pred.to_list(),
+            "cond": [self.n_pos, self.up_pos, self.n_neg, self.up_neg],
+            "window_ts": [t for t, _ in self.window], "window_px": [p for _, p in self.window],
+        }
+        if self.ack is not self.ac1:
+            d["ack"] = self.ack.to_list()
+        return d
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any], horizon: int, lag: int, window_sec: float) -> "TokenMomentum":
+        tok = cls(d.get("cid"), d.get("mid"), horizon, lag, window_sec, d.get("wend"))
+        tok.base_ts = d.get("base")
+        tok.n = int(d["n"])
+        tok.last_ts = d.get("last_ts")
+        tok.final_price = float(d["final"])
+        tok.entropy_sum = float(d["ent"])
+        tok.last_sign = int(d["sign"])
+        tok.flips = int(d["flips"])
+        if d.get("r"):
+            tok.r_min, tok.r_max = float(d["r"][0]), float(d["r"][1])
+        tok.recent.extend(d["recent"])
+        tok.ac1 = CoMoments.from_list(d["ac1"])
+        tok.ack = CoMoments.from_list(d["ack"]) if lag != 1 else tok.ac1
+        tok.pred = CoMoments.from_list(d["pred"])
+        tok.n_pos, tok.up_pos, tok.n_neg, tok.up_neg = (int(v) for v in d["cond"])
+        tok.window.extend(zip(d["window_ts"], d["window_px"]))
+        return tok
+
+
+# ── all tokens ───────────────────────────────────────────────────────────────
+
+class OnlineMomentum:
+    """
+    TokenMomentum per token id, with shared parameters. resolved maps a
+    condition id to its resolution time (momentum.resolution_times); new
+    tokens take their velocity window end from it. sources records how far
+    each prices file has been read (see the CLI).
+    """
+
+    def __init__(self, lag: int = PERSISTENCE_LAG, horizon: int = HORIZON, velocity_days: float = VELOCITY_DAYS,
+                 resolved: Optional[Dict[Any, float]] = None) -> None:
+        if horizon < 1 or lag < 1:
+            raise ValueError("horizon and lag must be >= 1")
+        self.lag = lag
+        self.horizon = horizon
+        self.velocity_days = velocity_days
+        self.resolved: Dict[Any, float] = dict(resolved or {})
+        self.tokens: Dict[str, TokenMomentum] = {}
+        self.sources: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {"lag": self.lag, "horizon": self.horizon, "velocity_days": self.velocity_days}
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def _new_token(self, condition_id: Any, market_id: Any) -> TokenMomentum:
+        return TokenMomentum(condition_id, market_id, self.horizon, self.lag,
+                             self.velocity_days * DAY_SEC, self.resolved.get(condition_id))
+
+    def token(self, token_id: str, condition_id: Any = None, market_id: Any = None) -> TokenMomentum:
+        tok = self.tokens.get(token_id)
+        if tok is None:
+            tok = self.tokens[token_id] = self._new_token(condition_id, market_id)
+        return tok
+
+    def update(self, token_id: str, ts: float, price: float, condition_id: Any = None, market_id: Any = None) -> bool:
+        return self.token(str(token_id), condition_id, market_id).update(float(ts), float(price))
+
+    def update_history(self, token_id: str, history: List[Any], condition_id: Any = None, market_id: Any = None) -> int:
+        """Add a stored history ({"t", "p"} dicts or [t, p] pairs), oldest first; returns the candles added."""
+        tok = self.token(str(token_id), condition_id, market_id)
+        points = []
+        for t, p in history_points(history):
+            try:
+                t, p = float(t), float(p)
+            except (TypeError, ValueError):
+                continue
+            if not (math.isnan(t) or math.isnan(p)):
+                points.append((t, p))
+        points.sort(key=lambda tp: tp[0])
+        return sum(tok.update(t, p) for t, p in points)
+
+    def set_resolved(self, resolved: Dict[Any, float]) -> int:
+        """
+        Replace the resolution times and move existing tokens' window ends to
+        match; returns the tokens moved. A window only holds the last
+        velocity_days of candles, so an end moved before that sees fewer.
+        """
+        self.resolved = dict(resolved)
+        moved = 0
+        for tok in self.tokens.values():
+            end = self.resolved.get(tok.condition_id)
+            same = end == tok.window_end or (end is not None and tok.window_end is not None
+                                             and math.isnan(end) and math.isnan(tok.window_end))
+            if not same:
+                tok.window_end = end
+                moved += 1
+        return moved
+
+    @classmethod
+    def from_segments(
+        cls,
+        segments: PriceSegments,
+        resolved: Optional[Dict[Any, float]] = None,
+        lag: int = PERSISTENCE_LAG,
+        horizon: int = HORIZON,
+        velocity_days: float = VELOCITY_DAYS,
+    ) -> "OnlineMomentum":
+        """Build the state for existing histories in one vectorized pass (as if every candle had been streamed in)."""
+        online = cls(lag, horizon, velocity_days, resolved)
+        K = len(segments)
+        if not K:
+            return online
+        n, starts, ts, px = segments.lengths, segments.starts, segments.ts, segments.px
+        ent = segment_sum(entropy(px), n)
+        flips = flip_counts(segments)
+        sign = np.sign(px - 0.5)
+        nz_pos = np.where(sign != 0, np.arange(len(px)), -1)
+        last_nz = np.maximum.reduceat(nz_pos, starts)
+        last_sign = np.where(last_nz >= 0, sign[np.maximum(last_nz, 0)], 0).astype(np.int64)
+
+        r, r_seg = segment_returns(segments)
+        r_counts = np.maximum(n - 1, 0)
+        r_min, r_max = np.full(K, np.inf), np.full(K, -np.inf)
+        has_r = r_counts > 0
+        if r.size:
+            r_starts = np.concatenate(([0], np.cumsum(r_counts)[:-1]))[has_r]
+            r_min[has_r] = np.minimum.reduceat(r, r_starts)
+            r_max[has_r] = np.maximum.reduceat(r, r_starts)
+
+        prev, nxt, step_seg = lag_pairs(r, r_seg, 1)
+        ac1 = segment_co_moments(prev, nxt, np.bincount(step_seg, minlength=K))
+        if lag == 1:
+            ack = ac1
+        else:
+            x, y, pair_seg = lag_pairs(r, r_seg, lag)
+            ack = segment_co_moments(x, y, np.bincount(pair_seg, minlength=K))
+        aligned, future = horizon_pairs(segments, r, r_seg, horizon)
+        pred = segment_co_moments(aligned, future, np.maximum(n - horizon, 0))
+        pos, up = prev >= 0, nxt > 0
+        cond = [np.bincount(step_seg[m], minlength=K) for m in (pos, pos & up, ~pos, ~pos & up)]
+
+        window_sec = velocity_days * DAY_SEC
+        for k in range(K):
+            lo, hi = int(starts[k]), int(starts[k] + n[k])
+            tok = online._new_token(segments.condition_ids[k], segments.market_ids[k])
+            tok.n = int(n[k])
+            tok.last_ts = float(ts[hi - 1])
+            tok.final_price = float(px[hi - 1])
+            tok.entropy_sum = float(ent[k])
+            tok.last_sign = int(last_sign[k])
+            tok.flips = int(flips[k])
+            tok.r_min, tok.r_max = float(r_min[k]), float(r_max[k])
+            tok.recent.extend(px[max(lo, hi - tok.recent.maxlen):hi].tolist())
+            tok.ac1 = CoMoments(*(v[k].item() for v in ac1))
+            tok.ack = tok.ac1 if lag == 1 else CoMoments(*(v[k].item() for v in ack))
+            tok.pred = CoMoments(*(v[k].item() for v in pred))
+            tok.n_pos, tok.up_pos, tok.n_neg, tok.up_neg = (int(c[k]) for c in cond)
+            # What the window would hold after streaming: candles within window_sec of the
+            # last one appended, i.e. the last one at or before the window end
+            end = tok.window_end
+            if end is None or not math.isnan(end):
+                ref = tok.last_ts if end is None else min(tok.last_ts, end)
+                a = lo + int(np.searchsorted(ts[lo:hi], ref - window_sec, side="left"))
+                b = lo + int(np.searchsorted(ts[lo:hi], ref, side="right"))
+                tok.window.extend(zip(ts[a:b].tolist(), px[a:b].tolist()))
+            online.tokens[str(segments.token_ids[k])] = tok
+        return online
+
+    # fork / merge
+
+    def context(self) -> "OnlineMomentum":
+        """A fork that carries every token's boundary, so it can take the next candles and be merged back."""
+        fork = OnlineMomentum(self.lag, self.horizon, self.velocity_days, self.resolved)
+        fork.tokens = {tid: tok.context() for tid, tok in self.tokens.items()}
+        return fork
+
+    def merge(self, later: "OnlineMomentum") -> None:
+        """Fold in a context() fork that has seen the following candles; its new tokens are added as they are."""
+        if later.params != self.params:
+            raise ValueError(f"cannot merge states with different parameters: {self.params} vs {later.params}")
+        for tid, tok in later.tokens.items():
+            mine = self.tokens.get(tid)
+            if mine is None:
+                self.tokens[tid] = tok
+            else:
+                mine.merge(tok)
+        self.sources.update(later.sources)
+
+    # tables
+
+    def momentum_table(self, min_points: int = MIN_POINTS) -> pd.DataFrame:
+        """momentum.momentum_table's columns (without the early/late PnL proxies), one row per token with >= min_points candles."""
+        with METRICS.stage("online_momentum_table") as st:
+            rows = []
+            for tid in sorted(self.tokens):
+                tok = self.tokens[tid]
+                if tok.n >= min_points:
+                    rows.append({"token_id": tid, "conditionId": tok.condition_id, "market_id": tok.market_id,
+                                 **tok.momentum_row()})
+            st.rows = len(rows)
+        return pd.DataFrame(rows, columns=ONLINE_METRICS_COLUMNS)
+
+    def persistence_table(self, min_points: int = MIN_POINTS) -> pd.DataFrame:
+        """momentum.persistence_table, one row per token with >= min_points candles."""
+        with METRICS.stage("online_persistence_table") as st:
+            rows = []
+            for tid in sorted(self.tokens):
+                tok = self.tokens[tid]
+                if tok.n >= min_points:
+                    rows.append((tid, tok.condition_id, tok.market_id, *tok.persistence_row()))
+            st.rows = len(rows)
+        return pd.DataFrame(rows, columns=["token_id", "conditionId", "market_id", f"autocorr_lag{self.lag}",
+                                           "p_up_given_pos_mom", "p_up_given_neg_mom"])
+
+    # persistence
+
+    def save(self, path: PathLike) -> None:
+        """Atomically replace the state file so a crash never leaves it half-written."""
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            # One json.dumps call runs the C encoder; json.dump's chunked writes are several times slower
+            f.write(json.dumps({
+                "version": STATE_VERSION,
+                "params": self.params,
+                "sources": self.sources,
+                "tokens": {tid: tok.to_dict() for tid, tok in self.tokens.items()},
+            }))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, p)
+
+    @classmethod
+    def load(cls, path: PathLike, resolved: Optional[Dict[Any, float]] = None) -> "OnlineMomentum":
+        with Path(path).open("r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(f"{path}: state version {state.get('version')}, expected {STATE_VERSION}")
+        params = state["params"]
+        online = cls(int(params["lag"]), int(params["horizon"]), float(params["velocity_days"]), resolved)
+        window_sec = online.velocity_days * DAY_SEC
+        online.tokens = {tid: TokenMomentum.from_dict(d, online.horizon, online.lag, window_sec)
+                         for tid, d in state["tokens"].items()}
+        online.sources = state.get("sources", {})
+        return online
+
+
+# ── prices file tailing ──────────────────────────────────────────────────────
+
+def _head_hash(path: Path, length: int) -> str:
+    with path.open("rb") as f:
+        return hashlib.sha1(f.read(min(length, HEAD_HASH_BYTES))).hexdigest()
+
+
+def complete_size(path: PathLike) -> int:
+    """Bytes up to the end of the last complete line (a row still being written is left for the next run)."""
+    p = Path(path)
+    size = p.stat().st_size
+    with p.open("rb") as f:
+        pos = size
+        while pos > 0:
+            step = min(pos, 1 << 16)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl >= 0:
+                return pos - step + nl + 1
+            pos -= step
+    return 0
+
+
+def source_record(path: PathLike, offset: int, skipped_markets: Iterable[str] = ()) -> Dict[str, Any]:
+    """How far a prices file was read, and the markets whose rows were skipped as not (yet) in --markets."""
+    return {"offset": offset, "head": _head_hash(Path(path), offset), "skipped_markets": sorted(skipped_markets)}
+
+
+def source_unchanged(path: PathLike, record: Optional[Dict[str, Any]]) -> bool:
+    """The file still starts with the bytes read so far (it was appended to, not rewritten)."""
+    p = Path(path)
+    if not record or not p.is_file() or p.suffix != ".jsonl":
+        return False
+    offset = int(record["offset"])
+    return p.stat().st_size >= offset and _head_hash(p, offset) == record["head"]
+
+
+def read_appended_rows(path: PathLike, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+    """The complete JSONL rows after byte offset, and the offset after them."""
+    with Path(path).open("rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    rows = []
+    for line in data[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            continue
+    return rows, offset + end
+
+
+def read_market_rows(path: PathLike, end: int, market_ids: Set[str]) -> List[Dict[str, Any]]:
+    """The JSONL rows before byte offset end that belong to market_ids, in file order."""
+    needles = [m.encode("utf-8") for m in market_ids]
+    rows = []
+    with Path(path).open("rb") as f:
+        for line in f:
+            if f.tell() > end:
+                break
+            # Cheap byte test first; most rows belong to other markets
+            if not any(n in line for n in needles):
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if row.get("market_id") is not None and str(row["market_id"]) in market_ids:
+                rows.append(row)
+    return rows
+
+
+def iter_token_rows(rows: List[Dict[str, Any]]) -> Iterator[Tuple[Optional[str], Optional[str], str, List[Any]]]:
+    """(market_id, condition_id, token_id, history) of parsed prices rows, as price_store.iter_token_histories."""
+    for row in rows:
+        yield (
+            row.get("market_id"),
+            row.get("conditionId") or row.get("condition_id"),
+            str(row.get("token_id")),
+            row.get("history") or [],
+        )
+
+
+def main(args: argparse.Namespace) -> None:
+    t0 = time.time()
+    markets_df = load_markets(args.markets)
+    token_map = yes_token_map(markets_df)
+    resolved = resolution_times(markets_df)
+    # Rows of markets not in --markets (e.g. logged by live_ingest after it was read) are
+    # remembered and replayed once their market appears, since the offset moves past them
+    skipped: Set[str] = set()
+
+    def keep_yes(market_id: Optional[str], token_id: str) -> bool:
+        if market_id is not None and market_id not in token_map:
+            skipped.add(market_id)
+            return False
+        return token_map.get(market_id) == token_id
+
+    keep = None if args.all_tokens else keep_yes
+
+    out_dir = Path(args.out_dir)
+    state_path = Path(args.state) if args.state else out_dir / STATE_FILE
+    prices_key = str(Path(args.prices).resolve())
+    params = {"lag": args.lag, "horizon": args.horizon, "velocity_days": args.velocity_days}
+
+    online: Optional[OnlineMomentum] = None
+    if state_path.exists() and not args.rebuild:
+        online = OnlineMomentum.load(state_path, resolved)
+        if online.params != params:
+            log(f"State {state_path} has parameters {online.params}; rebuilding")
+            online = None
+        elif not source_unchanged(args.prices, online.sources.get(prices_key)):
+            log(f"{args.prices} was rewritten or cannot be tailed; rebuilding")
+            online = None
+
+    if online is None:
+        with METRICS.stage("online_bootstrap") as st:
+            offset = complete_size(args.prices) if Path(args.prices).is_file() else 0
+            segments = PriceSegments.from_prices_file(args.prices, keep=keep)
+            online = OnlineMomentum.from_segments(segments, resolved, lag=args.lag, horizon=args.horizon,
+                                                  velocity_days=args.velocity_days)
+            st.rows = len(segments.px)
+        log(f"Built state for {len(online):,} tokens from {len(segments.px):,} candles")
+    else:
+        moved = online.set_resolved(resolved)
+        record = online.sources[prices_key]
+        with METRICS.stage("online_update") as st:
+            skipped.update(record.get("skipped_markets", []))
+            appeared = skipped & set(token_map) if keep is not None else set()
+            skipped -= appeared
+            rows: List[Dict[str, Any]] = []
+            if appeared:
+                rows = read_market_rows(args.prices, int(record["offset"]), appeared)
+                log(f"Replaying {len(rows):,} earlier rows of {len(appeared):,} markets new in {args.markets}")
+            appended, offset = read_appended_rows(args.prices, int(record["offset"]))
+            rows += appended
+            added = 0
+            for market_id, condition_id, token_id, history in iter_token_rows(rows):
+                if keep is None or keep(None if market_id is None else str(market_id), token_id):
+                    added += online.update_history(token_id, history, condition_id, market_id)
+            st.rows = added
+        METRICS.count("online_candles_added", added)
+        log(f"Added {added:,} new candles from {len(appended):,} appended rows ({moved:,} window ends moved)")
+    if Path(args.prices).is_file() and Path(args.prices).suffix == ".jsonl":
+        online.sources[prices_key] = source_record(args.prices, offset, skipped)
+    online.save(state_path)
+
+    metrics = add_market_columns(online.momentum_table(args.min_points), markets_df)
+    persistence = online.persistence_table(args.min_points)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    metrics.to_csv(out_dir / METRICS_FILE, index=False)
+    persistence.to_csv(out_dir / PERSISTENCE_FILE, index=False)
+    log(f"Wrote {len(metrics):,} token rows -> {out_dir} in {time.time() - t0:.1f}s")
+    if args.metrics_dir:
+        METRICS.export(args.metrics_dir, "momentum_online")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally updated momentum metrics for Polymarket price histories")
+    parser.add_argument("--markets", type=str, required=True, help="markets.jsonl (or markets.csv)")
+    parser.add_argument("--prices", type=str, required=True, help="Prices JSONL (tailed), or a CSV / columnar store (rebuilt)")
+    parser.add_argument("--out-dir", type=str, default="data/polymarket/analysis")
+    parser.add_argument("--state", type=str, default=None, help=f"State file (default: <out-dir>/{STATE_FILE})")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the saved state and rebuild it from --prices")
+    parser.add_argument("--all-tokens", action="store_true", help="Keep every token, not just each market's first (YES) token")
+    parser.add_argument("--min-points", type=int, default=MIN_POINTS)
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="Candles ahead for pred_power")
+    parser.add_argument("--velocity-days", type=float, default=VELOCITY_DAYS)
+    parser.add_argument("--lag", type=int, default=PERSISTENCE_LAG, help="Return lag for momentum_persistence")
+    parser.add_argument("--metrics-dir", type=str, default=None, help="Write a JSON run report + Prometheus textfile here")
+    main(parser.parse_args())
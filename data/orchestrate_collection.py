@@ -6,9 +6,11 @@ Coordinates collection across Polymarket, Reddit, and Twitter
 
 import json
 import pandas as pd
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Any, Callable, Deque, Iterable, List, Dict, Optional, Tuple, Union
 import argparse
 
 # Import collectors - use relative imports if running from data/ directory
@@ -24,6 +26,180 @@ if str(data_dir) not in sys.path:
 from collect_polymarket import PolymarketCollector
 from collect_reddit import RedditCollector
 from collect_twitter import TwitterCollector
+from metrics import METRICS
+from pipeline_cache import MARKETS_MANIFEST_FILE, MarketManifest, StepCache, file_fingerprint, fingerprint
+from social_index import SocialIndex
+from social_shards import manifest_path as shard_manifest_path
+from timestamps import TimestampParser
+
+# Step 1 outputs in the polymarket output_dir
+MARKETS_FILE = "markets_processed.csv"
+QUERY_SETS_FILE = "query_sets.json"
+
+# source -> (display name, unit, results counter)
+SOURCES = {
+    'reddit': ('Reddit', 'posts', 'reddit_posts'),
+    'twitter': ('Twitter', 'tweets', 'twitter_tweets'),
+}
+
+
+def open_social_index(config: Dict) -> Optional[SocialIndex]:
+    """Optional full-text index built with social_index.py; replaces dump scans"""
+    index_path = config.get('collection', {}).get('index_path')
+    return SocialIndex(index_path) if index_path and Path(index_path).exists() else None
+
+
+def build_collector(config: Dict, source: str,
+                    social_index: Optional[SocialIndex] = None,
+                    decode_workers: Optional[int] = None) -> Union[RedditCollector, TwitterCollector]:
+    """Reddit or Twitter collector configured from the pipeline config"""
+    collection = config.get('collection', {})
+    word_boundary = collection.get('keyword_word_boundary', False)
+    if decode_workers is None:
+        decode_workers = collection.get('decode_workers', 1)
+    
+    if source == 'reddit':
+        return RedditCollector(
+            output_dir=config['reddit']['output_dir'],
+            pushshift_dump_dir=config['reddit'].get('pushshift_dump_dir'),
+            praw_config=config['reddit'].get('praw') if config['reddit'].get('praw', {}).get('client_id') else None,
+            keyword_word_boundary=word_boundary,
+            decode_workers=decode_workers,
+            social_index=social_index,
+            shard_dir=config['reddit'].get('shard_dir')
+        )
+    
+    return TwitterCollector(
+        output_dir=config['twitter']['output_dir'],
+        dataset_dir=config['twitter'].get('dataset_dir'),
+        api_config=config['twitter'].get('api') if config['twitter'].get('api', {}).get('consumer_key') else None,
+        keyword_word_boundary=word_boundary,
+        decode_workers=decode_workers,
+        social_index=social_index,
+        shard_dir=config['twitter'].get('shard_dir'),
+        raw_data=config['twitter'].get('raw_data', 'inline')
+    )
+
+
+def collect_market(collector, source: str, job: Dict[str, Any]) -> Optional[int]:
+    """Collect one market from one source; returns the number of rows saved (None on error)"""
+    name, unit, _ = SOURCES[source]
+    try:
+        with METRICS.stage(f"{source}.market") as st:
+            df = collector.collect_for_market(**job)
+            st.rows = len(df)
+    except Exception as e:
+        print(f"  ⚠ Error collecting {name} data: {e}")
+        METRICS.count(f"{source}_market_errors")
+        return None
+    
+    if not df.empty:
+        print(f"  ✓ Collected {len(df)} {name} {unit}")
+    return len(df)
+
+
+# Per-process collector for SourcePool workers (SQLite connections and API
+# clients cannot be shared across processes, so each worker builds its own)
+_worker_collector = None
+_worker_source = None
+
+
+def _init_worker(config: Dict, source: str):
+    global _worker_collector, _worker_source
+    # Markets already run in parallel: decode each dump on the worker's own core
+    _worker_collector = build_collector(config, source, open_social_index(config), decode_workers=1)
+    _worker_source = source
+
+
+def _worker_collect(job: Dict[str, Any]) -> Tuple[Optional[int], Dict[str, Any], Dict[str, Any]]:
+    """Rows collected plus the worker's metrics and timestamp counts for this market (merged in the parent)"""
+    rows = collect_market(_worker_collector, _worker_source, job)
+    return rows, METRICS.drain(), _worker_collector.timestamps.drain()
+
+
+class SourcePool:
+    """
+    Process pool collecting markets for one source. Each source gets its own
+    pool, so API-bound collection of one source overlaps CPU-bound dump
+    filtering of the other. submit() never blocks: at most max_in_flight
+    markets are handed to the executor and the rest wait in the pool's queue,
+    topped up as markets finish (drain_pools waits on every pool at once, so
+    a slow source never stalls feeding the other). on_result(job, rows) is
+    called in the parent as each market finishes (rows is None if it failed).
+    The workers' timestamp counts are added to the timestamps parser given.
+    """
+    
+    def __init__(self, config: Dict, source: str, workers: int, max_in_flight: Optional[int] = None,
+                 on_result: Optional[Callable[[Dict[str, Any], Optional[int]], None]] = None,
+                 timestamps: Optional[TimestampParser] = None):
+        self.source = source
+        self.max_in_flight = max_in_flight or 2 * workers
+        self.on_result = on_result
+        self.timestamps = timestamps
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(config, source))
+        self.pending: Dict[Future, Dict[str, Any]] = {}
+        self.queued: Deque[Dict[str, Any]] = deque()
+        self.rows = 0
+    
+    def submit(self, job: Dict[str, Any]):
+        self.queued.append(job)
+        self.poll()
+    
+    def poll(self):
+        """Handle finished markets without blocking and top up the executor"""
+        if self.pending:
+            done, _ = wait(self.pending, timeout=0)
+            self._harvest(done)
+        self._top_up()
+    
+    def _top_up(self):
+        while self.queued and len(self.pending) < self.max_in_flight:
+            job = self.queued.popleft()
+            self.pending[self.executor.submit(_worker_collect, job)] = job
+    
+    def _harvest(self, done: Iterable[Future]):
+        for future in done:
+            job = self.pending.pop(future, None)
+            if job is None:
+                continue    # another pool's future
+            try:
+                rows, worker_metrics, worker_timestamps = future.result()
+                METRICS.merge(worker_metrics)
+                if self.timestamps is not None:
+                    self.timestamps.merge(worker_timestamps)
+            except Exception as e:
+                print(f"  ⚠ Error collecting {SOURCES[self.source][0]} data: {e}")
+                rows = None
+            self.rows += rows or 0
+            if self.on_result is not None:
+                self.on_result(job, rows)
+    
+    def close(self) -> int:
+        """Wait for all submitted markets and return the total rows collected"""
+        drain_pools([self])
+        self.executor.shutdown()
+        return self.rows
+
+
+def drain_pools(pools: Iterable[SourcePool]):
+    """
+    Run every pool's queued and in-flight markets to completion, waiting on
+    all pools' futures together so each pool is refilled as soon as one of
+    its markets finishes.
+    """
+    pools = list(pools)
+    for pool in pools:
+        pool._top_up()
+    while True:
+        pending = [future for pool in pools for future in pool.pending]
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for pool in pools:
+            pool._harvest(done)
+            pool._top_up()
+
 
 class DataCollectionOrchestrator:
     """
@@ -35,21 +211,31 @@ class DataCollectionOrchestrator:
         self.load_config()
         
         # Initialize collectors
+        self.social_index = open_social_index(self.config)
         self.polymarket_collector = PolymarketCollector(
             output_dir=self.config['polymarket']['output_dir']
         )
         
-        self.reddit_collector = RedditCollector(
-            output_dir=self.config['reddit']['output_dir'],
-            pushshift_dump_dir=self.config['reddit'].get('pushshift_dump_dir'),
-            praw_config=self.config['reddit'].get('praw') if self.config['reddit'].get('praw', {}).get('client_id') else None
-        )
+        self.reddit_collector = build_collector(self.config, 'reddit', self.social_index)
+        self.twitter_collector = build_collector(self.config, 'twitter', self.social_index)
         
-        self.twitter_collector = TwitterCollector(
-            output_dir=self.config['twitter']['output_dir'],
-            dataset_dir=self.config['twitter'].get('dataset_dir'),
-            api_config=self.config['twitter'].get('api') if self.config['twitter'].get('api', {}).get('consumer_key') else None
-        )
+        # Step outputs keyed by a fingerprint of their inputs (see pipeline_cache.py)
+        cache_dir = self.config.get('collection', {}).get('cache_dir')
+        self.step_cache = StepCache(cache_dir) if cache_dir else None
+    
+    def collector(self, source: str):
+        return self.reddit_collector if source == 'reddit' else self.twitter_collector
+    
+    def source_fingerprint(self, source: str, files: Optional[List[str]]) -> str:
+        """Fingerprint of everything besides the market itself that a source's results depend on"""
+        inputs = list(files or [])
+        if self.collector(source).shard_dir:
+            inputs.append(shard_manifest_path(self.collector(source).shard_dir))
+        if self.social_index is not None:
+            inputs.append(self.social_index.path)
+        return fingerprint(self.config[source],
+                           self.config.get('collection', {}).get('keyword_word_boundary', False),
+                           file_fingerprint(inputs))
     
     def load_config(self):
         """Load configuration from JSON file"""
@@ -62,10 +248,15 @@ class DataCollectionOrchestrator:
         with open(self.config_path, 'r') as f:
             self.config = json.load(f)
     
-    def step1_collect_polymarket_markets(self, max_markets: Optional[int] = None) -> pd.DataFrame:
+    def step1_collect_polymarket_markets(self, max_markets: Optional[int] = None,
+                                         force: bool = False) -> pd.DataFrame:
         """
         Step 1: Collect Polymarket markets
         
+        Skipped (markets reloaded from disk) when the polymarket config and
+        max_markets match the last completed run and its outputs still exist,
+        unless force is set.
+        
         Returns:
             DataFrame with market information and query sets
         """
@@ -74,18 +265,33 @@ class DataCollectionOrchestrator:
         print("=" * 60)
         
         max_markets = max_markets or self.config['polymarket'].get('max_markets')
-        markets_df = self.polymarket_collector.collect_all_markets(
-            max_markets=max_markets,
-            save_raw=True,
-            save_processed=True
-        )
+        output_dir = Path(self.config['polymarket']['output_dir'])
+        outputs = [output_dir / MARKETS_FILE, output_dir / QUERY_SETS_FILE]
+        key = fingerprint(self.config['polymarket'], max_markets)
+        
+        if self.step_cache is not None and not force and self.step_cache.is_fresh('step1', key):
+            # Empty cells stay '' (as in a fresh run) instead of NaN, which is truthy
+            markets_df = pd.read_csv(outputs[0], dtype={'market_id': str}, keep_default_na=False)
+            print(f"\n✓ Inputs unchanged – loaded {len(markets_df)} markets from {outputs[0]}")
+            return markets_df
+        
+        with METRICS.stage('step1.markets') as st:
+            markets_df = self.polymarket_collector.collect_all_markets(
+                max_markets=max_markets,
+                save_raw=True,
+                save_processed=True
+            )
+            st.rows = len(markets_df)
+            st.bytes_written = sum(p.stat().st_size for p in outputs if p.exists())
         
         print(f"\n✓ Collected {len(markets_df)} markets")
+        if self.step_cache is not None and all(p.exists() for p in outputs):
+            self.step_cache.record('step1', key, outputs)
         return markets_df
     
     def step2_load_query_sets(self) -> List[Dict]:
         """Load query sets from Polymarket collection"""
-        query_sets_path = Path(self.config['polymarket']['output_dir']) / "query_sets.json"
+        query_sets_path = Path(self.config['polymarket']['output_dir']) / QUERY_SETS_FILE
         
         if not query_sets_path.exists():
             raise FileNotFoundError(
@@ -103,7 +309,10 @@ class DataCollectionOrchestrator:
                                    query_sets: List[Dict],
                                    markets_to_process: Optional[List[str]] = None,
                                    reddit_enabled: bool = True,
-                                   twitter_enabled: bool = True) -> Dict:
+                                   twitter_enabled: bool = True,
+                                   batch: Optional[bool] = None,
+                                   workers: Optional[int] = None,
+                                   force: bool = False) -> Dict:
         """
         Step 3: Collect social media data for each market
         
@@ -113,6 +322,16 @@ class DataCollectionOrchestrator:
             markets_to_process: List of market IDs to process (None = all)
             reddit_enabled: Whether to collect Reddit data
             twitter_enabled: Whether to collect Twitter data
+            batch: Scan each dump/dataset file once for all markets instead of
+                once per market (None = config 'collection.batch_scan')
+            workers: Processes per source for per-market collection; > 1
+                collects markets in parallel, one pool per source (None =
+                config 'collection.workers')
+            force: Re-collect markets already completed with unchanged inputs
+        
+        With collection.cache_dir set, each market/source completion is logged
+        with a fingerprint of its query set, window, source config and input
+        files; reruns skip the ones whose fingerprint is unchanged.
         """
         print("\n" + "=" * 60)
         print("STEP 3: Collecting Social Media Data")
@@ -126,7 +345,49 @@ class DataCollectionOrchestrator:
             markets_df = markets_df[markets_df['market_id'].isin(markets_to_process)]
         
         collection_config = self.config['collection']
-        results = {'markets_processed': 0, 'reddit_posts': 0, 'twitter_tweets': 0}
+        results = {'markets_processed': 0, 'markets_cached': 0, 'reddit_posts': 0, 'twitter_tweets': 0}
+        
+        if batch is None:
+            batch = collection_config.get('batch_scan', False)
+        subreddits = self.config['reddit'].get('preferred_subreddits', [])
+        pushshift_files = self.config['reddit'].get('pushshift_files') or None
+        dataset_files = self.config['twitter'].get('dataset_files') or None
+        
+        # Batch mode only applies to file scans; index queries and PRAW/API stay per market
+        scan_files = self.social_index is None
+        batch_reddit = (batch and reddit_enabled and scan_files
+                        and bool(pushshift_files or self.reddit_collector.shard_dir))
+        batch_twitter = (batch and twitter_enabled and scan_files
+                         and bool(dataset_files or self.twitter_collector.shard_dir))
+        batched = {'reddit': batch_reddit, 'twitter': batch_twitter}
+        batch_markets: Dict[str, List[Dict]] = {'reddit': [], 'twitter': []}
+        enabled = [s for s, on in (('reddit', reddit_enabled), ('twitter', twitter_enabled)) if on]
+        
+        # Per-market checkpoints
+        manifest = None
+        if self.step_cache is not None:
+            manifest = MarketManifest(self.step_cache.cache_dir / MARKETS_MANIFEST_FILE)
+        source_keys = {'reddit': self.source_fingerprint('reddit', pushshift_files),
+                       'twitter': self.source_fingerprint('twitter', dataset_files)}
+        market_keys: Dict[Tuple[str, str], str] = {}
+        
+        def record(source: str, market_id: str, rows: Optional[int]):
+            if manifest is not None:
+                manifest.record(market_id, source, market_keys[(source, market_id)], rows)
+        
+        if workers is None:
+            workers = collection_config.get('workers', 1)
+        pools: Dict[str, SourcePool] = {}
+        if workers > 1:
+            for source in enabled:
+                if not batched[source]:
+                    pools[source] = SourcePool(
+                        self.config, source, workers,
+                        on_result=lambda job, rows, source=source: record(source, job['market_id'], rows),
+                        timestamps=self.collector(source).timestamps,
+                    )
+            if pools:
+                print(f"Collecting {', '.join(pools)} with {workers} workers per source")
         
         for idx, market_row in markets_df.iterrows():
             market_id = market_row['market_id']
@@ -144,12 +405,12 @@ class DataCollectionOrchestrator:
             created_at_str = market_row.get('created_at', '')
             
             try:
-                if end_date_str:
+                if pd.notna(end_date_str) and end_date_str != '':
                     end_date = pd.to_datetime(end_date_str)
                 else:
                     end_date = datetime.now()
                 
-                if created_at_str:
+                if pd.notna(created_at_str) and created_at_str != '':
                     created_at = pd.to_datetime(created_at_str)
                 else:
                     created_at = end_date - timedelta(days=30)
@@ -167,55 +428,102 @@ class DataCollectionOrchestrator:
                 print(f"  ⚠ Error parsing dates: {e}")
                 continue
             
+            # Skip sources already collected with the same inputs
+            todo = []
+            for source in enabled:
+                key = fingerprint(source_keys[source], market_id, query_set, start_date, collection_end_date)
+                market_keys[(source, market_id)] = key
+                if manifest is None or force or not manifest.is_done(market_id, source, key):
+                    todo.append(source)
+            if enabled and not todo:
+                print("  ✓ Unchanged since last run – skipped")
+                results['markets_cached'] += 1
+                continue
+            
+            for source in todo:
+                if batched[source]:
+                    batch_markets[source].append({
+                        'market_id': market_id,
+                        'query_set': query_set,
+                        'start_date': start_date,
+                        'end_date': collection_end_date,
+                    })
+            
+            jobs = {}
+            
             # Collect Reddit data
-            if reddit_enabled:
-                try:
-                    subreddits = self.config['reddit'].get('preferred_subreddits', [])
-                    pushshift_files = None  # User should specify these in config
-                    
-                    reddit_df = self.reddit_collector.collect_for_market(
-                        market_id=market_id,
-                        query_set=query_set,
-                        start_date=start_date,
-                        end_date=collection_end_date,
-                        subreddits=subreddits,
-                        pushshift_files=pushshift_files
-                    )
-                    
-                    if not reddit_df.empty:
-                        results['reddit_posts'] += len(reddit_df)
-                        print(f"  ✓ Collected {len(reddit_df)} Reddit posts")
-                
-                except Exception as e:
-                    print(f"  ⚠ Error collecting Reddit data: {e}")
+            if 'reddit' in todo and not batch_reddit:
+                jobs['reddit'] = {
+                    'market_id': market_id,
+                    'query_set': query_set,
+                    'start_date': start_date,
+                    'end_date': collection_end_date,
+                    'subreddits': subreddits,
+                    'pushshift_files': pushshift_files,
+                }
             
             # Collect Twitter data
-            if twitter_enabled:
-                try:
-                    dataset_files = None  # User should specify these in config
-                    
-                    twitter_df = self.twitter_collector.collect_for_market(
-                        market_id=market_id,
-                        query_set=query_set,
-                        start_date=start_date,
-                        end_date=collection_end_date,
-                        dataset_files=dataset_files
-                    )
-                    
-                    if not twitter_df.empty:
-                        results['twitter_tweets'] += len(twitter_df)
-                        print(f"  ✓ Collected {len(twitter_df)} Twitter tweets")
-                
-                except Exception as e:
-                    print(f"  ⚠ Error collecting Twitter data: {e}")
+            if 'twitter' in todo and not batch_twitter:
+                jobs['twitter'] = {
+                    'market_id': market_id,
+                    'query_set': query_set,
+                    'start_date': start_date,
+                    'end_date': collection_end_date,
+                    'dataset_files': dataset_files,
+                }
+            
+            for source, job in jobs.items():
+                if source in pools:
+                    pools[source].submit(job)
+                else:
+                    rows = collect_market(self.collector(source), source, job)
+                    results[SOURCES[source][2]] += rows or 0
+                    record(source, market_id, rows)
             
             results['markets_processed'] += 1
         
+        drain_pools(pools.values())
+        for source, pool in pools.items():
+            results[SOURCES[source][2]] += pool.close()
+        
+        # Batch mode: one pass over each file routes posts to every market
+        batch_kwargs = {'reddit': {'pushshift_files': pushshift_files, 'subreddits': subreddits},
+                        'twitter': {'dataset_files': dataset_files}}
+        for source, markets in batch_markets.items():
+            if not markets:
+                continue
+            try:
+                with METRICS.stage(f"{source}.batch") as st:
+                    frames = self.collector(source).collect_for_markets(markets=markets, **batch_kwargs[source])
+                    st.rows = sum(len(df) for df in frames.values())
+            except Exception as e:
+                print(f"  ⚠ Error collecting {SOURCES[source][0]} data: {e}")
+                METRICS.count(f"{source}_market_errors", len(markets))
+                frames = {}
+            for m in markets:
+                df = frames.get(m['market_id'])
+                rows = len(df) if df is not None else None
+                results[SOURCES[source][2]] += rows or 0
+                record(source, m['market_id'], rows)
+        
+        if manifest is not None:
+            manifest.close()
+        
+        METRICS.count('markets_processed', results['markets_processed'])
+        METRICS.count('markets_cached', results['markets_cached'])
+        for timestamps in (self.reddit_collector.timestamps, self.twitter_collector.timestamps):
+            METRICS.count(timestamps.name.replace(' ', '_') + '_unparseable', timestamps.unparseable)
+        
         print("\n" + "=" * 60)
         print("Collection Summary:")
         print(f"  Markets processed: {results['markets_processed']}")
+        if results['markets_cached']:
+            print(f"  Markets unchanged (skipped): {results['markets_cached']}")
         print(f"  Reddit posts: {results['reddit_posts']}")
         print(f"  Twitter tweets: {results['twitter_tweets']}")
+        for timestamps in (self.reddit_collector.timestamps, self.twitter_collector.timestamps):
+            if timestamps.unparseable:
+                print(f"  ⚠ {timestamps.report()}")
         print("=" * 60)
         
         return results
@@ -224,31 +532,56 @@ class DataCollectionOrchestrator:
                          max_markets: Optional[int] = None,
                          markets_to_process: Optional[List[str]] = None,
                          reddit_enabled: bool = True,
-                         twitter_enabled: bool = True):
+                         twitter_enabled: bool = True,
+                         batch: Optional[bool] = None,
+                         workers: Optional[int] = None,
+                         force: bool = False):
         """
         Run the complete data collection pipeline
+        
+        With collection.cache_dir set, unchanged steps and markets are skipped
+        (force re-runs everything).
         """
         print("\n" + "=" * 60)
         print("POLYMARKET SOCIAL SIGNALS - DATA COLLECTION PIPELINE")
         print("=" * 60)
         
         # Step 1: Collect Polymarket markets
-        markets_df = self.step1_collect_polymarket_markets(max_markets=max_markets)
+        markets_df = self.step1_collect_polymarket_markets(max_markets=max_markets, force=force)
         
         # Step 2: Load query sets
         query_sets = self.step2_load_query_sets()
         
         # Step 3: Collect social media data
-        results = self.step3_collect_social_media(
-            markets_df=markets_df,
-            query_sets=query_sets,
-            markets_to_process=markets_to_process,
-            reddit_enabled=reddit_enabled,
-            twitter_enabled=twitter_enabled
-        )
+        with METRICS.stage('step3.social') as st:
+            results = self.step3_collect_social_media(
+                markets_df=markets_df,
+                query_sets=query_sets,
+                markets_to_process=markets_to_process,
+                reddit_enabled=reddit_enabled,
+                twitter_enabled=twitter_enabled,
+                batch=batch,
+                workers=workers,
+                force=force
+            )
+            st.rows = results['reddit_posts'] + results['twitter_tweets']
         
         print("\n✓ Pipeline complete!")
+        self.write_metrics()
         return results
+    
+    def write_metrics(self, name: str = 'orchestrate_collection'):
+        """
+        Print per-stage metrics and, with collection.metrics_dir set, export
+        them as a JSON run report and Prometheus textfile (see metrics.py)
+        """
+        print("\nRun metrics:")
+        for line in METRICS.summary_lines():
+            print(f"  {line}")
+        metrics_dir = self.config.get('collection', {}).get('metrics_dir')
+        if metrics_dir:
+            json_path, prom_path = METRICS.export(metrics_dir, name)
+            print(f"  Metrics written to {json_path} and {prom_path}")
 
 def main():
     parser = argparse.ArgumentParser(description='Data Collection Pipeline')
@@ -260,6 +593,12 @@ def main():
                         help='Skip Reddit collection')
     parser.add_argument('--no-twitter', action='store_true',
                         help='Skip Twitter collection')
+    parser.add_argument('--batch', action='store_true', default=None,
+                        help='Scan each dump/dataset file once for all markets')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes per source for per-market collection (default: config collection.workers)')
+    parser.add_argument('--force', action='store_true',
+                        help='Ignore cached steps and completed markets')
     
     args = parser.parse_args()
     
@@ -268,7 +607,10 @@ def main():
     orchestrator.run_full_pipeline(
         max_markets=args.max_markets,
         reddit_enabled=not args.no_reddit,
-        twitter_enabled=not args.no_twitter
+        twitter_enabled=not args.no_twitter,
+        batch=args.batch,
+        workers=args.workers,
+        force=args.force
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+pipeline_cache.py
+─────────────────
+Content-addressed caching for the collection pipeline.
+
+StepCache keeps, per pipeline step, a fingerprint of the step's inputs and
+config plus the files it wrote: a step whose fingerprint is unchanged and
+whose outputs still exist can be skipped. MarketManifest is an append-only
+JSONL log of per-market, per-source completions for step 3, so a rerun only
+collects markets that are new, whose query set / window / inputs changed,
+or that failed last time.
+
+Input files are fingerprinted by path, size and mtime (not content), which
+is enough to notice a replaced or re-downloaded dump without reading it.
+
+Usage:
+  from pipeline_cache import MarketManifest, StepCache, fingerprint
+
+  cache = StepCache("data/cache")
+  key = fingerprint(config["polymarket"], max_markets)
+  if not cache.is_fresh("step1", key):
+      ...
+      cache.record("step1", key, [markets_path, query_sets_path])
+
+  manifest = MarketManifest("data/cache/step3_markets.jsonl")
+  if not manifest.is_done(market_id, "reddit", market_key):
+      ...
+      manifest.record(market_id, "reddit", market_key, rows)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+PathLike = Union[str, Path]
+
+STEPS_FILE = "steps.json"
+MARKETS_MANIFEST_FILE = "step3_markets.jsonl"
+
+
+def fingerprint(*parts: Any) -> str:
+    """sha256 of the parts as canonical JSON (dict keys sorted, other objects via str())."""
+    blob = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(paths: Iterable[PathLike]) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    """(resolved path, size, mtime_ns) per file; size/mtime are None for missing files."""
+    out = []
+    for path in paths:
+        p = Path(path).resolve()
+        try:
+            st = p.stat()
+        except OSError:
+            out.append((str(p), None, None))
+            continue
+        out.append((str(p), st.st_size, st.st_mtime_ns))
+    return out
+
+
+def _now() -> str:
+    return datetime.now(tz=timezone.utc).isoformat()
+
+
+def _atomic_write_json(path: Path, obj: Any) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class StepCache:
+    """Fingerprint + outputs of each completed pipeline step, in <cache_dir>/steps.json."""
+
+    def __init__(self, cache_dir: PathLike) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.cache_dir / STEPS_FILE
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                self.steps = json.load(f)
+
+    def is_fresh(self, step: str, key: str) -> bool:
+        """True if step last completed with this key and all its outputs still exist."""
+        entry = self.steps.get(step)
+        return (entry is not None and entry["key"] == key
+                and all(Path(p).exists() for p in entry["outputs"]))
+
+    def record(self, step: str, key: str, outputs: List[PathLike]) -> None:
+        self.steps[step] = {"key": key, "outputs": [str(p) for p in outputs], "completed_at": _now()}
+        _atomic_write_json(self.path, self.steps)
+
+
+class MarketManifest:
+    """
+    Append-only log of (market_id, source) completions; the last line for a
+    pair wins. A torn last line (crash mid-write) is ignored on load, and the
+    log is compacted to one line per pair when superseded lines pile up.
+    """
+
+    def __init__(self, path: PathLike) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        n_lines = 0
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    n_lines += 1
+                    self.entries[(str(entry["market_id"]), entry["source"])] = entry
+        if n_lines > 2 * len(self.entries) + 100:
+            self._compact()
+        self._f = self.path.open("a", encoding="utf-8")
+
+    def _compact(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def is_done(self, market_id: str, source: str, key: str) -> bool:
+        """True if this market/source last completed successfully with the same key."""
+        entry = self.entries.get((str(market_id), source))
+        return entry is not None and entry["status"] == "ok" and entry["key"] == key
+
+    def record(self, market_id: str, source: str, key: str, rows: Optional[int]) -> None:
+        """Log a completion; rows=None marks the market/source as failed (retried next run)."""
+        entry = {
+            "market_id": str(market_id),
+            "source": source,
+            "key": key,
+            "status": "ok" if rows is not None else "failed",
+            "rows": rows,
+            "completed_at": _now(),
+        }
+        self._f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self.entries[(entry["market_id"], source)] = entry
+
+    def close(self) -> None:
+        self._f.close()
@@ -0,0 +1,698 @@
+#!/usr/bin/env python3
+"""
+price_store.py
+──────────────
+Helpers shared by the price-history fetchers for working with stored
+candles.
+
+Incremental refresh: a small JSON state file maps token_id -> last stored
+candle timestamp, so a refresh asks /prices-history only for the missing
+window (startTs/endTs) and appends the new candles as delta rows with the
+usual row shape. Readers that group rows by token_id (both notebooks do)
+merge the deltas without any rewrite of untouched tokens.
+
+Columnar store: a directory of Parquet part files with flat
+(market_id, condition_id, token_id, timestamp, price) columns, each part
+sorted by token_id then timestamp. Fetchers append parts through
+ColumnarPriceWriter; read_columnar_prices loads straight into pandas.
+Requires pyarrow (pip install pyarrow).
+
+Series file: one binary file holding every token's int64 timestamps followed
+by every token's float32 prices, plus a JSON index token_id -> (offset,
+length). SeriesIndex memory-maps it, so get_series(token_id) returns
+zero-copy NumPy views and reads only that token's pages.
+
+Resume manifest: an append-only sidecar (<stem>.manifest.jsonl) with one
+(token_id, offset, length, n_candles, max_ts, fetched_at) line per row of a
+prices JSONL file. ManifestJsonlWriter group-commits rows (data fsync, then
+manifest fsync) and recover_manifest truncates any torn or uncommitted
+tail, so resume reads the small manifest instead of every history array.
+The last-candle state is caught up with the manifest's max_ts on load, so
+rows committed after its last save are not fetched again.
+
+Usage:
+  python data/price_store.py to-columnar data/polymarket/prices_history.jsonl data/polymarket/prices_history.parquet
+  python data/price_store.py to-series data/polymarket/prices_history.jsonl data/polymarket/prices_history
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+PathLike = Union[str, Path]
+
+
+def last_ts_path(prices_path: PathLike) -> Path:
+    """State file kept next to a prices file: prices_history.jsonl -> prices_history.last_ts.json"""
+    p = Path(prices_path)
+    return p.with_name(f"{p.stem}.last_ts.json")
+
+
+def load_last_timestamps(path: PathLike) -> Dict[str, int]:
+    p = Path(path)
+    if not p.exists():
+        return {}
+    with p.open("r", encoding="utf-8") as f:
+        return {str(k): int(v) for k, v in json.load(f).items()}
+
+
+def save_last_timestamps(path: PathLike, state: Dict[str, int]) -> None:
+    """Atomically replace the state file so a crash never leaves it half-written."""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(p.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
+
+
+def _point_ts(point: Any) -> Optional[int]:
+    if isinstance(point, dict):
+        t = point.get("t")
+    elif isinstance(point, (list, tuple)) and point:
+        t = point[0]
+    else:
+        return None
+    try:
+        return int(t)
+    except (TypeError, ValueError):
+        return None
+
+
+def scan_last_timestamps(prices_path: PathLike) -> Dict[str, int]:
+    """
+    Rebuild the state from an existing prices file (JSONL with `history`
+    lists, or flat CSV with a `timestamp` column). Only needed once, when a
+    store predates its state file.
+    """
+    p = Path(prices_path)
+    state: Dict[str, int] = {}
+    if not p.exists():
+        return state
+
+    def update(token_id: Any, ts: Optional[int]) -> None:
+        if token_id is None or ts is None:
+            return
+        key = str(token_id)
+        if ts > state.get(key, -1):
+            state[key] = ts
+
+    with p.open("r", encoding="utf-8", newline="") as f:
+        if p.suffix == ".csv":
+            for row in csv.DictReader(f):
+                update(row.get("token_id"), _point_ts([row.get("timestamp")]))
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                for point in row.get("history") or []:
+                    update(row.get("token_id"), _point_ts(point))
+    return state
+
+
+def fold_manifest_timestamps(state: Dict[str, int], entries: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Raise the state to every committed row's newest candle (manifest
+    max_ts). The state file is only saved now and then, so after a crash it
+    can lag rows the manifest already committed; folding them in keeps a
+    rerun from fetching and appending those candles again.
+    """
+    for entry in entries:
+        ts = entry.get("max_ts")
+        if ts is not None and ts > state.get(entry["token_id"], -1):
+            state[entry["token_id"]] = int(ts)
+    return state
+
+
+def load_or_scan_last_timestamps(prices_path: PathLike, entries: Optional[Iterable[Dict[str, Any]]] = None) -> Dict[str, int]:
+    """The saved state (caught up with the committed manifest entries, when given), or a scan of the prices file."""
+    state_path = last_ts_path(prices_path)
+    if state_path.exists():
+        return fold_manifest_timestamps(load_last_timestamps(state_path), entries or [])
+    return scan_last_timestamps(prices_path)
+
+
+def history_window_params(
+    token_id: str,
+    interval: str,
+    fidelity_min: int,
+    last_ts: Optional[int] = None,
+    now: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Query params for /prices-history: the full `interval` for tokens not yet in
+    the store, otherwise only the window after the last stored candle.
+    startTs/endTs and interval are mutually exclusive on the CLOB API.
+    """
+    if last_ts is None:
+        return {"market": token_id, "interval": interval, "fidelity": int(fidelity_min)}
+    end_ts = int(now if now is not None else time.time())
+    return {"market": token_id, "startTs": int(last_ts) + 1, "endTs": end_ts, "fidelity": int(fidelity_min)}
+
+
+def new_candles(history: List[Any], last_ts: Optional[int]) -> List[Any]:
+    """Drop candles at or before last_ts (the API may echo the boundary candle)."""
+    if last_ts is None:
+        return list(history)
+    return [pt for pt in history if (ts := _point_ts(pt)) is not None and ts > last_ts]
+
+
+def max_timestamp(history: List[Any], default: Optional[int] = None) -> Optional[int]:
+    stamps = [ts for pt in history if (ts := _point_ts(pt)) is not None]
+    return max(stamps) if stamps else default
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Columnar store
+# ─────────────────────────────────────────────────────────────────────────────
+
+DEFAULT_ROW_GROUP_POINTS = 1_000_000
+
+
+def _require_pyarrow() -> None:
+    if not PYARROW_AVAILABLE:
+        raise ImportError("The columnar price store needs pyarrow. Install with: pip install pyarrow")
+
+
+def _price_schema() -> "pa.Schema":
+    return pa.schema(
+        [
+            ("market_id", pa.string()),
+            ("condition_id", pa.string()),
+            ("token_id", pa.string()),
+            ("timestamp", pa.int64()),
+            ("price", pa.float64()),
+        ]
+    )
+
+
+class ColumnarPriceWriter:
+    """
+    Buffers candles and flushes them as sorted Parquet part files.
+
+    Each flush writes one part file (one row group, sorted by token_id then
+    timestamp) to a dot-prefixed temp name and renames it into place, so a
+    crash never leaves a truncated part behind; at most the unflushed buffer
+    is lost. Temp files left by a crash are removed when the next writer opens.
+    """
+
+    def __init__(self, path: PathLike, row_group_points: int = DEFAULT_ROW_GROUP_POINTS) -> None:
+        _require_pyarrow()
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        for stale in _temp_parts(self.path):
+            stale.unlink()
+        self.row_group_points = row_group_points
+        self._run_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self._part = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._cols: Dict[str, List[Any]] = {name: [] for name in _price_schema().names}
+
+    def add(
+        self,
+        token_id: str,
+        history: Iterable[Any],
+        market_id: Optional[str] = None,
+        condition_id: Optional[str] = None,
+    ) -> None:
+        cols = self._cols
+        for point in history:
+            ts = _point_ts(point)
+            price = point.get("p") if isinstance(point, dict) else (point[1] if len(point) > 1 else None)
+            if ts is None or price is None:
+                continue
+            cols["market_id"].append(None if market_id is None else str(market_id))
+            cols["condition_id"].append(None if condition_id is None else str(condition_id))
+            cols["token_id"].append(str(token_id))
+            cols["timestamp"].append(ts)
+            cols["price"].append(float(price))
+        if len(cols["timestamp"]) >= self.row_group_points:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._cols["timestamp"]:
+            return
+        table = pa.table(self._cols, schema=_price_schema())
+        table = table.sort_by([("token_id", "ascending"), ("timestamp", "ascending")])
+        final = self.path / f"part-{self._run_id}-{self._part:05d}.parquet"
+        # The dot prefix keeps a half-written temp out of the dataset (see _part_files)
+        tmp = final.with_name(f".{final.name}.tmp")
+        pq.write_table(table, tmp, row_group_size=table.num_rows, use_dictionary=["market_id", "condition_id", "token_id"])
+        os.replace(tmp, final)
+        self._part += 1
+        self._reset()
+
+    def close(self) -> None:
+        self.flush()
+
+
+def _part_files(path: Path) -> List[str]:
+    """Committed part files only, so a crashed writer's temp file is never read as Parquet."""
+    return sorted(str(part) for part in path.glob("part-*.parquet")) if path.is_dir() else []
+
+
+def _temp_parts(path: Path) -> List[Path]:
+    """Temp files left by interrupted flushes."""
+    return list(path.glob(".part-*.parquet.tmp"))
+
+
+def _price_dataset(path: PathLike) -> "ds.Dataset":
+    return ds.dataset(_part_files(Path(path)), format="parquet", schema=_price_schema())
+
+
+def reset_columnar(path: PathLike) -> None:
+    """Remove existing part files, e.g. when the row file it mirrors is overwritten."""
+    p = Path(path)
+    if p.is_dir():
+        for part in p.glob("part-*.parquet"):
+            part.unlink()
+        for part in _temp_parts(p):
+            part.unlink()
+
+
+def columnar_last_timestamps(path: PathLike) -> Dict[str, int]:
+    """Newest stored candle per token in a columnar store (reads only token_id and timestamp)."""
+    _require_pyarrow()
+    p = Path(path)
+    if not _part_files(p):
+        return {}
+    table = _price_dataset(p).to_table(columns=["token_id", "timestamp"])
+    last = table.group_by("token_id").aggregate([("timestamp", "max")])
+    return dict(zip(last.column("token_id").to_pylist(), last.column("timestamp_max").to_pylist()))
+
+
+def read_columnar_prices(
+    path: PathLike,
+    token_ids: Optional[Iterable[str]] = None,
+    columns: Optional[List[str]] = None,
+) -> "Any":
+    """
+    Load the columnar store into a pandas DataFrame sorted by token_id, timestamp.
+
+    token_ids restricts the read to those tokens (pushed down to Parquet
+    row-group statistics, so unrelated parts are skipped).
+    """
+    _require_pyarrow()
+    dataset = _price_dataset(path)
+    flt = None
+    if token_ids is not None:
+        flt = ds.field("token_id").isin([str(t) for t in token_ids])
+    table = dataset.to_table(columns=columns, filter=flt)
+    if "token_id" in table.column_names and "timestamp" in table.column_names:
+        table = table.sort_by([("token_id", "ascending"), ("timestamp", "ascending")])
+    return table.to_pandas()
+
+
+def iter_token_histories(prices_path: PathLike) -> Iterator[Tuple[Optional[str], Optional[str], str, List[Any]]]:
+    """
+    Yield (market_id, condition_id, token_id, history) from a prices JSONL file,
+    or from a flat prices CSV (consecutive rows of the same token are grouped).
+    """
+    p = Path(prices_path)
+    with p.open("r", encoding="utf-8", newline="") as f:
+        if p.suffix == ".csv":
+            key: Optional[Tuple[Any, Any, str]] = None
+            points: List[Any] = []
+            for row in csv.DictReader(f):
+                row_key = (row.get("market_id") or None, row.get("conditionId") or None, str(row.get("token_id")))
+                if key is not None and row_key != key:
+                    yield key[0], key[1], key[2], points
+                    points = []
+                key = row_key
+                points.append({"t": row.get("timestamp"), "p": row.get("price")})
+            if key is not None:
+                yield key[0], key[1], key[2], points
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield (
+                row.get("market_id"),
+                row.get("conditionId") or row.get("condition_id"),
+                str(row.get("token_id")),
+                row.get("history") or [],
+            )
+
+
+def append_to_columnar(
+    prices_path: PathLike,
+    writer: ColumnarPriceWriter,
+    only_tokens: Optional[Set[str]] = None,
+) -> int:
+    """Copy token histories from a JSONL/CSV prices file into a columnar writer. Returns tokens copied."""
+    copied = 0
+    for market_id, condition_id, token_id, history in iter_token_histories(prices_path):
+        if only_tokens is not None and token_id not in only_tokens:
+            continue
+        writer.add(token_id, history, market_id=market_id, condition_id=condition_id)
+        copied += 1
+    return copied
+
+
+def backfill_columnar(prices_path: PathLike, writer: ColumnarPriceWriter, tokens_in_rows: Set[str]) -> int:
+    """
+    After a crash, copy the candles of tokens_in_rows that reached the row
+    file but not the columnar store (their writer buffer was never flushed):
+    every candle newer than the token's last stored one, so delta rows of a
+    token already in the store are caught up too. Returns tokens copied.
+    """
+    if not tokens_in_rows or not Path(prices_path).exists():
+        return 0
+    stored = columnar_last_timestamps(writer.path)
+    copied: Set[str] = set()
+    for market_id, condition_id, token_id, history in iter_token_histories(prices_path):
+        if token_id not in tokens_in_rows:
+            continue
+        newer = new_candles(history, stored.get(token_id))
+        if newer:
+            writer.add(token_id, newer, market_id=market_id, condition_id=condition_id)
+            copied.add(token_id)
+    return len(copied)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Memory-mapped series file
+# ─────────────────────────────────────────────────────────────────────────────
+
+def series_paths(prefix: PathLike) -> Tuple[Path, Path]:
+    """(<prefix>.series.bin, <prefix>.series.idx.json)"""
+    p = Path(prefix)
+    return p.with_name(p.name + ".series.bin"), p.with_name(p.name + ".series.idx.json")
+
+
+def _require_numpy() -> None:
+    if not NUMPY_AVAILABLE:
+        raise ImportError("The series file needs numpy. Install with: pip install numpy")
+
+
+def _iter_points(source: PathLike) -> Iterator[Tuple[str, List[Tuple[int, float]]]]:
+    """Yield (token_id, [(t, p), ...]) from a JSONL/CSV prices file or a columnar store."""
+    if Path(source).is_dir():
+        df = read_columnar_prices(source, columns=["token_id", "timestamp", "price"])
+        for token_id, g in df.groupby("token_id", sort=False):
+            yield str(token_id), list(zip(g["timestamp"].tolist(), g["price"].tolist()))
+        return
+    for _, _, token_id, history in iter_token_histories(source):
+        points = []
+        for point in history:
+            ts = _point_ts(point)
+            price = point.get("p") if isinstance(point, dict) else (point[1] if len(point) > 1 else None)
+            if ts is None or price is None:
+                continue
+            points.append((ts, float(price)))
+        yield token_id, points
+
+
+def build_series_file(source: PathLike, prefix: PathLike) -> int:
+    """
+    Write the memory-mappable series file for every token in source.
+
+    Two passes over source (count, then fill), so memory stays bounded by the
+    token count rather than the point count; rows of the same token may be
+    scattered (incremental delta rows) and are merged and sorted by timestamp.
+    Returns the number of tokens written.
+    """
+    _require_numpy()
+    counts: Dict[str, int] = {}
+    for token_id, points in _iter_points(source):
+        counts[token_id] = counts.get(token_id, 0) + len(points)
+
+    tokens: Dict[str, List[int]] = {}
+    offset = 0
+    for token_id in sorted(counts):
+        tokens[token_id] = [offset, counts[token_id]]
+        offset += counts[token_id]
+    n_points = offset
+
+    bin_path, idx_path = series_paths(prefix)
+    bin_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_bin = bin_path.with_name(bin_path.name + ".tmp")
+    size = n_points * (np.dtype(np.int64).itemsize + np.dtype(np.float32).itemsize)
+    with open(tmp_bin, "wb") as f:
+        f.truncate(size)
+
+    if n_points:
+        ts_arr = np.memmap(tmp_bin, dtype=np.int64, mode="r+", offset=0, shape=(n_points,))
+        px_arr = np.memmap(tmp_bin, dtype=np.float32, mode="r+", offset=n_points * 8, shape=(n_points,))
+        cursor = {token_id: start for token_id, (start, _) in tokens.items()}
+        for token_id, points in _iter_points(source):
+            if not points:
+                continue
+            start = cursor[token_id]
+            block = np.asarray(points, dtype=np.float64)
+            ts_arr[start : start + len(points)] = block[:, 0].astype(np.int64)
+            px_arr[start : start + len(points)] = block[:, 1].astype(np.float32)
+            cursor[token_id] = start + len(points)
+        for start, length in tokens.values():
+            ts_view = ts_arr[start : start + length]
+            order = np.argsort(ts_view, kind="stable")
+            ts_arr[start : start + length] = ts_view[order]
+            px_arr[start : start + length] = px_arr[start : start + length][order]
+        ts_arr.flush()
+        px_arr.flush()
+        del ts_arr, px_arr
+
+    os.replace(tmp_bin, bin_path)
+    tmp_idx = idx_path.with_name(idx_path.name + ".tmp")
+    with tmp_idx.open("w", encoding="utf-8") as f:
+        json.dump({"n_points": n_points, "tokens": tokens}, f)
+    os.replace(tmp_idx, idx_path)
+    return len(tokens)
+
+
+class SeriesIndex:
+    """
+    Read-only, memory-mapped access to a series file built by build_series_file.
+
+        idx = SeriesIndex("data/polymarket/prices_history")
+        ts, px = idx.get_series(token_id)   # int64 epoch seconds, float32 prices
+    """
+
+    def __init__(self, prefix: PathLike) -> None:
+        _require_numpy()
+        bin_path, idx_path = series_paths(prefix)
+        with idx_path.open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.n_points = int(meta["n_points"])
+        self._index: Dict[str, Tuple[int, int]] = {k: (int(v[0]), int(v[1])) for k, v in meta["tokens"].items()}
+        if self.n_points:
+            self.timestamps = np.memmap(bin_path, dtype=np.int64, mode="r", offset=0, shape=(self.n_points,))
+            self.prices = np.memmap(bin_path, dtype=np.float32, mode="r", offset=self.n_points * 8, shape=(self.n_points,))
+        else:
+            self.timestamps = np.empty(0, dtype=np.int64)
+            self.prices = np.empty(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, token_id: object) -> bool:
+        return str(token_id) in self._index
+
+    def token_ids(self) -> List[str]:
+        return list(self._index)
+
+    def get_series(self, token_id: str) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Zero-copy (timestamps, prices) views for one token; KeyError if unknown."""
+        start, length = self._index[str(token_id)]
+        return self.timestamps[start : start + length], self.prices[start : start + length]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Resume manifest
+# ─────────────────────────────────────────────────────────────────────────────
+
+DEFAULT_FSYNC_EVERY_ROWS = 50
+DEFAULT_FSYNC_EVERY_SEC = 5.0
+DEFAULT_WRITE_BUFFER_BYTES = 1 << 20
+
+
+def manifest_path(prices_path: PathLike) -> Path:
+    """Sidecar kept next to a prices file: prices.jsonl -> prices.manifest.jsonl"""
+    p = Path(prices_path)
+    return p.with_name(f"{p.stem}.manifest.jsonl")
+
+
+def _read_complete_lines(path: Path) -> Iterator[Tuple[int, bytes, Dict[str, Any]]]:
+    """Yield (offset, raw line, parsed) up to the first torn or unparseable line."""
+    offset = 0
+    with path.open("rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            if line.strip():
+                try:
+                    parsed = json.loads(line)
+                except ValueError:
+                    return
+                yield offset, line, parsed
+            offset += len(line)
+
+
+def _manifest_entry(row: Dict[str, Any], offset: int, length: int) -> Dict[str, Any]:
+    return {
+        "token_id": str(row["token_id"]),
+        "offset": offset,
+        "length": length,
+        "n_candles": row.get("n_candles", len(row.get("history") or [])),
+        "max_ts": max_timestamp(row.get("history") or []),
+        "fetched_at": row.get("fetched_at"),
+    }
+
+
+def _write_manifest(path: Path, entries: List[Dict[str, Any]]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def recover_manifest(prices_path: PathLike) -> List[Dict[str, Any]]:
+    """
+    Reconcile a prices JSONL file with its manifest and return the committed
+    entries in file order.
+
+    The data file is truncated to the end of the last committed row, so a
+    torn or uncommitted tail from a crash is refetched instead of being read
+    back half-written. A file without a manifest (written before manifests
+    existed) is scanned once to build one.
+    """
+    data = Path(prices_path)
+    mpath = manifest_path(data)
+    if not data.exists():
+        if mpath.exists():
+            mpath.unlink()
+        return []
+
+    size = data.stat().st_size
+    if mpath.exists():
+        lines = list(_read_complete_lines(mpath))
+        intact = lines[-1][0] + len(lines[-1][1]) if lines else 0
+        # Entries past the end of the data file lost their bytes before they reached disk
+        entries = [e for _, _, e in lines if e["offset"] + e["length"] <= size]
+        rewrite = len(entries) != len(lines) or intact != mpath.stat().st_size
+    else:
+        entries = [_manifest_entry(row, off, len(line)) for off, line, row in _read_complete_lines(data)]
+        rewrite = True
+
+    end = entries[-1]["offset"] + entries[-1]["length"] if entries else 0
+    if size > end:
+        with data.open("r+b") as f:
+            f.truncate(end)
+            os.fsync(f.fileno())
+    if rewrite:
+        _write_manifest(mpath, entries)
+    return entries
+
+
+class ManifestJsonlWriter:
+    """
+    Buffered JSONL appender that records every row in the sidecar manifest.
+
+    Rows are group-committed every `fsync_every_rows` rows or
+    `fsync_every_sec` seconds: the data file is flushed and fsynced first,
+    then the batch's manifest lines are appended and fsynced, so the
+    manifest never points at bytes that are not on disk. Call
+    recover_manifest before opening a writer on an existing file.
+    """
+
+    def __init__(
+        self,
+        path: PathLike,
+        fsync_every_rows: int = DEFAULT_FSYNC_EVERY_ROWS,
+        fsync_every_sec: float = DEFAULT_FSYNC_EVERY_SEC,
+        buffer_bytes: int = DEFAULT_WRITE_BUFFER_BYTES,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync_every_rows = max(1, fsync_every_rows)
+        self.fsync_every_sec = fsync_every_sec
+        self._data = self.path.open("ab", buffering=buffer_bytes)
+        self._manifest = manifest_path(self.path).open("ab")
+        self._offset = self._data.tell()
+        self._pending: List[Dict[str, Any]] = []
+        self._last_commit = time.monotonic()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        self._data.write(line)
+        self._pending.append(_manifest_entry(row, self._offset, len(line)))
+        self._offset += len(line)
+        if (
+            len(self._pending) >= self.fsync_every_rows
+            or time.monotonic() - self._last_commit >= self.fsync_every_sec
+        ):
+            self.commit()
+
+    def commit(self) -> None:
+        if self._pending:
+            self._data.flush()
+            os.fsync(self._data.fileno())
+            self._manifest.write("".join(json.dumps(e) + "\n" for e in self._pending).encode("utf-8"))
+            self._manifest.flush()
+            os.fsync(self._manifest.fileno())
+            self._pending = []
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        self.commit()
+        self._data.close()
+        self._manifest.close()
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.command == "to-columnar":
+        writer = ColumnarPriceWriter(args.output, row_group_points=args.row_group_points)
+        n = append_to_columnar(args.input, writer)
+        writer.close()
+        print(f"[INFO] Wrote {n:,} token histories -> {args.output}", flush=True)
+    elif args.command == "to-series":
+        n = build_series_file(args.input, args.output)
+        print(f"[INFO] Wrote {n:,} token series -> {series_paths(args.output)[0]}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Price store utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("to-columnar", help="Convert a prices JSONL/CSV file into a columnar (Parquet) store")
+    conv.add_argument("input", type=str, help="Prices JSONL or CSV")
+    conv.add_argument("output", type=str, help="Output columnar store directory")
+    conv.add_argument("--row-group-points", type=int, default=DEFAULT_ROW_GROUP_POINTS, help="Candles per part file")
+    series = sub.add_parser("to-series", help="Build a memory-mapped series file with a token index")
+    series.add_argument("input", type=str, help="Prices JSONL/CSV or columnar store directory")
+    series.add_argument("output", type=str, help="Output prefix (writes <prefix>.series.bin and .series.idx.json)")
+    main(parser.parse_args())
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+query_sets.py
+─────────────
+Query sets (primary_queries, hashtags, key_phrases) for Polymarket markets,
+generated for the whole market list in one pass.
+
+  tokens       questions and descriptions are lowercased and tokenized in
+               one batch; tokens are factorized to integer ids so n-grams,
+               term frequencies and document frequencies are array ops
+               (pandas factorize + numpy bincount), not per-market loops.
+  key_phrases  1-2 word n-grams that neither start nor end with a
+               stopword, month or number, ranked by TF-IDF over the
+               current market corpus (question terms weighted
+               QUESTION_WEIGHT x). Terms found in more than MAX_DF_FRAC
+               of the markets are resolution boilerplate and dropped; a
+               phrase inside a better-ranked one ("donald" after "donald
+               trump") is skipped, as is one containing it.
+  entities     runs of capitalized tokens in the question ("Donald Trump",
+               "Bank of England", "ETF"), minus the question word and
+               month/weekday names. They become the primary_queries.
+  hashtags     entities squashed to one word ("DonaldTrump") plus the
+               market's Gamma tag labels.
+
+Results are cached in an append-only JSONL file keyed by a hash of the
+question, description, tags and generator settings: a rerun only tokenizes
+and scores anything when some market is new or changed, and a cached
+market keeps its query set (so step 3's per-market fingerprints stay
+valid) until its text changes or --refresh is given.
+
+Input is a JSONL/JSON list of market records as written by
+collect_polymarket.py (market_id, question, tags) or live_ingest.py (raw
+Gamma records: id, question, description, tags). Repeated market ids keep
+the last record.
+
+Usage:
+  python data/query_sets.py --markets data/polymarket/markets.jsonl --out data/polymarket/query_sets.json
+  python data/query_sets.py --markets data/live/markets.jsonl --out data/live/query_sets.json --refresh
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from metrics import METRICS
+from pipeline_cache import fingerprint
+
+PathLike = Union[str, Path]
+
+GENERATOR_VERSION = 1
+CACHE_FILE = "query_sets_cache.jsonl"
+
+MAX_NGRAM = 2
+MAX_KEY_PHRASES = 10
+MAX_PRIMARY_QUERIES = 3
+MAX_HASHTAGS = 6
+QUESTION_WEIGHT = 3.0
+MAX_DF_FRAC = 0.2
+MIN_DF_CORPUS = 50          # below this many markets document frequencies are too noisy for MAX_DF_FRAC
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each either else few for from further
+had has have having he her here hers him his how i if in into is it its itself just me more most my
+no nor not now of off on once only or other our out over own same she should so some such than that
+the their them then there these they this those through to too under until up upon very via was we
+were what when where which while who whom why will with within would yes you your
+resolve resolves resolved resolution market markets question questions otherwise following
+""".split())
+
+QUESTION_WORDS = frozenset({"will", "who", "which", "what", "when", "where", "how", "is", "are",
+                            "does", "do", "did", "can", "could", "should", "would", "has", "have"})
+
+CALENDAR_WORDS = frozenset("""
+january february march april may june july august september october november december
+jan feb mar apr jun jul aug sep sept oct nov dec
+monday tuesday wednesday thursday friday saturday sunday
+""".split())
+
+ENTITY_CONNECTORS = frozenset({"of", "the", "and", "&", "de", "for"})
+GENERIC_TAGS = frozenset({"all", "featured", "hide from new", "recurring"})
+
+TOKEN_RE = re.compile(r"\$?[a-z0-9]+(?:['.&-][a-z0-9]+)*%?")
+CASED_TOKEN_RE = re.compile(r"\$?[A-Za-z0-9]+(?:['.&-][A-Za-z0-9]+)*%?|&")
+WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def log(msg: str) -> None:
+    print(f"[INFO] {msg}", flush=True)
+
+
+# ── market fields ────────────────────────────────────────────────────────────
+
+def market_id_of(market: Dict[str, Any]) -> Optional[str]:
+    for key in ("market_id", "id", "marketId"):
+        if market.get(key) is not None:
+            return str(market[key])
+    return None
+
+
+def tag_labels(tags: Any) -> List[str]:
+    """Tag labels from Gamma tag dicts, plain strings, or either as a JSON string."""
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except json.JSONDecodeError:
+            tags = [t for t in tags.split(";") if t]
+    if not isinstance(tags, list):
+        return []
+    labels = []
+    for tag in tags:
+        label = (tag.get("label") or tag.get("slug")) if isinstance(tag, dict) else tag
+        if isinstance(label, str) and label.strip() and label.strip().lower() not in GENERIC_TAGS:
+            labels.append(label.strip())
+    return labels
+
+
+def _text(value: Any) -> str:
+    return value if isinstance(value, str) else ""
+
+
+# ── per-market derivation ────────────────────────────────────────────────────
+
+def extract_entities(question: str) -> List[str]:
+    """Runs of capitalized tokens in a question, in order of appearance, case-insensitively unique."""
+    tokens = CASED_TOKEN_RE.findall(question)
+    entities: List[str] = []
+    run: List[str] = []
+
+    def flush() -> None:
+        while run and run[-1].lower() in ENTITY_CONNECTORS:
+            run.pop()
+        if run:
+            entities.append(" ".join(run))
+        run.clear()
+
+    for i, tok in enumerate(tokens):
+        low = tok.lower()
+        possessive = low.endswith("'s")
+        if possessive:
+            tok, low = tok[:-2], low[:-2]
+        cased = tok[0].isupper() or (tok[0] == "$" and len(tok) > 1 and tok[1].isupper())
+        if i == 0 and low in QUESTION_WORDS:
+            continue
+        if cased and low not in CALENDAR_WORDS and not (low in STOPWORDS and not run):
+            run.append(tok.lstrip("$"))  # "$BTC" -> "BTC", which also matches "$BTC"
+            if possessive:  # "Fed's Powell" is two entities
+                flush()
+        elif run and low in ENTITY_CONNECTORS:
+            run.append(tok)
+        else:
+            flush()
+    flush()
+    seen = set()
+    return [e for e in entities if not (e.lower() in seen or seen.add(e.lower()))]
+
+
+def hashtag_for(phrase: str) -> str:
+    """'Donald Trump' -> 'DonaldTrump', '$BTC' -> 'BTC' (no '#': the collectors strip it anyway)."""
+    return "".join(w[:1].upper() + w[1:] for w in WORD_RE.findall(phrase))
+
+
+def derive_hashtags(entities: List[str], tags: List[str], limit: int) -> List[str]:
+    hashtags: List[str] = []
+    seen = set()
+    for phrase in entities + tags:
+        tag = hashtag_for(phrase)
+        if len(tag) >= 2 and tag.lower() not in seen:
+            seen.add(tag.lower())
+            hashtags.append(tag)
+    return hashtags[:limit]
+
+
+def _contains_phrase(longer: str, shorter: str) -> bool:
+    return f" {shorter} " in f" {longer} "
+
+
+# ── batch TF-IDF ─────────────────────────────────────────────────────────────
+
+class _Corpus:
+    """
+    Tokens of all markets as flat arrays: code (factorized token), doc
+    (market row) and segment (question / description of a market, so
+    n-grams never cross from one into the other).
+    """
+
+    def __init__(self, questions: List[str], descriptions: List[str]) -> None:
+        segments = [TOKEN_RE.findall(t.lower()) for pair in zip(questions, descriptions) for t in pair]
+        lengths = np.fromiter((len(s) for s in segments), dtype=np.int64, count=len(segments))
+        flat = np.fromiter((tok for s in segments for tok in s), dtype=object, count=int(lengths.sum()))
+        self.n_docs = len(questions)
+        self.segment = np.repeat(np.arange(len(segments), dtype=np.int64), lengths)
+        self.doc = self.segment // 2
+        self.weight = np.where(self.segment % 2 == 0, QUESTION_WEIGHT, 1.0)
+        self.code, vocab = pd.factorize(flat)
+        self.vocab = np.asarray(vocab, dtype=object)
+        words = pd.Series(self.vocab, dtype=object)
+        # A phrase may not start or end with a stopword, month/weekday or bare number
+        edge_ok = ~(words.isin(STOPWORDS | CALENDAR_WORDS) | words.str.fullmatch(r"\$?[0-9]+(?:[.,][0-9]+)?%?")).to_numpy()
+        self.edge_ok = edge_ok[self.code]
+
+    def ngrams(self, max_n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(term id, position, n, term's first position) for every candidate n-gram occurrence."""
+        n_tok = len(self.code)
+        vocab_size = max(len(self.vocab), 1)
+        key = self.code.astype(np.int64)
+        term_parts, pos_parts, n_parts, first_pos_parts = [], [], [], []
+        offset = 0
+        for n in range(1, max_n + 1):
+            if n > 1:
+                # Chain ids: the (n-1)-gram id at i extended by the token at i+n-1
+                key = key[:-1] * vocab_size + self.code[n - 1:]
+                key, _ = pd.factorize(key)
+                key = key.astype(np.int64)
+            m = n_tok - n + 1
+            if m <= 0:
+                break
+            pos = np.arange(m)
+            valid = (self.segment[:m] == self.segment[n - 1:]) & self.edge_ok[:m] & self.edge_ok[n - 1:]
+            ids, uniques = pd.factorize(key[valid])
+            pos = pos[valid]
+            term_parts.append(ids + offset)
+            pos_parts.append(pos)
+            n_parts.append(np.full(len(ids), n, dtype=np.int64))
+            # factorize numbers terms in order of first appearance
+            first_pos_parts.append(pos[np.unique(ids, return_index=True)[1]])
+            offset += len(uniques)
+        if not term_parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty, empty
+        return (np.concatenate(term_parts), np.concatenate(pos_parts),
+                np.concatenate(n_parts), np.concatenate(first_pos_parts))
+
+    def phrase(self, pos: int, n: int) -> str:
+        return " ".join(self.vocab[self.code[pos:pos + n]])
+
+
+def rank_key_phrases(
+    questions: List[str],
+    descriptions: List[str],
+    wanted: np.ndarray,
+    limit: int = MAX_KEY_PHRASES,
+    max_n: int = MAX_NGRAM,
+) -> Dict[int, List[str]]:
+    """
+    Top TF-IDF phrases for the rows in `wanted`, with document frequencies
+    taken over all rows. Returns {row: phrases}.
+    """
+    corpus = _Corpus(questions, descriptions)
+    term, pos, n_of, first_pos = corpus.ngrams(max_n)
+    n_terms = len(first_pos)
+    if n_terms == 0:
+        return {int(r): [] for r in wanted}
+    term_n = np.empty(n_terms, dtype=np.int64)
+    term_n[term] = n_of
+
+    # Term frequency per (doc, term), question occurrences weighted
+    doc_term = corpus.doc[pos] * n_terms + term
+    pair, pair_keys = pd.factorize(doc_term)
+    tf = np.bincount(pair, weights=corpus.weight[pos])
+    pair_doc = pair_keys // n_terms
+    pair_term = pair_keys % n_terms
+
+    df = np.bincount(pair_term, minlength=n_terms)
+    idf = np.log((1.0 + corpus.n_docs) / (1.0 + df)) + 1.0
+    score = tf * idf[pair_term]
+    keep = np.isin(pair_doc, wanted)
+    if corpus.n_docs >= MIN_DF_CORPUS:
+        keep &= df[pair_term] <= MAX_DF_FRAC * corpus.n_docs
+
+    pair_doc, pair_term, score = pair_doc[keep], pair_term[keep], score[keep]
+    # Best score first; on a tie the longer phrase wins ("donald trump" over "donald")
+    order = np.lexsort((pair_term, -term_n[pair_term], -score, pair_doc))
+    pair_doc, pair_term = pair_doc[order], pair_term[order]
+    # Rank within each doc; only the head of each doc's list is turned into strings
+    starts = np.flatnonzero(np.r_[True, pair_doc[1:] != pair_doc[:-1]])
+    rank = np.arange(len(pair_doc)) - np.repeat(starts, np.diff(np.r_[starts, len(pair_doc)]))
+    head = rank < 3 * limit
+
+    out: Dict[int, List[str]] = {int(r): [] for r in wanted}
+    for d, t in zip(pair_doc[head].tolist(), pair_term[head].tolist()):
+        phrases = out[d]
+        if len(phrases) >= limit:
+            continue
+        p = corpus.phrase(int(first_pos[t]), int(term_n[t]))
+        if not any(_contains_phrase(q, p) or _contains_phrase(p, q) for q in phrases):
+            phrases.append(p)
+    return out
+
+
+# ── cache ────────────────────────────────────────────────────────────────────
+
+class QuerySetCache:
+    """
+    Append-only JSONL of generated query sets keyed by question hash; the
+    last line for a hash wins and a torn last line is ignored on load.
+    """
+
+    def __init__(self, path: PathLike) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        n_lines = 0
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    n_lines += 1
+                    self.entries[entry["question_hash"]] = entry
+        self.n_lines = n_lines
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def extend(self, entries: List[Dict[str, Any]], live_keys: Optional[set] = None) -> None:
+        """
+        Append entries. When live_keys is given and the log holds mostly
+        entries outside it (superseded or for markets no longer listed), it
+        is rewritten with just the live ones.
+        """
+        for entry in entries:
+            self.entries[entry["question_hash"]] = entry
+        if live_keys is not None and self.n_lines + len(entries) > 2 * len(live_keys) + 100:
+            self.entries = {k: v for k, v in self.entries.items() if k in live_keys}
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.n_lines = len(self.entries)
+            return
+        if not entries:
+            return
+        with self.path.open("a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+        self.n_lines += len(entries)
+
+
+# ── generator ────────────────────────────────────────────────────────────────
+
+class QuerySetGenerator:
+    """
+    Builds query sets for a list of markets. With a cache path, markets whose
+    question hash is cached are returned from the cache and only the rest
+    are scored (against document frequencies of the whole list).
+    """
+
+    def __init__(
+        self,
+        cache_path: Optional[PathLike] = None,
+        max_key_phrases: int = MAX_KEY_PHRASES,
+        max_primary_queries: int = MAX_PRIMARY_QUERIES,
+        max_hashtags: int = MAX_HASHTAGS,
+        refresh: bool = False,
+    ) -> None:
+        self.cache = QuerySetCache(cache_path) if cache_path else None
+        self.max_key_phrases = max_key_phrases
+        self.max_primary_queries = max_primary_queries
+        self.max_hashtags = max_hashtags
+        self.refresh = refresh
+        self.settings = fingerprint(GENERATOR_VERSION, MAX_NGRAM, QUESTION_WEIGHT, MAX_DF_FRAC,
+                                    max_key_phrases, max_primary_queries, max_hashtags)
+
+    def question_hash(self, question: str, description: str, tags: List[str]) -> str:
+        return fingerprint(self.settings, question, description, tags)
+
+    def generate(self, markets: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """One query set per market id (last record wins), in first-seen order."""
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for m in markets:
+            mid = market_id_of(m)
+            if mid is not None and _text(m.get("question")).strip():
+                by_id.pop(mid, None)
+                by_id[mid] = m
+        ids = list(by_id)
+        questions = [_text(by_id[i].get("question")).strip() for i in ids]
+        descriptions = [_text(by_id[i].get("description")) for i in ids]
+        tags = [tag_labels(by_id[i].get("tags")) for i in ids]
+        keys = [self.question_hash(q, d, t) for q, d, t in zip(questions, descriptions, tags)]
+
+        with METRICS.stage("query_sets") as st:
+            cached: Dict[int, Dict[str, Any]] = {}
+            if self.cache is not None and not self.refresh:
+                for row, key in enumerate(keys):
+                    entry = self.cache.get(key)
+                    if entry is not None:
+                        cached[row] = entry
+            misses = np.array([r for r in range(len(ids)) if r not in cached], dtype=np.int64)
+            phrases = rank_key_phrases(questions, descriptions, misses, self.max_key_phrases) if len(misses) else {}
+
+            fresh: List[Dict[str, Any]] = []
+            for row in misses.tolist():
+                entities = extract_entities(questions[row])
+                primary = entities[: self.max_primary_queries] or phrases[row][:1]
+                fresh.append({
+                    "question_hash": keys[row],
+                    "primary_queries": primary,
+                    "hashtags": derive_hashtags(entities, tags[row], self.max_hashtags),
+                    "key_phrases": phrases[row],
+                    "entities": entities,
+                })
+                cached[row] = fresh[-1]
+            if self.cache is not None:
+                self.cache.extend(fresh, live_keys=set(keys))
+            st.rows = len(ids)
+        METRICS.count("query_sets_cached", len(ids) - len(fresh))
+        METRICS.count("query_sets_generated", len(fresh))
+        log(f"Query sets: {len(ids):,} markets, {len(fresh):,} generated, {len(ids) - len(fresh):,} from cache")
+
+        return [
+            {
+                "market_id": mid,
+                "question": questions[row],
+                **{k: cached[row][k] for k in ("primary_queries", "hashtags", "key_phrases", "entities", "question_hash")},
+            }
+            for row, mid in enumerate(ids)
+        ]
+
+
+def read_markets(path: PathLike) -> List[Dict[str, Any]]:
+    """Market records from a JSONL file, or a JSON list."""
+    path = Path(path)
+    with path.open("r", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            data = json.load(f)
+            return [m for m in data if isinstance(m, dict)] if isinstance(data, list) else []
+        markets = []
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                m = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(m, dict):
+                markets.append(m)
+        return markets
+
+
+def write_query_sets(path: PathLike, query_sets: List[Dict[str, Any]]) -> None:
+    """Atomically write query_sets.json (the list step2_load_query_sets reads)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(query_sets, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def main(args: argparse.Namespace) -> None:
+    t0 = time.time()
+    markets = read_markets(args.markets)
+    log(f"Read {len(markets):,} market records from {args.markets}")
+    cache_path = None if args.no_cache else (args.cache or Path(args.out).parent / CACHE_FILE)
+    generator = QuerySetGenerator(cache_path, max_key_phrases=args.max_key_phrases, refresh=args.refresh)
+    query_sets = generator.generate(markets)
+    write_query_sets(args.out, query_sets)
+    log(f"Wrote {len(query_sets):,} query sets -> {args.out} in {time.time() - t0:.1f}s")
+    if args.metrics_dir:
+        METRICS.export(args.metrics_dir, "query_sets")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate social-media query sets for Polymarket markets")
+    parser.add_argument("--markets", type=str, required=True, help="markets.jsonl (or a JSON list of markets)")
+    parser.add_argument("--out", type=str, required=True, help="query_sets.json to write")
+    parser.add_argument("--cache", type=str, default=None, help=f"Cache file (default: <out dir>/{CACHE_FILE})")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the cache")
+    parser.add_argument("--refresh", action="store_true", help="Regenerate every market, replacing cached entries")
+    parser.add_argument("--max-key-phrases", type=int, default=MAX_KEY_PHRASES)
+    parser.add_argument("--metrics-dir", type=str, default=None, help="Write a JSON run report + Prometheus textfile here")
+    main(parser.parse_args())
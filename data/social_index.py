@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+social_index.py
+───────────────
+Persistent full-text index over the Reddit/Twitter corpus (SQLite FTS5).
+
+Dumps and datasets are ingested once; per-market collection then becomes an
+index query for (keywords, date range, subreddits) instead of a rescan of
+the raw files. Posts live in a `posts` table (source, post_id, created_utc,
+subreddit, hashtags, record JSON) indexed by (source, created_utc), and
+their text in a contentless FTS5 table sharing the same rowid.
+
+FTS5 matches whole tokens, so index queries behave like the collectors'
+keyword_word_boundary mode; the collectors re-check hits with the same
+KeywordMatcher used for dump scans.
+
+Usage:
+  python data/social_index.py build --index data/social_index.db --reddit RS_2024-01.zst --twitter tweets.jsonl.gz
+  python data/social_index.py query --index data/social_index.db --source reddit --keyword "bitcoin etf" --start 2024-01-01 --end 2024-01-31
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from collect_reddit import RedditCollector
+from collect_twitter import TwitterCollector
+from text_match import normalize_phrase
+from timestamps import parse_timestamp
+
+PathLike = Union[str, Path]
+
+DEFAULT_INDEX_PATH = Path("data/social_index.db")
+COMMIT_EVERY = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    rowid       INTEGER PRIMARY KEY,
+    source      TEXT NOT NULL,
+    post_id     TEXT,
+    created_utc REAL,
+    subreddit   TEXT,
+    hashtags    TEXT,
+    record      TEXT NOT NULL,
+    UNIQUE (source, post_id)
+);
+CREATE INDEX IF NOT EXISTS posts_source_time ON posts (source, created_utc);
+CREATE INDEX IF NOT EXISTS posts_subreddit_time ON posts (subreddit, created_utc);
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+    text, content='', tokenize='unicode61 remove_diacritics 0'
+);
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path        TEXT PRIMARY KEY,
+    source      TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime       REAL NOT NULL,
+    rows        INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+"""
+
+
+def fts_query(keywords: Iterable[str]) -> Optional[str]:
+    """FTS5 MATCH expression OR-ing each keyword as a quoted phrase (None if no searchable keyword)."""
+    phrases = [
+        '"' + normalize_phrase(k).replace('"', '""') + '"'
+        for k in keywords
+        if isinstance(k, str) and re.search(r"\w", k)
+    ]
+    return " OR ".join(phrases) if phrases else None
+
+
+class SocialIndex:
+    """
+    SQLite FTS5 index of social posts.
+
+    Rows passed to add_posts are dicts with 'post_id', 'created_utc' (unix
+    seconds or None), 'subreddit', 'hashtags' (list or None), 'text' (the
+    searchable text) and 'record' (the dict returned by query). Re-ingesting
+    a post with the same (source, post_id) is a no-op.
+    """
+
+    def __init__(self, path: PathLike = DEFAULT_INDEX_PATH) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    # ── ingest ───────────────────────────────────────────────────────────────
+
+    def is_ingested(self, file: PathLike) -> bool:
+        """True if this file (same path, size and mtime) was already ingested."""
+        p = Path(file).resolve()
+        st = p.stat()
+        row = self.conn.execute(
+            "SELECT size, mtime FROM ingested_files WHERE path = ?", (str(p),)
+        ).fetchone()
+        return row is not None and row[0] == st.st_size and row[1] == st.st_mtime
+
+    def add_posts(self, source: str, rows: Iterable[Dict[str, Any]], file: Optional[PathLike] = None) -> int:
+        """Insert rows for one source; returns the number of new posts."""
+        cur = self.conn.cursor()
+        inserted = 0
+        for i, row in enumerate(rows, start=1):
+            hashtags = row.get("hashtags")
+            cur.execute(
+                "INSERT OR IGNORE INTO posts (source, post_id, created_utc, subreddit, hashtags, record) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    source,
+                    row.get("post_id"),
+                    row.get("created_utc"),
+                    (row.get("subreddit") or "").lower() or None,
+                    "|".join(str(h) for h in hashtags) if hashtags else None,
+                    json.dumps(row["record"], ensure_ascii=False, default=str),
+                ),
+            )
+            if cur.rowcount:
+                cur.execute("INSERT INTO posts_fts (rowid, text) VALUES (?, ?)", (cur.lastrowid, row.get("text") or ""))
+                inserted += 1
+            if i % COMMIT_EVERY == 0:
+                self.conn.commit()
+        if file is not None:
+            p = Path(file).resolve()
+            st = p.stat()
+            cur.execute(
+                "INSERT OR REPLACE INTO ingested_files (path, source, size, mtime, rows, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (str(p), source, st.st_size, st.st_mtime, inserted, datetime.now(tz=timezone.utc).isoformat()),
+            )
+        self.conn.commit()
+        return inserted
+
+    # ── query ────────────────────────────────────────────────────────────────
+
+    def query(
+        self,
+        source: str,
+        keywords: Optional[List[str]] = None,
+        start_ts: Optional[float] = None,
+        end_ts: Optional[float] = None,
+        subreddits: Optional[List[str]] = None,
+        keep_undated: bool = False,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Records of `source` matching any keyword (whole tokens) created in
+        [start_ts, end_ts], oldest first. keep_undated also returns posts
+        whose timestamp could not be parsed at ingest time.
+        """
+        where = ["source = ?"]
+        params: List[Any] = [source]
+        if keywords:
+            match = fts_query(keywords)
+            if match is None:
+                return []
+            where.append("rowid IN (SELECT rowid FROM posts_fts WHERE posts_fts MATCH ?)")
+            params.append(match)
+        if start_ts is not None or end_ts is not None:
+            window = []
+            if start_ts is not None:
+                window.append("created_utc >= ?")
+                params.append(start_ts)
+            if end_ts is not None:
+                window.append("created_utc <= ?")
+                params.append(end_ts)
+            clause = " AND ".join(window)
+            where.append(f"(created_utc IS NULL OR ({clause}))" if keep_undated else f"({clause})")
+        if subreddits:
+            where.append(f"subreddit IN ({', '.join('?' * len(subreddits))})")
+            params.extend(s.lower() for s in subreddits)
+
+        sql = f"SELECT record FROM posts WHERE {' AND '.join(where)} ORDER BY created_utc, rowid"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [json.loads(r[0]) for r in self.conn.execute(sql, params)]
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.conn.execute("SELECT source, COUNT(*) FROM posts GROUP BY source").fetchall())
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def main(args: argparse.Namespace) -> None:
+    index = SocialIndex(args.index)
+    if args.command == "build":
+        reddit = RedditCollector(decode_workers=args.workers)
+        twitter = TwitterCollector(decode_workers=args.workers)
+        jobs = [("reddit", f, reddit.iter_index_rows) for f in args.reddit or []]
+        jobs += [("twitter", f, twitter.iter_index_rows) for f in args.twitter or []]
+        for source, file, rows in jobs:
+            if index.is_ingested(file) and not args.force:
+                print(f"[INFO] Skipping {file}: already indexed", flush=True)
+                continue
+            t0 = time.time()
+            n = index.add_posts(source, rows(file), file=file)
+            print(f"[INFO] Indexed {n:,} new {source} posts from {file} in {time.time() - t0:.1f}s", flush=True)
+        print(f"[INFO] Index {args.index}: {index.stats()}", flush=True)
+    elif args.command == "query":
+        t0 = time.time()
+        records = index.query(
+            args.source,
+            keywords=args.keyword,
+            start_ts=parse_timestamp(args.start),
+            end_ts=parse_timestamp(args.end),
+            subreddits=args.subreddit,
+            keep_undated=args.source == "twitter",
+            limit=args.limit,
+        )
+        for r in records:
+            print(json.dumps(r, ensure_ascii=False, default=str))
+        print(f"[INFO] {len(records):,} posts in {(time.time() - t0) * 1000:.1f} ms", flush=True)
+    index.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-text index over Reddit/Twitter dumps")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Ingest dump/dataset files into the index")
+    build.add_argument("--index", type=str, default=str(DEFAULT_INDEX_PATH), help="SQLite index file")
+    build.add_argument("--reddit", type=str, nargs="*", help="Pushshift dump files")
+    build.add_argument("--twitter", type=str, nargs="*", help="Twitter dataset files")
+    build.add_argument("--workers", type=int, default=1, help="Decode workers for multi-frame .zst files")
+    build.add_argument("--force", action="store_true", help="Re-ingest files already indexed")
+    query = sub.add_parser("query", help="Query the index")
+    query.add_argument("--index", type=str, default=str(DEFAULT_INDEX_PATH), help="SQLite index file")
+    query.add_argument("--source", type=str, choices=["reddit", "twitter"], required=True)
+    query.add_argument("--keyword", type=str, nargs="*", help="Keywords/phrases (any may match)")
+    query.add_argument("--start", type=str, default=None, help="ISO start date (UTC)")
+    query.add_argument("--end", type=str, default=None, help="ISO end date (UTC)")
+    query.add_argument("--subreddit", type=str, nargs="*", help="Restrict to these subreddits")
+    query.add_argument("--limit", type=int, default=None)
+    main(parser.parse_args())
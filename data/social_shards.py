@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+social_shards.py
+────────────────
+Re-shard Reddit dumps / Twitter datasets into daily compressed JSONL files
+with a manifest, so collectors only open the days a market's window covers.
+
+Layout:
+  <out>/<YYYY-MM-DD>.jsonl.<gz|zst|bz2>   one shard per UTC day
+  <out>/undated.jsonl.<ext>               records without a parseable time
+  <out>/manifest.json                     per shard: min_ts, max_ts, rows, subreddits, bytes
+
+Records are written unchanged, so a shard is read exactly like the original
+dump. Re-running with new inputs appends to existing shards (a new gzip
+member / zstd frame per append) and merges the manifest; inputs already
+recorded in the manifest are skipped.
+
+Each input is committed as a unit: its shards are fsynced and the manifest
+(with every shard's committed byte size) is saved only after the whole
+input. Bytes past a shard's committed size are what a crash left behind,
+and are truncated before anything else is written. --force rebuilds the
+directory from every recorded input plus the given ones, since an input's
+rows cannot be taken back out of the shards it shares with others.
+
+Lines are buffered per day and each flush appends one member/frame, so
+unsorted input (e.g. Twitter datasets) does not reopen shards per record.
+
+Usage:
+  python data/social_shards.py reddit --out data/shards/reddit RS_2024-01.zst RS_2024-02.zst
+  python data/social_shards.py twitter --out data/shards/twitter tweets.jsonl.gz --compression zst
+  python data/social_shards.py select --shard-dir data/shards/reddit --start 2024-01-01 --end 2024-01-31
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Union
+
+from dump_io import open_append
+from timestamps import parse_timestamp
+
+PathLike = Union[str, Path]
+
+MANIFEST_NAME = "manifest.json"
+UNDATED_SHARD = "undated"
+DEFAULT_COMPRESSION = "gz"
+SHARD_BUFFER_BYTES = 8 << 20      # flush one day's lines once this much is buffered
+TOTAL_BUFFER_BYTES = 256 << 20    # flush every day once all buffers hold this much
+
+
+def manifest_path(shard_dir: PathLike) -> Path:
+    return Path(shard_dir) / MANIFEST_NAME
+
+
+def load_manifest(shard_dir: PathLike) -> Dict[str, Any]:
+    p = manifest_path(shard_dir)
+    if not p.exists():
+        return {"inputs": [], "shards": {}}
+    with p.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(shard_dir: PathLike, manifest: Dict[str, Any]) -> None:
+    """Atomically replace the manifest so a crash never leaves it half-written."""
+    p = manifest_path(shard_dir)
+    tmp = p.with_name(p.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, p)
+
+
+def shard_day(ts: Optional[float]) -> str:
+    if ts is None:
+        return UNDATED_SHARD
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class _ShardWriters:
+    """
+    Per-day line buffers. A flush appends a day's buffer to its shard in one
+    open (one gzip member / zstd frame), so shards are not reopened per line
+    even when the input jumps between days.
+    """
+
+    def __init__(self, shard_dir: Path, compression: str) -> None:
+        self.shard_dir = shard_dir
+        self.suffix = f".jsonl.{compression}" if compression else ".jsonl"
+        self._buffers: Dict[str, List[bytes]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._buffered = 0
+        self.touched: Set[str] = set()
+
+    def write(self, day: str, line: bytes) -> str:
+        name = day + self.suffix
+        self._buffers.setdefault(name, []).append(line)
+        self._sizes[name] = self._sizes.get(name, 0) + len(line)
+        self._buffered += len(line)
+        if self._sizes[name] >= SHARD_BUFFER_BYTES:
+            self._flush(name)
+        elif self._buffered >= TOTAL_BUFFER_BYTES:
+            self.flush()
+        return name
+
+    def _flush(self, name: str) -> None:
+        lines = self._buffers.pop(name, None)
+        if not lines:
+            return
+        with open_append(self.shard_dir / name) as f:
+            f.write(b"".join(lines))
+        self._buffered -= self._sizes.pop(name)
+        self.touched.add(name)
+
+    def flush(self) -> None:
+        for name in list(self._buffers):
+            self._flush(name)
+
+    def close(self) -> None:
+        self.flush()
+
+    def sync(self) -> None:
+        """fsync every shard written to, before the manifest records their sizes."""
+        for name in self.touched:
+            with (self.shard_dir / name).open("rb") as f:
+                os.fsync(f.fileno())
+
+
+def rollback_uncommitted(shard_dir: PathLike, manifest: Dict[str, Any]) -> int:
+    """
+    Truncate shards back to the byte sizes the manifest committed, and remove
+    shards without a committed size, dropping rows of an input interrupted
+    mid-way. Returns the shards changed.
+    """
+    out = Path(shard_dir)
+    shards = manifest.get("shards", {})
+    changed = 0
+    for path in out.glob("*.jsonl*"):
+        committed = shards.get(path.name, {}).get("bytes")
+        if committed is None:
+            path.unlink()
+            changed += 1
+        elif path.stat().st_size > committed:
+            with path.open("r+b") as f:
+                f.truncate(committed)
+                os.fsync(f.fileno())
+            changed += 1
+    return changed
+
+
+def reshard(
+    records: Iterable[Dict[str, Any]],
+    shard_dir: PathLike,
+    timestamp_of: Callable[[Dict[str, Any]], Optional[float]],
+    subreddit_of: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None,
+    compression: str = DEFAULT_COMPRESSION,
+    manifest: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Append records to daily shards under shard_dir and fold their stats and
+    committed byte sizes into the manifest (loaded from shard_dir when not
+    given). Returns the updated manifest; the caller saves it, which commits
+    the records (see rollback_uncommitted).
+    """
+    out = Path(shard_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    manifest = manifest if manifest is not None else load_manifest(out)
+    shards = manifest.setdefault("shards", {})
+    writers = _ShardWriters(out, compression)
+    try:
+        for record in records:
+            ts = timestamp_of(record)
+            name = writers.write(shard_day(ts), (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            entry = shards.setdefault(name, {"min_ts": None, "max_ts": None, "rows": 0, "subreddits": {}})
+            entry["rows"] += 1
+            if ts is not None:
+                entry["min_ts"] = ts if entry["min_ts"] is None else min(entry["min_ts"], ts)
+                entry["max_ts"] = ts if entry["max_ts"] is None else max(entry["max_ts"], ts)
+            if subreddit_of is not None:
+                sub = (subreddit_of(record) or "").lower()
+                if sub:
+                    entry["subreddits"][sub] = entry["subreddits"].get(sub, 0) + 1
+    finally:
+        writers.close()
+    writers.sync()
+    for name in writers.touched:
+        shards[name]["bytes"] = (out / name).stat().st_size
+    return manifest
+
+
+def shards_for_window(
+    shard_dir: PathLike,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+    subreddits: Optional[List[str]] = None,
+    include_undated: bool = False,
+) -> List[str]:
+    """
+    Paths of the shards whose [min_ts, max_ts] overlaps [start_ts, end_ts]
+    and (when subreddits is given) that hold at least one of the subreddits,
+    in date order.
+    """
+    shard_dir = Path(shard_dir)
+    wanted = {s.lower() for s in subreddits} if subreddits else None
+    selected = []
+    for name, entry in sorted(load_manifest(shard_dir).get("shards", {}).items()):
+        if entry["min_ts"] is None:
+            if not include_undated:
+                continue
+        elif (end_ts is not None and entry["min_ts"] > end_ts) or (start_ts is not None and entry["max_ts"] < start_ts):
+            continue
+        if wanted is not None and entry.get("subreddits") and not wanted & set(entry["subreddits"]):
+            continue
+        selected.append(str(shard_dir / name))
+    return selected
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.command == "select":
+        for path in shards_for_window(args.shard_dir, parse_timestamp(args.start), parse_timestamp(args.end),
+                                      args.subreddit, include_undated=args.include_undated):
+            print(path)
+        return
+
+    # Imported here: the collectors import this module for shard lookup
+    from collect_reddit import RedditCollector
+    from collect_twitter import TwitterCollector
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(out)
+    inputs = list(args.inputs)
+    recorded = manifest.get("inputs", [])
+    forced = [i for i in inputs if str(Path(i).resolve()) in recorded] if args.force else []
+    if forced:
+        # An input's rows are mixed into shards shared with other inputs: rebuild from all of them
+        missing = [i for i in recorded if not Path(i).exists()]
+        if missing:
+            raise FileNotFoundError(f"--force rebuilds {out} from every recorded input, but these are gone: {missing}")
+        inputs = recorded + [i for i in inputs if str(Path(i).resolve()) not in recorded]
+        print(f"[INFO] Rebuilding {out} from {len(inputs)} inputs ({len(forced)} forced)", flush=True)
+        manifest = {"inputs": [], "shards": {}}
+        save_manifest(out, manifest)
+    if rollback_uncommitted(out, manifest):
+        print(f"[INFO] Rolled back shards written by an interrupted run in {out}", flush=True)
+
+    for input_file in inputs:
+        key = str(Path(input_file).resolve())
+        if key in manifest.get("inputs", []):
+            print(f"[INFO] Skipping {input_file}: already sharded", flush=True)
+            continue
+        if args.command == "reddit":
+            reddit = RedditCollector(decode_workers=args.workers)
+            records = reddit.iter_pushshift_dump(input_file)
+            manifest = reshard(records, args.out, reddit.post_timestamp, lambda p: p.get("subreddit"),
+                               compression=args.compression, manifest=manifest)
+        else:
+            twitter = TwitterCollector(decode_workers=args.workers)
+            records = twitter.iter_dataset(input_file)
+            manifest = reshard(records, args.out, twitter.tweet_timestamp,
+                               compression=args.compression, manifest=manifest)
+        manifest.setdefault("inputs", []).append(key)
+        save_manifest(out, manifest)
+        print(f"[INFO] Sharded {input_file} -> {args.out}", flush=True)
+
+    shards = manifest.get("shards", {})
+    print(f"[INFO] {len(shards):,} shards, {sum(s['rows'] for s in shards.values()):,} rows in {args.out}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily shards + manifest for social dumps")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for source in ("reddit", "twitter"):
+        p = sub.add_parser(source, help=f"Re-shard {source} inputs into daily files")
+        p.add_argument("inputs", type=str, nargs="+", help="Dump/dataset files")
+        p.add_argument("--out", type=str, required=True, help="Shard directory")
+        p.add_argument("--compression", type=str, default=DEFAULT_COMPRESSION, choices=["gz", "zst", "bz2", ""],
+                       help="Shard compression ('' = plain JSONL)")
+        p.add_argument("--workers", type=int, default=1, help="Decode workers for multi-frame .zst inputs")
+        p.add_argument("--force", action="store_true", help="Rebuild the shards from every recorded input plus these")
+    sel = sub.add_parser("select", help="List shards overlapping a window")
+    sel.add_argument("--shard-dir", type=str, required=True)
+    sel.add_argument("--start", type=str, default=None, help="ISO start date (UTC)")
+    sel.add_argument("--end", type=str, default=None, help="ISO end date (UTC)")
+    sel.add_argument("--subreddit", type=str, nargs="*", help="Keep shards holding these subreddits")
+    sel.add_argument("--include-undated", action="store_true")
+    main(parser.parse_args())
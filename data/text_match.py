@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+text_match.py
+─────────────
+Compiled multi-keyword matcher shared by the social-media collectors.
+
+All keywords of a query set are folded into one trie-shaped regex: shared
+prefixes are merged, so each text position costs at most one walk down the
+trie instead of one attempt per keyword, and matching stays linear in the
+text length however many keywords a market has.
+
+Keywords are literal phrases matched case-insensitively; any whitespace run
+in the text matches a space in a phrase. With word_boundary=True a keyword
+only matches whole words ("eth" no longer hits "ethics").
+
+Usage:
+  from text_match import KeywordMatcher
+
+  matcher = KeywordMatcher(["bitcoin etf", "sec approval"], word_boundary=True)
+  matcher.search("SEC approval for a Bitcoin  ETF")    # True
+  matcher.matches("SEC approval for a Bitcoin  ETF")   # ['bitcoin etf', 'sec approval']
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+_WS = re.compile(r"\s+")
+_WORD = re.compile(r"\w")
+
+
+def normalize_phrase(text: str) -> str:
+    """Lower-case a phrase and collapse whitespace runs to single spaces."""
+    return _WS.sub(" ", text).strip().lower()
+
+
+class _TrieNode:
+    __slots__ = ("children", "keywords")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _TrieNode] = {}
+        self.keywords: List[str] = []
+
+
+class KeywordMatcher:
+    """
+    One compiled pattern for a whole keyword list.
+
+    search() answers "does any keyword occur"; matches() also reports which
+    keywords occur (overlapping ones included, in the order given).
+    """
+
+    def __init__(self, keywords: Iterable[str], word_boundary: bool = False) -> None:
+        self.word_boundary = word_boundary
+        self.keywords: List[str] = []
+        self._root = _TrieNode()
+        for kw in keywords:
+            phrase = normalize_phrase(kw) if isinstance(kw, str) else ""
+            if not phrase:
+                continue
+            self.keywords.append(kw)
+            node = self._root
+            for ch in phrase:
+                node = node.children.setdefault(ch, _TrieNode())
+            node.keywords.append(kw)
+
+        self._search: Optional[re.Pattern] = None
+        self._scan: Optional[re.Pattern] = None
+        if self.keywords:
+            body = self._node_pattern(self._root, None)
+            self._search = re.compile(body, re.IGNORECASE)
+            # Zero-width lookahead finds the longest match starting at every position
+            self._scan = re.compile(f"(?=({body}))", re.IGNORECASE)
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    # ── pattern construction ─────────────────────────────────────────────────
+
+    def _node_pattern(self, node: _TrieNode, prev: Optional[str]) -> str:
+        alts = []
+        for ch, child in node.children.items():
+            # Collapse single-child chains into one literal run to keep nesting shallow
+            run, nxt = ch, child
+            while len(nxt.children) == 1 and not nxt.keywords:
+                (c, nxt), = nxt.children.items()
+                run += c
+            lit = "".join(r"\s+" if c == " " else re.escape(c) for c in run)
+            if prev is None and self.word_boundary and _WORD.match(run[0]):
+                lit = r"(?<!\w)" + lit
+            alts.append(lit + self._node_pattern(nxt, run[-1]))
+        if node.keywords:
+            # Ending here is tried last, so longer keywords win at a given position
+            alts.append(r"(?!\w)" if self.word_boundary and prev and _WORD.match(prev) else "")
+        if len(alts) == 1:
+            return alts[0]
+        return "(?:" + "|".join(alts) + ")"
+
+    def _boundary_ok(self, text: str, end: int, last: str) -> bool:
+        if not self.word_boundary or not _WORD.match(last):
+            return True
+        return end >= len(text) or not _WORD.match(text[end])
+
+    # ── public API ───────────────────────────────────────────────────────────
+
+    def search(self, text: Any) -> bool:
+        """True if any keyword occurs in text (non-strings never match)."""
+        if self._search is None or not isinstance(text, str):
+            return False
+        return self._search.search(text) is not None
+
+    def search_any(self, values: Iterable[Any]) -> bool:
+        """True if any keyword occurs in any of the values (e.g. a hashtag list)."""
+        return any(self.search(str(v)) for v in values)
+
+    def matches(self, text: Any) -> List[str]:
+        """Keywords occurring in text, in the order they were given."""
+        if self._scan is None or not isinstance(text, str):
+            return []
+        hits = set()
+        for m in self._scan.finditer(text):
+            # Every keyword starting here is a prefix of the longest match: walk
+            # the trie along it and collect each keyword ending on the way
+            start, span = m.start(), m.group(1)
+            node, prev_ws = self._root, False
+            for i, ch in enumerate(span):
+                is_ws = ch.isspace()
+                if is_ws and prev_ws:
+                    continue
+                prev_ws = is_ws
+                node = node.children.get(" " if is_ws else ch.lower())
+                if node is None:
+                    break
+                if node.keywords and self._boundary_ok(text, start + i + 1, ch):
+                    hits.update(node.keywords)
+        return [kw for kw in dict.fromkeys(self.keywords) if kw in hits]
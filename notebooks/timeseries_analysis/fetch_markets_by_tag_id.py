@@ -2,21 +2,32 @@
 """
 fetch_markets_by_tag_id.py
 ──────────────────────────
-Fetches all Polymarket markets for a given tag_id and writes them to JSONL.
+Fetches all Polymarket markets for one or more tag_ids and writes them to JSONL.
+
+Pages are fetched concurrently (bounded by --concurrency and a shared
+--rate requests/s limit). Markets are deduplicated by id across tags and
+written in (tag order, offset) order, so the output does not depend on the
+order in which pages arrive.
 
 Usage:
   python fetch_markets_by_tag_id.py                      # uses defaults
   python fetch_markets_by_tag_id.py --tag-id 339 --max 2000 --out data/markets.jsonl
+  python fetch_markets_by_tag_id.py --tag-id 144 339 1101 --concurrency 8 --rate 10
+  python fetch_markets_by_tag_id.py --metrics-dir data/metrics   # JSON run report + Prometheus textfile
 """
 from __future__ import annotations
 
 import argparse
 import json
+import sys
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-import requests
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "data"))
+from http_client import HttpClient  # noqa: E402
+from metrics import METRICS  # noqa: E402
 
 GAMMA_BASE    = "https://gamma-api.polymarket.com"
 PAGE_SIZE     = 100
@@ -25,7 +36,9 @@ MAX_RETRIES   = 5
 BACKOFF_SEC   = 1.5
 
 DEFAULT_TAG_ID  = 144
-DEFAULT_MAX     = 5000
+DEFAULT_MAX     = 5000              # per tag
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE    = 10.0              # requests/s across all threads
 DEFAULT_OUT     = Path("notebooks/timeseries_analysis/data/markets_by_tag.jsonl")
 
 
@@ -33,22 +46,22 @@ def log(msg: str) -> None:
     print(f"[INFO] {msg}", flush=True)
 
 
+def make_client(concurrency: int = DEFAULT_CONCURRENCY, rate: Optional[float] = DEFAULT_RATE) -> HttpClient:
+    return HttpClient(
+        timeout=TIMEOUT_SEC,
+        retries=MAX_RETRIES,
+        backoff_sec=BACKOFF_SEC,
+        pool_maxsize=max(1, concurrency),
+        rate_per_sec=rate or None,
+        log=log,
+    )
+
+
+CLIENT = make_client()
+
+
 def http_get(url: str, params: Optional[Dict[str, Any]] = None) -> Any:
-    last_err: Exception | None = None
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            r = requests.get(url, params=params, timeout=TIMEOUT_SEC)
-            if r.status_code in (429, 500, 502, 503, 504):
-                wait = BACKOFF_SEC * (2 ** (attempt - 1))
-                log(f"HTTP {r.status_code} – retrying in {wait:.1f}s ({attempt}/{MAX_RETRIES})")
-                time.sleep(wait)
-                continue
-            r.raise_for_status()
-            return r.json()
-        except Exception as exc:
-            last_err = exc
-            time.sleep(BACKOFF_SEC * attempt)
-    raise RuntimeError(f"GET failed after {MAX_RETRIES} retries: {url} | {last_err}")
+    return CLIENT.get(url, params=params)
 
 
 def fetch_markets(tag_id: int, max_markets: int) -> List[Dict[str, Any]]:
@@ -77,22 +90,121 @@ def fetch_markets(tag_id: int, max_markets: int) -> List[Dict[str, Any]]:
     return markets
 
 
+def _fetch_page(tag_id: int, offset: int) -> List[Dict[str, Any]]:
+    batch = http_get(f"{GAMMA_BASE}/markets", params={
+        "limit":       PAGE_SIZE,
+        "offset":      offset,
+        "tag_id":      tag_id,
+        "include_tag": True,
+    })
+    if not isinstance(batch, list):
+        raise RuntimeError(f"Unexpected response type: {type(batch)}")
+    return [m for m in batch if isinstance(m, dict)]
+
+
+def fetch_markets_multi(tag_ids: List[int], max_markets: int, concurrency: int) -> List[Dict[str, Any]]:
+    """
+    Fetch up to max_markets per tag for every tag, with pages in flight
+    concurrently across all tags. A short page marks the end of a tag, after
+    which no further offsets are scheduled for it (pages already in flight
+    past the end simply come back empty).
+    """
+    log(f"Fetching markets for tag_ids={tag_ids} (max={max_markets} per tag, concurrency={concurrency})")
+    pages: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+    next_offset = [0] * len(tag_ids)
+    end_offset: List[Optional[int]] = [None] * len(tag_ids)
+    in_flight: Dict[Future, Tuple[int, int]] = {}
+
+    def tag_open(ti: int) -> bool:
+        limit = max_markets if end_offset[ti] is None else min(max_markets, end_offset[ti])
+        return next_offset[ti] < limit
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def submit_more() -> None:
+            # Round-robin across tags so one large tag does not starve the rest
+            while len(in_flight) < concurrency:
+                open_tags = [ti for ti in range(len(tag_ids)) if tag_open(ti)]
+                if not open_tags:
+                    return
+                for ti in open_tags:
+                    if len(in_flight) >= concurrency:
+                        return
+                    offset = next_offset[ti]
+                    next_offset[ti] += PAGE_SIZE
+                    in_flight[pool.submit(_fetch_page, tag_ids[ti], offset)] = (ti, offset)
+
+        submit_more()
+        fetched = 0
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                ti, offset = in_flight.pop(fut)
+                batch = fut.result()
+                pages[(ti, offset)] = batch
+                fetched += len(batch)
+                if len(batch) < PAGE_SIZE:
+                    end = offset + len(batch)
+                    end_offset[ti] = end if end_offset[ti] is None else min(end_offset[ti], end)
+            log(f"  fetched {fetched} so far …")
+            submit_more()
+
+    # Assemble in (tag order, offset) order and dedupe by market id.
+    markets: List[Dict[str, Any]] = []
+    seen: set = set()
+    for ti, tag_id in enumerate(tag_ids):
+        tag_markets: List[Dict[str, Any]] = []
+        for (pti, offset) in sorted(k for k in pages if k[0] == ti):
+            tag_markets.extend(pages[(pti, offset)])
+        tag_markets = tag_markets[:max_markets]
+        added = 0
+        for m in tag_markets:
+            key = str(m.get("id") or m.get("conditionId") or "")
+            if key and key in seen:
+                continue
+            seen.add(key)
+            markets.append(m)
+            added += 1
+        log(f"  tag_id={tag_id}: {len(tag_markets)} markets ({added} new after dedupe)")
+
+    log(f"Done — {len(markets)} unique markets collected across {len(tag_ids)} tags")
+    return markets
+
+
 def write_jsonl(path: Path, rows: List[Dict[str, Any]]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
+    with METRICS.stage("write_jsonl") as st, path.open("w", encoding="utf-8") as f:
         for row in rows:
             f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        st.rows = len(rows)
+        st.bytes_written = f.tell()
     log(f"Wrote {len(rows)} records → {path}")
 
 
 def main(args: argparse.Namespace) -> None:
-    markets = fetch_markets(args.tag_id, args.max)
+    global CLIENT
+    CLIENT = make_client(args.concurrency, args.rate)
+    METRICS.attach_http(CLIENT)
+    with METRICS.stage("fetch_markets") as st:
+        if len(args.tag_id) == 1 and args.concurrency <= 1:
+            markets = fetch_markets(args.tag_id[0], args.max)
+        else:
+            markets = fetch_markets_multi(args.tag_id, args.max, args.concurrency)
+        st.rows = len(markets)
     write_jsonl(Path(args.out), markets)
+    CLIENT.log_stats()
+    for line in METRICS.summary_lines():
+        log(line)
+    if args.metrics_dir:
+        json_path, prom_path = METRICS.export(args.metrics_dir, "fetch_markets_by_tag_id")
+        log(f"Metrics → {json_path}, {prom_path}")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Fetch Polymarket markets by tag ID")
-    parser.add_argument("--tag-id", type=int,  default=DEFAULT_TAG_ID, help="Polymarket tag ID")
-    parser.add_argument("--max",    type=int,  default=DEFAULT_MAX,    help="Max markets to fetch")
+    parser.add_argument("--tag-id", type=int,  nargs="+", default=[DEFAULT_TAG_ID], help="Polymarket tag ID(s)")
+    parser.add_argument("--max",    type=int,  default=DEFAULT_MAX,    help="Max markets to fetch per tag")
     parser.add_argument("--out",    type=str,  default=str(DEFAULT_OUT), help="Output .jsonl path")
+    parser.add_argument("--concurrency", type=int,   default=DEFAULT_CONCURRENCY, help="Pages in flight at once (1 = serial)")
+    parser.add_argument("--rate",        type=float, default=DEFAULT_RATE,        help="Max Gamma requests per second")
+    parser.add_argument("--metrics-dir", type=str,   default=None,                help="Write a JSON run report + Prometheus textfile here")
     main(parser.parse_args())
\ No newline at end of file
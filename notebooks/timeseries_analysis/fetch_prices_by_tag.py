@@ -7,25 +7,54 @@ and writes results to a JSONL file.
 
 Features:
   - Filters out markets with no CLOB tokens or insufficient history
-  - Resume support: skips tokens already fetched (safe to re-run)
+  - Resume support: skips tokens already fetched (safe to re-run). A sidecar
+    manifest (<out stem>.manifest.jsonl) lists every committed row, so resume
+    never re-reads the history arrays and a torn final line after a crash is
+    truncated and refetched
+  - Buffered output with group-commit fsync (--fsync-every rows)
   - Progress logging with ETA
   - Configurable fidelity and interval via CLI
+  - Incremental refresh (--incremental): fetches only candles newer than the
+    last stored one per token and appends them as delta rows
+  - Optional columnar copy (--columnar-out): Parquet store read back with
+    price_store.read_columnar_prices (needs pyarrow)
 
 Usage:
   python fetch_price_history.py
   python fetch_price_history.py --markets data/markets_filtered.jsonl --fidelity 720 --min-candles 10
   python fetch_price_history.py --markets data/markets_by_tag.jsonl --out data/prices.jsonl
+  python fetch_price_history.py --incremental
+  python fetch_price_history.py --columnar-out data/filtered/filtered_prices_by_tag.parquet
+  python fetch_price_history.py --metrics-dir data/metrics   # JSON run report + Prometheus textfile
 """
 from __future__ import annotations
 
 import argparse
 import json
+import sys
 import time
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Set
 
-import requests
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "data"))
+from http_client import HttpClient  # noqa: E402
+from metrics import METRICS  # noqa: E402
+from price_store import (  # noqa: E402
+    DEFAULT_FSYNC_EVERY_ROWS,
+    ColumnarPriceWriter,
+    ManifestJsonlWriter,
+    backfill_columnar,
+    fold_manifest_timestamps,
+    history_window_params,
+    last_ts_path,
+    load_last_timestamps,
+    load_or_scan_last_timestamps,
+    max_timestamp,
+    new_candles,
+    recover_manifest,
+    save_last_timestamps,
+)
 
 # ── API ───────────────────────────────────────────────────────────────────────
 CLOB_BASE = "https://clob.polymarket.com"
@@ -52,22 +81,11 @@ def log(msg: str) -> None:
 # HTTP
 # ─────────────────────────────────────────────────────────────────────────────
 
+CLIENT = HttpClient(timeout=TIMEOUT_SEC, retries=MAX_RETRIES, backoff_sec=BACKOFF_SEC, log=log)
+
+
 def http_get(url: str, params: Optional[Dict[str, Any]] = None) -> Any:
-    last_err: Exception | None = None
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            r = requests.get(url, params=params, timeout=TIMEOUT_SEC)
-            if r.status_code in (429, 500, 502, 503, 504):
-                wait = BACKOFF_SEC * (2 ** (attempt - 1))
-                log(f"HTTP {r.status_code} – retrying in {wait:.1f}s ({attempt}/{MAX_RETRIES})")
-                time.sleep(wait)
-                continue
-            r.raise_for_status()
-            return r.json()
-        except Exception as exc:
-            last_err = exc
-            time.sleep(BACKOFF_SEC * attempt)
-    raise RuntimeError(f"GET failed after {MAX_RETRIES} retries: {url} | {last_err}")
+    return CLIENT.get(url, params=params)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -84,26 +102,17 @@ def read_jsonl(path: Path) -> List[Dict[str, Any]]:
     return rows
 
 
-def load_already_fetched(path: Path) -> Set[str]:
-    """Return set of token_ids already present in the output file (for resume)."""
-    if not path.exists():
-        return set()
-    seen = set()
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if line.strip():
-                row = json.loads(line)
-                seen.add(row["token_id"])
-    log(f"Resume: {len(seen):,} tokens already fetched – skipping")
+def load_already_fetched(entries: List[Dict[str, Any]]) -> Set[str]:
+    """
+    Return set of token_ids already committed to the output file (for resume),
+    from its sidecar manifest entries (recover_manifest).
+    """
+    seen = {e["token_id"] for e in entries}
+    if entries:
+        log(f"Resume: {len(seen):,} tokens already fetched – skipping")
     return seen
 
 
-def append_jsonl(path: Path, row: Dict[str, Any]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(row, ensure_ascii=False) + "\n")
-
-
 # ─────────────────────────────────────────────────────────────────────────────
 # Token extraction
 # ─────────────────────────────────────────────────────────────────────────────
@@ -142,12 +151,8 @@ def extract_tokens(m: Dict[str, Any]) -> List[str]:
 # Price fetch
 # ─────────────────────────────────────────────────────────────────────────────
 
-def fetch_price_history(token_id: str, interval: str, fidelity_min: int) -> List[Dict]:
-    params = {
-        "market":   token_id,
-        "interval": interval,
-        "fidelity": fidelity_min,
-    }
+def fetch_price_history(token_id: str, interval: str, fidelity_min: int, last_ts: Optional[int] = None) -> List[Dict]:
+    params = history_window_params(token_id, interval, fidelity_min, last_ts)
     resp = http_get(f"{CLOB_BASE}/prices-history", params=params)
     return resp.get("history") or []
 
@@ -164,7 +169,29 @@ def main(args: argparse.Namespace) -> None:
         raise FileNotFoundError(f"Markets file not found: {markets_path}")
 
     markets        = read_jsonl(markets_path)
-    already_done   = load_already_fetched(out_path)
+    state_path     = last_ts_path(out_path)
+
+    # Last stored candle per token. Incremental mode needs it (scanning the
+    # output once if the state file is missing); otherwise it is only kept up
+    # to date when a state file already exists.
+    if args.incremental:
+        # Drop any torn tail before it is scanned; committed rows newer than the saved state are folded in
+        entries = recover_manifest(out_path)
+        last_ts_by_token = load_or_scan_last_timestamps(out_path, entries)
+        already_done: Set[str] = set()
+        log(f"Incremental refresh: {len(last_ts_by_token):,} tokens already stored")
+    else:
+        entries = recover_manifest(out_path)
+        last_ts_by_token = fold_manifest_timestamps(load_last_timestamps(state_path), entries)
+        already_done = load_already_fetched(entries)
+    track_state = args.incremental or state_path.exists()
+
+    columnar: Optional[ColumnarPriceWriter] = None
+    if args.columnar_out:
+        columnar = ColumnarPriceWriter(args.columnar_out)
+        n = backfill_columnar(out_path, columnar, already_done | set(last_ts_by_token))
+        if n:
+            log(f"Columnar store: backfilled {n:,} tokens already in {out_path}")
 
     # Build flat list of (market_id, token_id) pairs to process
     work: List[tuple[str, str]] = []
@@ -179,44 +206,80 @@ def main(args: argparse.Namespace) -> None:
     skipped   = len(already_done)
     written   = 0
     dropped   = 0
+    unchanged = 0
     start_t   = time.time()
 
     log(f"Tokens to fetch: {total:,}  |  already done: {skipped:,}")
 
-    for i, (market_id, token_id) in enumerate(work, start=1):
-        history = fetch_price_history(token_id, args.interval, args.fidelity)
-
-        # Drop tokens with too few candles – not enough history for time-series
-        if len(history) < args.min_candles:
-            dropped += 1
-            log(f"[{i}/{total}] DROP token={token_id} – only {len(history)} candles")
-            continue
-
-        row = {
-            "market_id":   market_id,
-            "token_id":    token_id,
-            "interval":    args.interval,
-            "fidelity_min": args.fidelity,
-            "n_candles":   len(history),
-            "fetched_at":  datetime.now(tz=timezone.utc).isoformat(),
-            "history":     history,
-        }
-        append_jsonl(out_path, row)
-        written += 1
-
-        # Progress + ETA every 25 tokens
-        if i % 25 == 0 or i == total:
-            elapsed  = time.time() - start_t
-            rate     = i / elapsed if elapsed > 0 else 0
-            eta_sec  = (total - i) / rate if rate > 0 else 0
-            eta_str  = f"{eta_sec/60:.1f}m" if eta_sec > 60 else f"{eta_sec:.0f}s"
-            log(f"[{i}/{total}] written={written} dropped={dropped} | rate={rate:.1f} tok/s | ETA {eta_str}")
-
-        time.sleep(0.1)   # be polite to the CLOB API
+    size_before = out_path.stat().st_size if out_path.exists() else 0
+    with METRICS.stage("fetch_prices") as st:
+        writer = ManifestJsonlWriter(out_path, fsync_every_rows=args.fsync_every)
+        try:
+            for i, (market_id, token_id) in enumerate(work, start=1):
+                last_ts = last_ts_by_token.get(token_id) if args.incremental else None
+                history = fetch_price_history(token_id, args.interval, args.fidelity, last_ts)
+
+                if last_ts is not None:
+                    # Known token: append only the delta; min-candles applies to new tokens only
+                    history = new_candles(history, last_ts)
+                    if not history:
+                        unchanged += 1
+                        time.sleep(0.1)
+                        continue
+                elif len(history) < args.min_candles:
+                    # Drop tokens with too few candles – not enough history for time-series
+                    dropped += 1
+                    log(f"[{i}/{total}] DROP token={token_id} – only {len(history)} candles")
+                    continue
+
+                row = {
+                    "market_id":   market_id,
+                    "token_id":    token_id,
+                    "interval":    args.interval,
+                    "fidelity_min": args.fidelity,
+                    "n_candles":   len(history),
+                    "fetched_at":  datetime.now(tz=timezone.utc).isoformat(),
+                    "history":     history,
+                }
+                writer.write(row)
+                written += 1
+                METRICS.count("candles", len(history))
+                if columnar is not None:
+                    columnar.add(token_id, history, market_id=market_id)
+                newest = max_timestamp(history, last_ts)
+                if track_state and newest is not None:
+                    last_ts_by_token[token_id] = newest
+
+                # Progress + ETA every 25 tokens
+                if i % 25 == 0 or i == total:
+                    elapsed  = time.time() - start_t
+                    rate     = i / elapsed if elapsed > 0 else 0
+                    eta_sec  = (total - i) / rate if rate > 0 else 0
+                    eta_str  = f"{eta_sec/60:.1f}m" if eta_sec > 60 else f"{eta_sec:.0f}s"
+                    log(f"[{i}/{total}] written={written} dropped={dropped} | rate={rate:.1f} tok/s | ETA {eta_str}")
+
+                time.sleep(0.1)   # be polite to the CLOB API
+        finally:
+            writer.close()
+            if columnar is not None:
+                columnar.close()
+            if track_state:
+                save_last_timestamps(state_path, last_ts_by_token)
+        st.rows = written
+        st.bytes_written = max(0, out_path.stat().st_size - size_before) if out_path.exists() else 0
 
     log("=" * 55)
     log(f"Done. Written: {written:,}  |  Dropped (<{args.min_candles} candles): {dropped:,}  |  Skipped (resume): {skipped:,}")
+    if args.incremental:
+        log(f"Incremental: {unchanged:,} tokens had no new candles")
     log(f"Output → {out_path}")
+    CLIENT.log_stats()
+    METRICS.attach_http(CLIENT)
+    for line in METRICS.summary_lines():
+        log(line)
+    if args.metrics_dir:
+        json_path, prom_path = METRICS.export(args.metrics_dir, "fetch_prices_by_tag")
+        log(f"Metrics → {json_path}, {prom_path}")
 
 
 if __name__ == "__main__":
@@ -226,4 +289,8 @@ if __name__ == "__main__":
     parser.add_argument("--fidelity",    type=int, default=DEFAULT_FIDELITY_MIN,      help="Candle size in minutes (default 720 = 12h)")
     parser.add_argument("--interval",    type=str, default=DEFAULT_INTERVAL,          help="History interval (default 'max')")
     parser.add_argument("--min-candles", type=int, default=DEFAULT_MIN_CANDLES,       help="Drop tokens with fewer candles than this")
+    parser.add_argument("--columnar-out", type=str, default=None,                     help="Also write a columnar (Parquet) store to this directory")
+    parser.add_argument("--incremental", action="store_true",                         help="Fetch only candles newer than the last stored one per token")
+    parser.add_argument("--fsync-every", type=int, default=DEFAULT_FSYNC_EVERY_ROWS,  help="Group-commit (fsync) the output every N rows")
+    parser.add_argument("--metrics-dir", type=str, default=None,                      help="Write a JSON run report + Prometheus textfile here")
     main(parser.parse_args())
\ No newline at end of file
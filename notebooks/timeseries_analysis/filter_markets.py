@@ -5,10 +5,19 @@ filter_markets.py
 Reads a raw markets JSONL file, applies quality filters, and writes a
 filtered JSONL + a summary JSON.
 
+Streaming mode (--stream, or --workers N > 1) reads the input line by line,
+optionally across N processes that each take a newline-aligned byte range,
+and writes matches as they are found. Memory stays bounded: volume
+statistics come from a mergeable quantile sketch (median/p90/p99 within 1%
+relative error) and the output keeps input order instead of being sorted
+by volume.
+
 Usage:
   python filter_markets.py
   python filter_markets.py --input data/markets_by_tag.jsonl --min-volume 25000
   python filter_markets.py --input data/markets_by_tag.jsonl --min-volume 10000 --min-active-days 7
+  python filter_markets.py --input data/markets_by_tag.jsonl --stream --workers 8
+  python filter_markets.py --metrics-dir data/metrics   # JSON run report + Prometheus textfile
 
 Outputs:
   <out-dir>/markets_filtered.jsonl
@@ -18,10 +27,20 @@ from __future__ import annotations
 
 import argparse
 import json
+import math
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "data"))
+from metrics import METRICS  # noqa: E402
+from timestamps import TimestampParser  # noqa: E402
+
 # ── Defaults ──────────────────────────────────────────────────────────────────
 DEFAULT_IN              = Path("notebooks/timeseries_analysis/data/markets_by_tag.jsonl")
 DEFAULT_OUT_DIR         = Path("notebooks/timeseries_analysis/data/filtered")
@@ -39,19 +58,23 @@ def log(msg: str) -> None:
 
 def read_jsonl(path: Path) -> List[Dict[str, Any]]:
     rows = []
-    with path.open("r", encoding="utf-8") as f:
+    with METRICS.stage("read_jsonl") as st, path.open("r", encoding="utf-8") as f:
         for line in f:
             if line.strip():
                 rows.append(json.loads(line))
+        st.rows = len(rows)
+        st.bytes_read = path.stat().st_size
     log(f"Loaded {len(rows):,} markets from {path}")
     return rows
 
 
 def write_jsonl(path: Path, rows: List[Dict[str, Any]]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
+    with METRICS.stage("write_jsonl") as st, path.open("w", encoding="utf-8") as f:
         for row in rows:
             f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        st.rows = len(rows)
+        st.bytes_written = f.tell()
     log(f"Wrote {len(rows):,} records → {path}")
 
 
@@ -66,13 +89,8 @@ def write_json(path: Path, obj: Any) -> None:
 # Helpers
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _parse_iso(s: Optional[str]) -> Optional[datetime]:
-    if not s:
-        return None
-    try:
-        return datetime.fromisoformat(s.replace("Z", "+00:00"))
-    except Exception:
-        return None
+# createdAt/endDate: unix seconds, format detected once per process; naive times are UTC
+_MARKET_DATES = TimestampParser(name="market dates")
 
 
 def _safe_float(val: Any) -> float:
@@ -92,13 +110,13 @@ def _get_volume(m: Dict[str, Any]) -> float:
 
 
 def _get_active_days(m: Dict[str, Any]) -> Optional[float]:
-    now   = datetime.now(tz=timezone.utc)
-    start = _parse_iso(m.get("createdAt") or m.get("created_at") or m.get("startDate"))
-    end   = _parse_iso(m.get("endDate")   or m.get("end_date"))
-    if not start:
+    now   = datetime.now(tz=timezone.utc).timestamp()
+    start = _MARKET_DATES.parse(m.get("createdAt") or m.get("created_at") or m.get("startDate"))
+    end   = _MARKET_DATES.parse(m.get("endDate")   or m.get("end_date"))
+    if start is None:
         return None
-    ref = min(now, end) if end else now
-    return max(0.0, (ref - start).total_seconds() / 86_400)
+    ref = min(now, end) if end is not None else now
+    return max(0.0, (ref - start) / 86_400)
 
 
 def _get_n_outcomes(m: Dict[str, Any]) -> int:
@@ -187,6 +205,181 @@ def build_summary(
     }
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Streaming mode
+# ─────────────────────────────────────────────────────────────────────────────
+
+class QuantileSketch:
+    """
+    Log-bucketed quantile sketch (DDSketch-style) for positive values.
+
+    Every quantile is returned within `alpha` relative error, memory grows
+    with log(max/min) rather than the number of values, and two sketches
+    merge by adding bucket counts, so per-worker sketches combine exactly.
+    """
+
+    def __init__(self, alpha: float = 0.01) -> None:
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.total = 0.0
+
+    def add(self, x: float) -> None:
+        if x <= 0:
+            return
+        k = math.ceil(math.log(x) / self._log_gamma)
+        self.bins[k] = self.bins.get(k, 0) + 1
+        self.count += 1
+        self.total += x
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for k, n in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        # Same rank convention as sorted(values)[int(q * n)] in the in-memory path
+        rank = min(self.count - 1, int(q * self.count))
+        seen = 0
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                estimate = 2 * self.gamma ** k / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+
+@dataclass
+class FilterStats:
+    raw_count: int = 0
+    filtered_count: int = 0
+    resolved_count: int = 0
+    rejection_counts: Dict[str, int] = field(default_factory=dict)
+    volumes: QuantileSketch = field(default_factory=QuantileSketch)
+
+    def merge(self, other: "FilterStats") -> None:
+        self.raw_count += other.raw_count
+        self.filtered_count += other.filtered_count
+        self.resolved_count += other.resolved_count
+        for reason, n in other.rejection_counts.items():
+            self.rejection_counts[reason] = self.rejection_counts.get(reason, 0) + n
+        self.volumes.merge(other.volumes)
+
+
+def _byte_ranges(path: Path, n: int) -> List[Tuple[int, int]]:
+    size = path.stat().st_size
+    step = max(1, math.ceil(size / max(1, n)))
+    return [(start, min(size, start + step)) for start in range(0, size, step)] or [(0, 0)]
+
+
+def filter_byte_range(
+    in_path: str,
+    start: int,
+    end: int,
+    out_path: str,
+    min_volume: float,
+    min_active_days: float,
+) -> FilterStats:
+    """
+    Filter the lines that begin inside [start, end) of in_path, appending
+    matches to out_path as they are found.
+    """
+    stats = FilterStats()
+    with open(in_path, "rb") as f, open(out_path, "w", encoding="utf-8") as out:
+        if start > 0:
+            # Finish the line straddling `start`; it belongs to the previous range
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            if not line.strip():
+                continue
+            m = json.loads(line)
+            stats.raw_count += 1
+            passes, reason = apply_filter(m, min_volume, min_active_days)
+            if not passes:
+                bucket = reason.split(":")[0]
+                stats.rejection_counts[bucket] = stats.rejection_counts.get(bucket, 0) + 1
+                continue
+            out.write(json.dumps(m, ensure_ascii=False) + "\n")
+            stats.filtered_count += 1
+            if m.get("resolved") or m.get("isResolved"):
+                stats.resolved_count += 1
+            stats.volumes.add(_get_volume(m))
+    return stats
+
+
+def filter_streaming(in_path: Path, out_path: Path, args: argparse.Namespace) -> FilterStats:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    workers = max(1, args.workers)
+    if workers == 1:
+        stats = filter_byte_range(str(in_path), 0, in_path.stat().st_size, str(out_path),
+                                  args.min_volume, args.min_active_days)
+    else:
+        ranges = _byte_ranges(in_path, workers)
+        parts = [out_path.with_name(f"{out_path.name}.part{i:03d}") for i in range(len(ranges))]
+        log(f"Filtering {in_path} in {len(ranges)} byte ranges across {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(filter_byte_range, str(in_path), start, end, str(part),
+                            args.min_volume, args.min_active_days)
+                for (start, end), part in zip(ranges, parts)
+            ]
+            results = [fut.result() for fut in futures]
+        stats = FilterStats()
+        # Concatenate parts in range order so output keeps input order
+        with out_path.open("wb") as out:
+            for part, part_stats in zip(parts, results):
+                stats.merge(part_stats)
+                with part.open("rb") as src:
+                    shutil.copyfileobj(src, out)
+                os.remove(part)
+    log(f"Streamed {stats.raw_count:,} markets, wrote {stats.filtered_count:,} → {out_path}")
+    return stats
+
+
+def build_stream_summary(stats: FilterStats, args: argparse.Namespace) -> Dict[str, Any]:
+    vs = stats.volumes
+    return {
+        "filtered_at": datetime.now(tz=timezone.utc).isoformat(),
+        "filter_params": {
+            "min_volume_usd":  args.min_volume,
+            "min_active_days": args.min_active_days
+        },
+        "raw_count":        stats.raw_count,
+        "filtered_count":   stats.filtered_count,
+        "resolved_count":   stats.resolved_count,
+        "unresolved_count": stats.filtered_count - stats.resolved_count,
+        "volume_stats": {
+            "min":    vs.min,
+            "max":    vs.max,
+            "median": vs.quantile(0.5),
+            "p90":    vs.quantile(0.9),
+            "p99":    vs.quantile(0.99),
+            "total":  vs.total if vs.count else None,
+            "quantile_relative_error": vs.alpha,
+        },
+        "rejection_reasons": dict(sorted(stats.rejection_counts.items(), key=lambda x: -x[1])),
+    }
+
+
 def print_summary(summary: Dict[str, Any]) -> None:
     vs = summary["volume_stats"]
     print("\n" + "=" * 60)
@@ -205,6 +398,9 @@ def print_summary(summary: Dict[str, Any]) -> None:
     if vs["min"] is not None:
         print(f"\n  Volume range  : ${vs['min']:>15,.0f} – ${vs['max']:,.0f}")
         print(f"  Median volume : ${vs['median']:>15,.0f}")
+        if vs.get("p90") is not None:
+            print(f"  P90 volume    : ${vs['p90']:>15,.0f}")
+            print(f"  P99 volume    : ${vs['p99']:>15,.0f}")
         print(f"  Total volume  : ${vs['total']:>15,.0f}")
     print("=" * 60)
 
@@ -213,22 +409,46 @@ def print_summary(summary: Dict[str, Any]) -> None:
 # Main
 # ─────────────────────────────────────────────────────────────────────────────
 
+def write_metrics(args: argparse.Namespace) -> None:
+    for line in METRICS.summary_lines():
+        log(line)
+    if args.metrics_dir:
+        json_path, prom_path = METRICS.export(args.metrics_dir, "filter_markets")
+        log(f"Metrics → {json_path}, {prom_path}")
+
+
 def main(args: argparse.Namespace) -> None:
+    if args.stream or args.workers > 1:
+        in_path, out_path = Path(args.input), Path(args.out_dir) / "markets_filtered.jsonl"
+        with METRICS.stage("filter_streaming") as st:
+            stats = filter_streaming(in_path, out_path, args)
+            st.rows = stats.raw_count
+            st.bytes_read = in_path.stat().st_size
+            st.bytes_written = out_path.stat().st_size
+        out_dir = out_path.parent
+        summary = build_stream_summary(stats, args)
+        write_json(out_dir / "filter_summary.json", summary)
+        print_summary(summary)
+        write_metrics(args)
+        return
+
     markets = read_jsonl(Path(args.input))
 
     filtered: List[Dict] = []
     rejection_counts: Dict[str, int] = {}
 
-    for m in markets:
-        passes, reason = apply_filter(m, args.min_volume, args.min_active_days)
-        if passes:
-            filtered.append(m)
-        else:
-            bucket = reason.split(":")[0]
-            rejection_counts[bucket] = rejection_counts.get(bucket, 0) + 1
+    with METRICS.stage("filter") as st:
+        for m in markets:
+            passes, reason = apply_filter(m, args.min_volume, args.min_active_days)
+            if passes:
+                filtered.append(m)
+            else:
+                bucket = reason.split(":")[0]
+                rejection_counts[bucket] = rejection_counts.get(bucket, 0) + 1
 
-    # Sort by volume descending so highest-signal markets come first
-    filtered.sort(key=lambda m: _get_volume(m), reverse=True)
+        # Sort by volume descending so highest-signal markets come first
+        filtered.sort(key=lambda m: _get_volume(m), reverse=True)
+        st.rows = len(markets)
 
     out_dir = Path(args.out_dir)
     write_jsonl(out_dir / "markets_filtered.jsonl", filtered)
@@ -236,6 +456,7 @@ def main(args: argparse.Namespace) -> None:
     summary = build_summary(len(markets), filtered, rejection_counts, args)
     write_json(out_dir / "filter_summary.json", summary)
     print_summary(summary)
+    write_metrics(args)
 
 
 if __name__ == "__main__":
@@ -244,4 +465,7 @@ if __name__ == "__main__":
     parser.add_argument("--out-dir",         type=str,   default=str(DEFAULT_OUT_DIR),     help="Output directory")
     parser.add_argument("--min-volume",      type=float, default=DEFAULT_MIN_VOLUME_USD,   help="Min USD volume")
     parser.add_argument("--min-active-days", type=float, default=DEFAULT_MIN_ACTIVE_DAYS,  help="Min days market was active")
+    parser.add_argument("--stream",          action="store_true",                          help="Stream input/output with bounded memory (keeps input order)")
+    parser.add_argument("--workers",         type=int,   default=1,                        help="Worker processes for streaming mode (>1 implies --stream)")
+    parser.add_argument("--metrics-dir",     type=str,   default=None,                     help="Write a JSON run report + Prometheus textfile here")
     main(parser.parse_args())